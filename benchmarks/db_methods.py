@@ -0,0 +1,165 @@
+"""Замер методов DatabaseManager на базах реалистичного размера.
+
+Для каждого размера создаётся временная база с заданным числом заказов, расходов
+и доходов (даты за последние два года), после чего каждый метод вызывается
+--repeat раз. Результаты (медиана и минимум, мс) печатаются и сохраняются в JSON,
+который можно сравнить с прошлым запуском через --compare.
+
+    python -m benchmarks.db_methods --sizes 10000 100000 1000000 --json db.json
+    python -m benchmarks.db_methods --sizes 10000 --compare db.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from data.async_db import DEFAULT_PRAGMAS
+from data.db_manage import DatabaseManager
+
+
+MATERIALS = 50
+CATEGORIES = ('Пластик', 'Электричество', 'Запчасти', 'Аренда', 'Доставка', 'Реклама', 'Прочее')
+
+
+def fill(db: DatabaseManager, size: int, seed: int = 1):
+    """Заполнить базу size заказами, size расходами и size доходами"""
+    rng = random.Random(seed)
+    today = date.today()
+
+    def day(max_days: int = 730) -> str:
+        return (today - timedelta(days=rng.randrange(max_days))).isoformat()
+
+    cursor = db.conn.cursor()
+    cursor.executemany('INSERT INTO materials (name, quantity) VALUES (?, ?)',
+                       [(f'Материал {index}', rng.randrange(10000)) for index in range(MATERIALS)])
+    cursor.executemany('INSERT INTO expense_categories (name) VALUES (?)', [(name,) for name in CATEGORIES])
+    cursor.executemany('''
+        INSERT INTO orders (id, name, link, recommended_date, importance, settings, cost, payment_info,
+                            status_id, creation_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', ((order_id, f'Заказ {order_id}', 'https://example.com/model.stl', day(), rng.randint(1, 10),
+           '0.2 мм', rng.randrange(100, 5000), rng.random() < 0.8, rng.choice((1, 2)), day())
+          for order_id in range(1, size + 1)))
+    cursor.executemany('INSERT INTO order_materials (order_id, material_id, quantity) VALUES (?, ?, ?)',
+                       ((order_id, rng.randint(1, MATERIALS), rng.randrange(10, 500))
+                        for order_id in range(1, size + 1)))
+    cursor.executemany('INSERT INTO expenses (category_id, amount, date_spent, description) VALUES (?, ?, ?, ?)',
+                       ((rng.randint(1, len(CATEGORIES)), round(rng.uniform(10, 3000), 2), day(), 'benchmark')
+                        for _ in range(size)))
+    cursor.executemany('INSERT INTO revenue (order_id, amount, date_received) VALUES (?, ?, ?)',
+                       ((rng.randint(1, size), round(rng.uniform(100, 5000), 2), day()) for _ in range(size)))
+    db.conn.commit()
+    cursor.execute('ANALYZE')
+
+
+def measure(func, repeat: int) -> dict:
+    times = []
+    for run in range(repeat):
+        started = time.perf_counter()
+        func(run)
+        times.append((time.perf_counter() - started) * 1000)
+    return {'runs': repeat, 'median_ms': statistics.median(times), 'min_ms': min(times)}
+
+
+def benchmark_size(size: int, repeat: int, tmp: str) -> dict:
+    db_file = os.path.join(tmp, f'orders_{size}.db')
+    db = DatabaseManager(db_file, pragmas=DEFAULT_PRAGMAS)
+    started = time.perf_counter()
+    fill(db, size)
+    fill_seconds = time.perf_counter() - started
+
+    rng = random.Random(size)
+    excel = os.path.join(tmp, 'export.xlsx')
+    year_ago = (date.today() - timedelta(days=365)).isoformat()
+    methods = {
+        'add_order': lambda run: db.add_order(
+            f'Новый заказ {run}', 'https://example.com', 'Материал 1', 100, '2030-01-01', 5, '0.2 мм',
+            1000.0, True, False, date.today().isoformat()),
+        # Distinct ids and names per run, so the query cache does not hide the lookup
+        'get_order(id)': lambda run: db.get_order(rng.randint(1, size)),
+        'get_order(name)': lambda run: db.get_order(f'Заказ {rng.randint(1, size)}', key='name'),
+        'get_all_materials': lambda run: (db.cache.clear(), db.get_all_materials()),
+        'get_material_by_name': lambda run: db.get_material_by_name(f'Материал {rng.randrange(MATERIALS)}'),
+        'get_pending_orders': lambda run: db.get_pending_orders(),
+        'get_orders_page': lambda run: db.get_orders_page(1, after=rng.randint(1, size)),
+        'search_orders': lambda run: db.search_orders(str(rng.randint(1000, size))),
+        'get_finance_totals(year)': lambda run: db.get_finance_totals(year_ago, date.today().isoformat()),
+        'get_all_materials_excel': lambda run: db.get_all_materials_excel(excel),
+        'export_last_month_data_to_excel': lambda run: db.export_last_month_data_to_excel(excel),
+        'export_orders_to_excel(done)': lambda run: db.export_orders_to_excel(excel, True),
+        'export_orders_to_excel(pending)': lambda run: db.export_orders_to_excel(excel, False),
+        'export_expenses_and_revenue_between_dates_to_excel(year)':
+            lambda run: db.export_expenses_and_revenue_between_dates_to_excel(year_ago, date.today().isoformat(),
+                                                                            excel),
+        'get_expenses_by_category': lambda run: db.get_expenses_by_category(CATEGORIES[0], excel),
+    }
+    results = {name: measure(func, repeat) for name, func in methods.items()}
+    # Destructive: the first call deletes everything that qualifies, so it is timed once
+    results['delete_unpaid_orders'] = measure(lambda run: db.delete_unpaid_orders(), 1)
+    db.close_connection()
+    os.remove(db_file)
+    return {'fill_seconds': fill_seconds, 'methods': results}
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict):
+    print('\nСравнение с', baseline['meta'].get('revision') or 'предыдущим запуском')
+    for size, result in report['sizes'].items():
+        old = baseline['sizes'].get(size)
+        if old is None:
+            continue
+        print(f'{size} строк:')
+        for name, stats in result['methods'].items():
+            if name in old['methods']:
+                ratio = stats['median_ms'] / max(old['methods'][name]['median_ms'], 1e-9)
+                print(f'  {name:<58} {old["methods"][name]["median_ms"]:10.2f} -> {stats["median_ms"]:10.2f} ms'
+                      f'  x{ratio:.2f}')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='сохранить результаты в JSON-файл')
+    parser.add_argument('--compare', help='JSON предыдущего запуска для сравнения')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {'revision': git_revision(), 'python': platform.python_version(),
+                 'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(),
+                 'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'repeat': args.repeat},
+        'sizes': {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            result = report['sizes'][str(size)] = benchmark_size(size, args.repeat, tmp)
+            print(f'{size} строк (заполнение {result["fill_seconds"]:.1f} с):')
+            for name, stats in result['methods'].items():
+                print(f'  {name:<58} median {stats["median_ms"]:10.2f} ms  min {stats["min_ms"]:10.2f} ms')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
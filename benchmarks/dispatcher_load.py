@@ -0,0 +1,212 @@
+"""Нагрузочный тест диспетчера без сети.
+
+Синтетические Update подаются прямо в dp.feed_update, а запросы бота к Telegram
+обслуживает заглушка сессии. Каждый пользователь проходит весь мастер создания
+заказа (Ord) и открывает меню заказов, материалов и финансов; все пользователи
+работают одновременно. Отчёт: пропускная способность, квантили задержки по шагам
+и прирост памяти. База и хранилище FSM создаются во временном каталоге.
+
+    python -m benchmarks.dispatcher_load --users 2000 --max-p95 50 --min-throughput 500
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+
+# Wizard answers, one message per Ord state, then the confirmation button
+WIZARD_MESSAGES = ('Заказ {user}', 'https://example.com/model.stl', 'PLA {material}', '120',
+                   '2026-06-{day:02d}', '{importance}', '0.2 мм, 20% заполнения')
+MENU_CALLBACKS = ('order_manage', 'show_pending_orders', 'material_manage', 'finance_manage', 'back_menu')
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def make_session():
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import EditMessageText, SendMessage
+    from aiogram.types import Message
+
+    class StubSession(BaseSession):
+        """Сессия, которая отвечает на запросы бота сразу, не обращаясь к сети"""
+
+        def __init__(self):
+            super().__init__()
+            self.requests = 0
+
+        async def make_request(self, bot, method, timeout=None):
+            self.requests += 1
+            if isinstance(method, (SendMessage, EditMessageText)):
+                return Message.model_validate({'message_id': 1, 'date': 1, 'text': method.text,
+                                               'chat': {'id': method.chat_id or 1, 'type': 'private'}})
+            return True
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b''
+
+        async def close(self):
+            pass
+
+    return StubSession()
+
+
+class LoadTest:
+    def __init__(self, core, bot, workflow_data: dict):
+        self.core = core
+        self.bot = bot
+        self.workflow_data = workflow_data
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors = 0
+        self._update_ids = itertools.count(1)
+
+    async def feed(self, step: str, update: dict):
+        from aiogram.types import Update
+
+        update = Update.model_validate({'update_id': next(self._update_ids), **update})
+        started = time.perf_counter()
+        try:
+            await self.core.dp.feed_update(self.bot, update, **self.workflow_data)
+        except Exception:
+            self.errors += 1
+        self.latencies[step].append(time.perf_counter() - started)
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+
+    async def message(self, step: str, user_id: int, text: str):
+        await self.feed(step, {'message': {
+            'message_id': 1, 'date': int(time.time()), 'text': text, 'from': self._user(user_id),
+            'chat': {'id': user_id, 'type': 'private'}}})
+
+    async def callback(self, step: str, user_id: int, data: str):
+        await self.feed(step, {'callback_query': {
+            'id': str(user_id), 'chat_instance': str(user_id), 'data': data, 'from': self._user(user_id),
+            'message': {'message_id': 1, 'date': int(time.time()), 'text': '...',
+                        'chat': {'id': user_id, 'type': 'private'}}}})
+
+    async def run_user(self, user_id: int, menu_rounds: int):
+        await self.callback('make_order', user_id, 'make_order')
+        for step, template in enumerate(WIZARD_MESSAGES, 1):
+            text = template.format(user=user_id, material=user_id % 5, day=user_id % 28 + 1,
+                                   importance=user_id % 10 + 1)
+            await self.message(f'ord_{step + 1}', user_id, text)
+        await self.callback('yes_makeorder', user_id, 'yes_makeorder')
+        for _ in range(menu_rounds):
+            for data in MENU_CALLBACKS:
+                await self.callback(data, user_id, data)
+
+
+async def run(args) -> dict:
+    import src.core as core
+
+    logging.getLogger('aiogram').setLevel(logging.WARNING)
+    session = make_session()
+    bot = core.Bot(token=core.config.bot_token.get_secret_value(), session=session)
+    workflow_data = await core.create_workflow_data()
+    db = workflow_data['db']
+    # Seed stock so the materials screen has something to render
+    await db.adjust_materials([(f'PLA {index}', 1000) for index in range(5)])
+    test = LoadTest(core, bot, workflow_data)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    traced_before = tracemalloc.get_traced_memory()[0] if args.tracemalloc else 0
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    await asyncio.gather(*(test.run_user(user_id, args.menu_rounds) for user_id in range(1, args.users + 1)))
+    elapsed = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    outbox = workflow_data['outbox']
+    await outbox.close(timeout=None)
+    traced = tracemalloc.get_traced_memory() if args.tracemalloc else (0, 0)
+    tracemalloc.stop()
+
+    all_latencies = [latency for values in test.latencies.values() for latency in values]
+    report = {
+        'users': args.users,
+        'updates': len(all_latencies),
+        'errors': test.errors,
+        'seconds': elapsed,
+        'throughput': len(all_latencies) / elapsed,
+        'p50_ms': percentile(all_latencies, 0.5) * 1000,
+        'p95_ms': percentile(all_latencies, 0.95) * 1000,
+        'p99_ms': percentile(all_latencies, 0.99) * 1000,
+        'max_ms': max(all_latencies) * 1000,
+        'telegram_requests': session.requests,
+        'coalesced_edits': outbox.coalesced,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_growth_mb': (rss_after - rss_before) / 1024,
+        'traced_growth_mb': (traced[0] - traced_before) / 2 ** 20,
+        'traced_peak_mb': traced[1] / 2 ** 20,
+        'steps': {step: {'count': len(values), 'p50_ms': statistics.median(values) * 1000,
+                         'p95_ms': percentile(values, 0.95) * 1000}
+                  for step, values in test.latencies.items()},
+    }
+    await db.close_connection()
+    await core.dp.storage.close()
+    await bot.session.close()
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help='число одновременных пользователей')
+    parser.add_argument('--menu-rounds', type=int, default=2, help='сколько раз каждый пользователь проходит меню')
+    parser.add_argument('--tracemalloc', action='store_true', help='считать выделения памяти (замедляет тест)')
+    parser.add_argument('--json', help='сохранить отчёт в JSON-файл')
+    parser.add_argument('--max-p95', type=float, default=None, help='порог p95 задержки, мс')
+    parser.add_argument('--min-throughput', type=float, default=None, help='порог пропускной способности, обн/с')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Settings are read when src.core is imported, so the environment goes first
+        os.environ.setdefault('BOT_TOKEN', '123456:benchmark')
+        os.environ['DB_FILE'] = os.path.join(tmp, 'benchmark.db')
+        os.environ['FSM_DB_FILE'] = os.path.join(tmp, 'fsm.db')
+        os.environ['REPORTS_DIR'] = os.path.join(tmp, 'reports')
+        os.environ['LOG_FILE'] = os.path.join(tmp, 'bot.log')
+        for name in ('WEBHOOK_URL', 'TELEGRAM_API_URL', 'TENANTS_DIR'):
+            os.environ.pop(name, None)
+        # The stub session has no flood limits, so the outbox only coalesces edits
+        os.environ.setdefault('OUTBOX_GLOBAL_RATE', '1000000')
+        os.environ.setdefault('OUTBOX_CHAT_RATE', '1000000')
+        report = asyncio.run(run(args))
+
+    print(f'users:        {report["users"]}')
+    print(f'updates:      {report["updates"]} ({report["errors"]} errors, '
+          f'{report["telegram_requests"]} Telegram requests, {report["coalesced_edits"]} edits coalesced)')
+    print(f'throughput:   {report["throughput"]:.0f} updates/s in {report["seconds"]:.2f} s')
+    print(f'latency:      p50 {report["p50_ms"]:.2f} ms, p95 {report["p95_ms"]:.2f} ms, '
+          f'p99 {report["p99_ms"]:.2f} ms, max {report["max_ms"]:.2f} ms')
+    print(f'memory:       peak RSS +{report["peak_rss_growth_mb"]:.1f} MB' + (
+        f', traced +{report["traced_growth_mb"]:.1f} MB (peak {report["traced_peak_mb"]:.1f} MB)'
+        if args.tracemalloc else ''))
+    for step, stats in sorted(report['steps'].items(), key=lambda item: -item[1]['p95_ms']):
+        print(f'  {step:<20} {stats["count"]:>7}  p50 {stats["p50_ms"]:7.2f} ms  p95 {stats["p95_ms"]:7.2f} ms')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failed = report['errors'] > 0
+    if args.max_p95 is not None and report['p95_ms'] > args.max_p95:
+        failed = True
+    if args.min_throughput is not None and report['throughput'] < args.min_throughput:
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Замер времени запуска бота: импорт src.core и время до старта polling.
+
+Каждый замер выполняется в отдельном процессе, чтобы модули не были закешированы.
+Скрипт завершается с кодом 1, если медиана превышает порог или при запуске
+загрузились тяжёлые модули HEAVY_MODULES.
+
+    python -m benchmarks.startup --runs 5 --max-import 6 --max-startup 6
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+# Modules in data/ import these inside the functions that need them (reports, imports,
+# pricing, forecasts), never at module level, so the bot starts without loading them
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl')
+
+PROBE = '''
+import asyncio, json, sys, time
+started = time.perf_counter()
+import src.core as core
+imported = time.perf_counter()
+result = {}
+
+async def on_startup(dispatcher):
+    result['startup'] = time.perf_counter() - started
+    asyncio.get_running_loop().create_task(dispatcher.stop_polling())
+
+core.dp.startup.register(on_startup)
+asyncio.run(core.main())
+result['import'] = imported - started
+result['heavy'] = [name for name in %r if name in sys.modules]
+print(json.dumps(result))
+''' % (HEAVY_MODULES,)
+
+
+def run_probe() -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, 'BOT_TOKEN': os.environ.get('BOT_TOKEN', '123456:benchmark'),
+               'DB_FILE': os.path.join(tmp, 'benchmark.db'), 'FSM_DB_FILE': os.path.join(tmp, 'fsm.db'),
+               'REPORTS_DIR': os.path.join(tmp, 'reports'), 'LOG_FILE': os.path.join(tmp, 'bot.log')}
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=root, env=env,
+                                capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-import', type=float, default=None, help='порог медианы импорта, сек')
+    parser.add_argument('--max-startup', type=float, default=None, help='порог медианы до start_polling, сек')
+    args = parser.parse_args()
+
+    probes = [run_probe() for _ in range(args.runs)]
+    import_time = statistics.median(probe['import'] for probe in probes)
+    startup_time = statistics.median(probe['startup'] for probe in probes)
+    heavy = sorted({name for probe in probes for name in probe['heavy']})
+
+    print(f'import src.core:     {import_time * 1000:.1f} ms (median of {args.runs})')
+    print(f'first start_polling: {startup_time * 1000:.1f} ms (median of {args.runs})')
+    print(f'heavy modules:       {", ".join(heavy) or "none"}')
+
+    failed = bool(heavy)
+    if args.max_import is not None and import_time > args.max_import:
+        failed = True
+    if args.max_startup is not None and startup_time > args.max_startup:
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
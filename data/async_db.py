@@ -0,0 +1,177 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from data.cache import LRUCache
+from data.db_manage import DatabaseManager
+
+
+DEFAULT_PRAGMAS = {
+    # Only takes effect for new database files, existing ones keep their mode
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -8000,
+    'temp_store': 'MEMORY',
+}
+
+
+class AsyncDatabaseManager:
+    """Асинхронный фасад над DatabaseManager.
+
+    Вся работа с SQLite выполняется в отдельных потоках: один поток-писатель
+    с собственным соединением и небольшой пул потоков-читателей, каждый со
+    своим соединением. Для каждого метода DatabaseManager доступен
+    одноимённый awaitable-метод, например `await db.add_order(...)`.
+
+    При batch_writes=True записи из конкурентных обработчиков копятся и
+    фиксируются одной транзакцией каждые batch_interval секунд или каждые
+    batch_size операций; каждый вызов при этом получает свой результат.
+
+    Все соединения используют общий кэш справочников и заказов (self.cache),
+    поэтому инвалидация после записи сразу видна читателям. query_hook
+    передаётся каждому соединению (см. DatabaseManager.query_hook).
+    """
+
+    WRITE_METHODS = frozenset({
+        'create_tables', 'update_material', 'add_order', 'delete_unpaid_orders',
+        'delete_order', 'add_revenue', 'add_expense', 'auto_delete_expired_records',
+        'update_order_status', 'adjust_materials', 'rebuild_finance_rollups',
+        'delete_unpaid_orders_chunk', 'auto_delete_expired_records_chunk', 'optimize', 'update_order_cost',
+        'import_rows', 'mark_order_paid', 'confirm_order_cost',
+    })
+    READ_METHODS = frozenset({
+        'get_order', 'get_all_materials', 'get_material_by_name', 'get_all_materials_excel',
+        'get_last_month_date_range', 'export_last_month_data_to_excel', 'export_orders_to_excel',
+        'export_expenses_and_revenue_between_dates_to_excel', 'get_expenses_by_category',
+        'get_pending_orders', 'get_finance_totals', 'get_orders_page', 'get_materials_page',
+        'search_orders', 'get_pricing_history', 'get_material_consumption', 'get_pending_material_demand',
+    })
+
+    def __init__(self, db_file: str, readers: int = 2, pragmas: dict | None = None,
+                 batch_writes: bool = False, batch_interval: float = 0.005, batch_size: int = 64,
+                 cache_size: int = 1024, cache_ttl: float | None = None, query_hook=None):
+        self.db_file = db_file
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self.query_hook = query_hook
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self.batch_writes = batch_writes
+        self.batch_interval = batch_interval
+        self.batch_size = batch_size
+        self._pending: list[tuple[str, tuple, dict, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._batch_tasks: set[asyncio.Task] = set()
+        self._local = threading.local()
+        self._managers: list[DatabaseManager] = []
+        self._managers_lock = threading.Lock()
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer',
+                                                  initializer=self._init_connection,
+                                                  initargs=(True,))
+        self._read_executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-reader',
+                                                 initializer=self._init_connection,
+                                                 initargs=(False,))
+        # Readers must not open the database before the writer has created the schema
+        self._write_executor.submit(lambda: None).result()
+
+    def _init_connection(self, writer: bool):
+        """Открыть соединение для текущего потока пула"""
+        manager = DatabaseManager(self.db_file, pragmas=self.pragmas, create_schema=writer, cache=self.cache,
+                                  query_hook=self.query_hook)
+        self._local.db = manager
+        with self._managers_lock:
+            self._managers.append(manager)
+            if writer:
+                self.writer = manager
+
+    def subscribe(self, callback):
+        """Подписаться на изменения данных (см. DatabaseManager.subscribe)
+
+        callback вызывается в потоке-писателе, поэтому должен быть потокобезопасным.
+        """
+        self.writer.subscribe(callback)
+
+    def data_version(self, *topics: str) -> tuple:
+        """Версии данных по темам (см. DatabaseManager.data_version); не обращается к базе"""
+        return self.writer.data_version(*topics)
+
+    def _call(self, name: str, *args, **kwargs):
+        return getattr(self._local.db, name)(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        if name in self.WRITE_METHODS:
+            async def method(*args, **kwargs):
+                return await self._write(name, args, kwargs)
+        elif name in self.READ_METHODS:
+            async def method(*args, **kwargs):
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._read_executor,
+                                                  partial(self._call, name, *args, **kwargs))
+        else:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        method.__name__ = name
+        return method
+
+    async def _write(self, name: str, args: tuple, kwargs: dict):
+        loop = asyncio.get_running_loop()
+        if not self.batch_writes:
+            return await loop.run_in_executor(self._write_executor,
+                                              partial(self._call, name, *args, **kwargs))
+
+        future = loop.create_future()
+        self._pending.append((name, args, kwargs, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_interval, self._flush)
+        return await future
+
+    def _flush(self):
+        """Отправить накопленные записи писателю одной транзакцией"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        calls, self._pending = self._pending, []
+        if calls:
+            task = asyncio.ensure_future(self._commit_batch(calls))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _commit_batch(self, calls: list[tuple[str, tuple, dict, asyncio.Future]]):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self._write_executor,
+                partial(self._call, 'run_batch', [(name, args, kwargs) for name, args, kwargs, _ in calls]))
+        except Exception as e:
+            for *_, future in calls:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (*_, future), result in zip(calls, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close_connection(self) -> int:
+        """Дождаться завершения всех операций и закрыть все соединения"""
+        self._flush()
+        if self._batch_tasks:
+            await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._shutdown)
+        return 1
+
+    def _shutdown(self):
+        self._write_executor.shutdown(wait=True)
+        self._read_executor.shutdown(wait=True)
+        with self._managers_lock:
+            for manager in self._managers:
+                manager.close_connection()
+            self._managers.clear()
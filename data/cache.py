@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+MISSING = object()
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш с необязательным временем жизни записей.
+
+    Ключи - кортежи, первый элемент которых задаёт пространство имён
+    (например ('order', 'id', 5)); по нему считаются попадания и промахи
+    и выполняется групповая инвалидация.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = Counter()
+        self.misses = Counter()
+        self._data: OrderedDict[tuple, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, default=MISSING):
+        """Вернуть значение по ключу или default, если его нет или оно устарело"""
+        with self._lock:
+            item = self._data.get(key, MISSING)
+            if item is not MISSING and self.ttl is not None and item[1] < time.monotonic():
+                del self._data[key]
+                item = MISSING
+            if item is MISSING:
+                self.misses[key[0]] += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits[key[0]] += 1
+            return item[0]
+
+    def set(self, key: tuple, value, generation: int | None = None):
+        """Сохранить значение
+
+        Если передан generation и с тех пор была инвалидация, значение не сохраняется:
+        оно могло быть прочитано до изменения данных.
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys: tuple):
+        """Удалить записи по точным ключам"""
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def invalidate_namespace(self, namespace: str):
+        """Удалить все записи пространства имён"""
+        self.invalidate_where(lambda key, value: key[0] == namespace)
+
+    def invalidate_where(self, predicate):
+        """Удалить записи, для которых predicate(key, value) истинен"""
+        with self._lock:
+            self.generation += 1
+            for key in [key for key, item in self._data.items() if predicate(key, item[0])]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Счётчики попаданий и промахов, всего и по пространствам имён"""
+        with self._lock:
+            namespaces = sorted(set(self.hits) | set(self.misses))
+            return {
+                'size': len(self._data),
+                'hits': sum(self.hits.values()),
+                'misses': sum(self.misses.values()),
+                'namespaces': {namespace: {'hits': self.hits[namespace], 'misses': self.misses[namespace]}
+                               for namespace in namespaces},
+            }
@@ -4,6 +4,39 @@ from pydantic import SecretStr
 
 class Settings(BaseSettings):
     bot_token: SecretStr
+    db_file: str = 'data/database.db'
+    tenants_dir: str | None = None
+    tenants_max_open: int = 64
+    tenant_workspaces: dict[int, str] = {}
+    printers: list[str] = ['Принтер 1']
+    maintenance_interval: int = 3600
+    maintenance_batch_size: int = 500
+    retention_days: int | None = None
+    unpaid_order_days: int | None = None
+    fsm_db_file: str = 'data/fsm.db'
+    fsm_ttl: int = 86400
+    admin_ids: list[int] = []
+    telegram_api_url: str | None = None
+    webhook_url: str | None = None
+    webhook_path: str = '/webhook'
+    webhook_secret: SecretStr | None = None
+    webhook_host: str = '0.0.0.0'
+    webhook_port: int = 8080
+    webhook_concurrency: int = 100
+    outbox_global_rate: float = 30
+    outbox_chat_rate: float = 1
+    outbox_chat_burst: float = 3
+    stock_alert_days: float = 7
+    stock_alert_interval: int = 1800
+    reports_dir: str = 'data/reports'
+    report_workers: int = 2
+    reports_max_files: int = 200
+    log_file: str = 'data/logs/bot.log'
+    log_level: str = 'INFO'
+    log_json: bool = False
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+    log_rotate_when: str | None = None
     model_config = SettingsConfigDict(env_file='.env', env_file_encoding='utf-8')
 
 
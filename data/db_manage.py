@@ -1,29 +1,490 @@
-import datetime
+import calendar
+import json
+import logging
 import sqlite3
-from datetime import datetime, timedelta
-import pandas as pd
-import os
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from data.cache import LRUCache, MISSING
+from data.excel_export import export_queries_to_excel
+
+
+logger = logging.getLogger(__name__)
+
+
+# Named queries used by DatabaseManager; check_query_plans() verifies their plans
+QUERIES = {
+    'insert_material': 'INSERT OR IGNORE INTO materials (name, quantity) VALUES (?, 0)',
+    'add_material_quantity': '''
+        INSERT INTO materials (name, quantity) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET quantity = quantity + excluded.quantity
+        RETURNING quantity
+    ''',
+    'subtract_material_quantity': '''
+        UPDATE materials SET quantity = quantity - ?
+        WHERE name = ? AND quantity >= ?
+        RETURNING quantity
+    ''',
+    'material_id': 'SELECT id FROM materials WHERE name = ?',
+    # CROSS JOIN keeps the name list as the outer loop, so a tiny table is not scanned either
+    'material_ids': 'SELECT m.name, m.id FROM json_each(?) j CROSS JOIN materials m ON m.name = j.value',
+    'material_by_name': 'SELECT name, quantity FROM materials WHERE name = ?',
+    'all_materials': 'SELECT name, quantity FROM materials',
+    'insert_category': 'INSERT OR IGNORE INTO expense_categories (name) VALUES (?)',
+    'category_id': 'SELECT id FROM expense_categories WHERE name = ?',
+    'category_ids': '''
+        SELECT c.name, c.id FROM json_each(?) j CROSS JOIN expense_categories c ON c.name = j.value
+    ''',
+    'orders_last_id': "SELECT seq FROM sqlite_sequence WHERE name = 'orders'",
+    'bump_data_version': '''
+        INSERT INTO data_versions (topic, version) VALUES (?, 1)
+        ON CONFLICT(topic) DO UPDATE SET version = version + 1
+    ''',
+    'data_versions': 'SELECT topic, version FROM data_versions',
+    'insert_order': '''
+        INSERT INTO orders (name, link, recommended_date, importance, settings,
+                            cost, payment_info, status_id, creation_date, cost_confirmed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'insert_order_material': 'INSERT INTO order_materials (order_id, material_id, quantity) VALUES (?, ?, ?)',
+    'get_order_by_id': '''
+        SELECT o.*, m.name as material, om.quantity as material_amount
+        FROM orders o
+        LEFT JOIN order_materials om ON o.id = om.order_id
+        LEFT JOIN materials m ON om.material_id = m.id
+        WHERE o.id = ?
+    ''',
+    'get_order_by_name': '''
+        SELECT o.*, m.name as material, om.quantity as material_amount
+        FROM orders o
+        LEFT JOIN order_materials om ON o.id = om.order_id
+        LEFT JOIN materials m ON om.material_id = m.id
+        WHERE o.name = ?
+    ''',
+    'orders_by_status': '''
+        SELECT * FROM orders
+        WHERE status_id = ?
+        ORDER BY coalesce(recommended_date, ''), coalesce(importance, 0) DESC
+    ''',
+    'pending_orders': '''
+        SELECT id, name, recommended_date, importance, creation_date
+        FROM orders
+        WHERE status_id = 1
+    ''',
+    'update_order_status': 'UPDATE orders SET status_id = ? WHERE id = ?',
+    'update_order_cost': 'UPDATE orders SET cost = ?, cost_confirmed = 1 WHERE id = ?',
+    'confirm_order_cost': 'UPDATE orders SET cost_confirmed = 1 WHERE id = ? RETURNING cost',
+    'mark_order_paid': '''
+        UPDATE orders SET payment_info = 1
+        WHERE id = ? AND (payment_info = 0 OR payment_info IS NULL)
+        RETURNING cost
+    ''',
+    'pricing_history': '''
+        SELECT o.cost, m.name, om.quantity, o.importance, o.recommended_date, o.creation_date
+        FROM orders o
+        JOIN order_materials om ON om.order_id = o.id
+        JOIN materials m ON m.id = om.material_id
+        WHERE o.cost > 0 AND o.cost_confirmed = 1
+    ''',
+    # CROSS JOIN keeps orders as the outer loop, so the date range is read from its index
+    'material_consumption': '''
+        SELECT m.name, o.creation_date, om.quantity
+        FROM orders o
+        CROSS JOIN order_materials om ON om.order_id = o.id
+        JOIN materials m ON m.id = om.material_id
+        WHERE o.creation_date >= ?
+    ''',
+    # Likewise the pending orders are read from the status index, whatever the statistics say
+    'pending_material_demand': '''
+        SELECT m.name, SUM(om.quantity)
+        FROM orders o
+        CROSS JOIN order_materials om ON om.order_id = o.id
+        JOIN materials m ON m.id = om.material_id
+        WHERE o.status_id = 1
+        GROUP BY m.name
+    ''',
+    'delete_order': 'DELETE FROM orders WHERE id = ?',
+    'delete_unpaid_orders': '''
+        DELETE FROM orders
+        WHERE creation_date <= ? AND (payment_info = 0 OR payment_info IS NULL)
+    ''',
+    'delete_expired_orders': 'DELETE FROM orders WHERE creation_date <= ?',
+    'delete_unpaid_orders_chunk': '''
+        DELETE FROM orders WHERE id IN (
+            SELECT id FROM orders
+            WHERE creation_date <= ? AND (payment_info = 0 OR payment_info IS NULL)
+            LIMIT ?
+        )
+    ''',
+    'delete_expired_orders_chunk': '''
+        DELETE FROM orders WHERE id IN (SELECT id FROM orders WHERE creation_date <= ? LIMIT ?)
+    ''',
+    'insert_revenue': 'INSERT INTO revenue (order_id, amount, date_received) VALUES (?, ?, ?)',
+    'insert_expense': 'INSERT INTO expenses (category_id, amount, date_spent, description) VALUES (?, ?, ?, ?)',
+    'expenses_between': 'SELECT * FROM expenses WHERE date_spent BETWEEN ? AND ?',
+    'revenue_between': 'SELECT * FROM revenue WHERE date_received BETWEEN ? AND ?',
+    'expenses_by_category': '''
+        SELECT e.amount, e.date_spent, e.description
+        FROM expenses e
+        JOIN expense_categories ec ON e.category_id = ec.id
+        WHERE ec.name = ?
+    ''',
+}
+
+# Finance rollups: per-day and per-month totals kept up to date by triggers.
+# CROSS JOIN reads the period range from the rollup key instead of looping over categories.
+ROLLUP_PERIODS = (('daily', 'day', 10), ('monthly', 'month', 7))
+
+for _period, _column, _length in ROLLUP_PERIODS:
+    QUERIES[f'expense_rollups_{_period}'] = f'''
+        SELECT ec.name, SUM(r.total)
+        FROM expense_rollups_{_period} r
+        CROSS JOIN expense_categories ec ON ec.id = r.category_id
+        WHERE r.{_column} BETWEEN ? AND ?
+        GROUP BY ec.name
+    '''
+    QUERIES[f'revenue_rollups_{_period}'] = f'''
+        SELECT SUM(total) FROM revenue_rollups_{_period} WHERE {_column} BETWEEN ? AND ?
+    '''
+
+# Keyset pagination: a page continues from the sort key of a known row (the cursor id)
+# instead of skipping rows with OFFSET, so every page is one range read of an index.
+# "before" queries return the page in reverse order. Orders compare on coalesce() of the
+# sort columns, because a NULL date or importance would make the row comparison NULL.
+QUERIES.update({
+    'orders_page_first': '''
+        SELECT id, name, recommended_date, importance FROM orders
+        WHERE status_id = ?
+        ORDER BY coalesce(recommended_date, ''), coalesce(importance, 0) DESC, id
+        LIMIT ?
+    ''',
+    'orders_page_after': '''
+        SELECT o.id, o.name, o.recommended_date, o.importance
+        FROM orders c
+        JOIN orders o ON o.status_id = ? AND coalesce(o.recommended_date, '') >= coalesce(c.recommended_date, '')
+            AND (coalesce(o.recommended_date, ''), -coalesce(o.importance, 0), o.id)
+                > (coalesce(c.recommended_date, ''), -coalesce(c.importance, 0), c.id)
+        WHERE c.id = ?
+        ORDER BY coalesce(o.recommended_date, ''), coalesce(o.importance, 0) DESC, o.id
+        LIMIT ?
+    ''',
+    'orders_page_before': '''
+        SELECT o.id, o.name, o.recommended_date, o.importance
+        FROM orders c
+        JOIN orders o ON o.status_id = ? AND coalesce(o.recommended_date, '') <= coalesce(c.recommended_date, '')
+            AND (coalesce(o.recommended_date, ''), -coalesce(o.importance, 0), o.id)
+                < (coalesce(c.recommended_date, ''), -coalesce(c.importance, 0), c.id)
+        WHERE c.id = ?
+        ORDER BY coalesce(o.recommended_date, '') DESC, coalesce(o.importance, 0), o.id DESC
+        LIMIT ?
+    ''',
+    'materials_page_first': 'SELECT id, name, quantity FROM materials ORDER BY name LIMIT ?',
+    'materials_page_after': '''
+        SELECT id, name, quantity FROM materials
+        WHERE name > (SELECT name FROM materials WHERE id = ?)
+        ORDER BY name
+        LIMIT ?
+    ''',
+    'materials_page_before': '''
+        SELECT id, name, quantity FROM materials
+        WHERE name < (SELECT name FROM materials WHERE id = ?)
+        ORDER BY name DESC
+        LIMIT ?
+    ''',
+})
+
+# Full-text search over order name, link and print settings (orders_fts, kept in sync by triggers).
+# bm25 weights: a match in the name counts most, then the link, then the settings.
+QUERIES['search_orders'] = '''
+    SELECT o.id, o.name, o.recommended_date, o.importance, o.status_id
+    FROM orders_fts f
+    JOIN orders o ON o.id = f.rowid
+    WHERE orders_fts MATCH ?
+    ORDER BY bm25(orders_fts, 10.0, 2.0, 1.0)
+    LIMIT ?
+'''
+
+# The trigram tokenizer (SQLite 3.34+) matches any substring of at least 3 characters,
+# case-insensitively; older SQLite falls back to unicode61 and matches word prefixes
+FTS_TRIGRAM = sqlite3.sqlite_version_info >= (3, 34, 0)
+FTS_MIN_TERM = 3 if FTS_TRIGRAM else 1
+
+ORDERS_FTS_SCHEMA = [
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+        name, link, settings, content='orders', content_rowid='id',
+        tokenize='{"trigram" if FTS_TRIGRAM else "unicode61 remove_diacritics 2"}'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_orders_fts_insert AFTER INSERT ON orders BEGIN
+        INSERT INTO orders_fts (rowid, name, link, settings) VALUES (new.id, new.name, new.link, new.settings);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_orders_fts_delete AFTER DELETE ON orders BEGIN
+        INSERT INTO orders_fts (orders_fts, rowid, name, link, settings)
+        VALUES ('delete', old.id, old.name, old.link, old.settings);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_orders_fts_update AFTER UPDATE OF name, link, settings ON orders BEGIN
+        INSERT INTO orders_fts (orders_fts, rowid, name, link, settings)
+        VALUES ('delete', old.id, old.name, old.link, old.settings);
+        INSERT INTO orders_fts (rowid, name, link, settings) VALUES (new.id, new.name, new.link, new.settings);
+    END''',
+]
+
+# Queries that read a whole table by design and are allowed to SCAN
+# (the first materials page walks the name index and stops at LIMIT)
+FULL_SCAN_QUERIES = {'all_materials', 'materials_page_first', 'pricing_history', 'orders_last_id', 'data_versions'}
+
+
+def _rollup_schema() -> list[str]:
+    """Таблицы агрегатов по расходам и доходам и триггеры, которые их обновляют"""
+    statements = []
+    for period, column, length in ROLLUP_PERIODS:
+        expense_key = f'substr(%s.date_spent, 1, {length})'
+        revenue_key = f'substr(%s.date_received, 1, {length})'
+        statements += [
+            f'''CREATE TABLE IF NOT EXISTS expense_rollups_{period} (
+                {column} TEXT NOT NULL,
+                category_id INTEGER NOT NULL,
+                total REAL NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({column}, category_id)
+            ) WITHOUT ROWID''',
+            f'''CREATE TABLE IF NOT EXISTS revenue_rollups_{period} (
+                {column} TEXT PRIMARY KEY,
+                total REAL NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID''',
+        ]
+        expense_add = f'''
+            INSERT INTO expense_rollups_{period} ({column}, category_id, total, count)
+            VALUES ({expense_key % 'NEW'}, NEW.category_id, NEW.amount, 1)
+            ON CONFLICT({column}, category_id) DO UPDATE
+            SET total = total + excluded.total, count = count + 1;'''
+        expense_remove = f'''
+            UPDATE expense_rollups_{period} SET total = total - OLD.amount, count = count - 1
+            WHERE {column} = {expense_key % 'OLD'} AND category_id = OLD.category_id;
+            DELETE FROM expense_rollups_{period}
+            WHERE {column} = {expense_key % 'OLD'} AND category_id = OLD.category_id AND count <= 0;'''
+        revenue_add = f'''
+            INSERT INTO revenue_rollups_{period} ({column}, total, count)
+            SELECT {revenue_key % 'NEW'}, coalesce(NEW.amount, 0), 1 WHERE NEW.date_received IS NOT NULL
+            ON CONFLICT({column}) DO UPDATE SET total = total + excluded.total, count = count + 1;'''
+        revenue_remove = f'''
+            UPDATE revenue_rollups_{period} SET total = total - coalesce(OLD.amount, 0), count = count - 1
+            WHERE {column} = {revenue_key % 'OLD'};
+            DELETE FROM revenue_rollups_{period} WHERE {column} = {revenue_key % 'OLD'} AND count <= 0;'''
+        statements += [
+            f'CREATE TRIGGER IF NOT EXISTS trg_expenses_insert_{period} AFTER INSERT ON expenses '
+            f'BEGIN {expense_add} END',
+            f'CREATE TRIGGER IF NOT EXISTS trg_expenses_delete_{period} AFTER DELETE ON expenses '
+            f'BEGIN {expense_remove} END',
+            f'CREATE TRIGGER IF NOT EXISTS trg_expenses_update_{period} '
+            f'AFTER UPDATE OF amount, date_spent, category_id ON expenses '
+            f'BEGIN {expense_remove} {expense_add} END',
+            f'CREATE TRIGGER IF NOT EXISTS trg_revenue_insert_{period} AFTER INSERT ON revenue '
+            f'BEGIN {revenue_add} END',
+            f'CREATE TRIGGER IF NOT EXISTS trg_revenue_delete_{period} AFTER DELETE ON revenue '
+            f'BEGIN {revenue_remove} END',
+            f'CREATE TRIGGER IF NOT EXISTS trg_revenue_update_{period} '
+            f'AFTER UPDATE OF amount, date_received ON revenue '
+            f'BEGIN {revenue_remove} {revenue_add} END',
+        ]
+    return statements
 
 
 class DatabaseManager:
-    def __init__(self, db_file: str):
+    def __init__(self, db_file: str, pragmas: dict | None = None, create_schema: bool = True,
+                 cache: LRUCache | None = None, query_hook=None):
+        self._savepoint = False
+        self._commit_actions = []
+        self.listeners = []
+        # topic ('orders', 'materials', 'finance') -> number of committed writes
+        self.data_versions = Counter()
+        self.cache = cache if cache is not None else LRUCache()
+        # query_hook(name, seconds, error) is called after every named query
+        self.query_hook = query_hook
         try:
+            self.pragmas = pragmas or {}
             self.conn = self.create_connection(db_file)
-            self.create_tables()
+            if create_schema:
+                self.create_tables()
+            self._load_data_versions()
         except Exception as e:
-            print(e)
+            logger.exception(e)
             self.conn = None
 
     def create_connection(self, db_file: str) -> sqlite3.Connection | None:
         """Создать соединение с базой данных SQLite, указанной в db_file"""
         try:
-            conn = sqlite3.connect(db_file)
+            # The connection may be handed between threads by AsyncDatabaseManager,
+            # which guarantees that only one thread uses it at a time
+            conn = sqlite3.connect(db_file, check_same_thread=False)
             conn.execute("PRAGMA foreign_keys = ON")
+            for pragma, value in self.pragmas.items():
+                conn.execute(f"PRAGMA {pragma} = {value}")
             return conn
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return None
 
+    def _commit(self):
+        """Зафиксировать транзакцию, а внутри группового коммита - только текущую операцию"""
+        if self._savepoint:
+            self.conn.execute('RELEASE SAVEPOINT operation')
+            self._savepoint = False
+        else:
+            self.conn.commit()
+            self._run_commit_actions()
+
+    def _after_commit(self, action):
+        """Выполнить action после фиксации текущей транзакции (используется для обновления кэша)"""
+        self._commit_actions.append(action)
+
+    def _run_commit_actions(self):
+        actions, self._commit_actions = self._commit_actions, []
+        for action in actions:
+            action()
+
+    def subscribe(self, callback):
+        """Подписаться на изменения данных
+
+        callback(event, payload) вызывается после фиксации транзакции, в потоке,
+        выполнившем запись. Исключения подписчиков не влияют на запись.
+        """
+        self.listeners.append(callback)
+
+    def _notify(self, event: str, **payload):
+        self._after_commit(lambda: self._emit(event, payload))
+
+    def _emit(self, event: str, payload: dict):
+        for callback in self.listeners:
+            try:
+                callback(event, payload)
+            except Exception as e:
+                logger.exception(e)
+
+    def _timed(self, name: str, func):
+        """Выполнить func(), сообщив query_hook имя операции, время и была ли ошибка"""
+        if self.query_hook is None:
+            return func()
+        started = time.perf_counter()
+        error = False
+        try:
+            return func()
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.query_hook(name, time.perf_counter() - started, error)
+
+    def _query(self, cursor: sqlite3.Cursor, name: str, params: tuple = ()) -> list[tuple]:
+        """Выполнить именованный запрос из QUERIES и вернуть все строки результата
+
+        cursor.rowcount после вызова содержит число изменённых строк.
+        """
+        return self._timed(name, lambda: cursor.execute(QUERIES[name], params).fetchall())
+
+    def _query_many(self, cursor: sqlite3.Cursor, name: str, rows: list[tuple]):
+        """Выполнить именованный запрос из QUERIES для каждой строки rows (executemany)"""
+        self._timed(name, lambda: cursor.executemany(QUERIES[name], rows))
+
+    def _load_data_versions(self):
+        try:
+            self.data_versions.update(dict(self._query(self.conn.cursor(), 'data_versions')))
+        except sqlite3.OperationalError:
+            # A database created before versions were stored starts from zero
+            pass
+
+    def _bump_version(self, *topics: str):
+        # Stored in the same transaction, so versions survive restarts and are shared by processes
+        self._query_many(self.conn.cursor(), 'bump_data_version', [(topic,) for topic in topics])
+        self._after_commit(lambda: self.data_versions.update(topics))
+
+    def data_version(self, *topics: str) -> tuple:
+        """Версии данных по темам ('orders', 'materials', 'finance')
+
+        Версия темы увеличивается после фиксации каждой записи, затрагивающей её,
+        поэтому по ней можно проверять актуальность построенных из данных экранов.
+        Версии хранятся в таблице data_versions и не сбрасываются при перезапуске.
+        """
+        return tuple(self.data_versions[topic] for topic in topics)
+
+    def _cached(self, key: tuple, load):
+        """Прочитать значение из кэша или загрузить его из базы"""
+        value = self.cache.get(key)
+        if value is MISSING:
+            generation = self.cache.generation
+            value = load()
+            # Data read inside an open transaction may still be rolled back
+            if not self.conn.in_transaction:
+                self.cache.set(key, value, generation)
+        return value
+
+    def _get_or_create_id(self, namespace: str, name: str, insert_query: str, select_query: str,
+                          invalidate: tuple = ()) -> int:
+        """Получить id записи справочника по имени, создав её при необходимости
+
+        Соответствие имени и id кэшируется после фиксации транзакции; при создании
+        новой записи инвалидируются ключи из invalidate.
+        """
+        key = (namespace, name)
+        record_id = self.cache.get(key)
+        if record_id is not MISSING:
+            return record_id
+
+        cursor = self.conn.cursor()
+        self._query(cursor, insert_query, (name,))
+        if cursor.rowcount:
+            self._after_commit(lambda: self.cache.invalidate(*invalidate))
+        record_id = self._query(cursor, select_query, (name,))[0][0]
+        self._after_commit(lambda: self.cache.set(key, record_id))
+        return record_id
+
+    def _resolve_ids(self, cursor: sqlite3.Cursor, names: set[str], insert_query: str,
+                     select_query: str) -> dict[str, int]:
+        """id записей справочника для всех names разом, недостающие записи создаются"""
+        self._query_many(cursor, insert_query, [(name,) for name in names])
+        return dict(self._query(cursor, select_query, (json.dumps(list(names)),)))
+
+    def _invalidate_order(self, order_id: int):
+        """Удалить из кэша все записи заказа, найденные как по id, так и по имени"""
+        self.cache.invalidate_where(
+            lambda key, value: key[0] == 'order' and (
+                (key[1] == 'id' and str(key[2]) == str(order_id)) or (value and str(value[0]) == str(order_id))))
+
+    def run_batch(self, calls: list[tuple[str, tuple, dict]]) -> list:
+        """Выполнить несколько операций записи в одной транзакции
+
+        Каждая операция выполняется внутри своей точки сохранения: если метод не дошёл
+        до фиксации, его изменения откатываются, не затрагивая остальные операции.
+        Возвращает список результатов (или исключений) в порядке вызовов.
+        """
+        results = []
+        if not self.conn.in_transaction:
+            self.conn.execute('BEGIN')
+        try:
+            for name, args, kwargs in calls:
+                actions_mark = len(self._commit_actions)
+                self.conn.execute('SAVEPOINT operation')
+                self._savepoint = True
+                try:
+                    result = getattr(self, name)(*args, **kwargs)
+                except Exception as e:
+                    result = e
+                if self._savepoint:
+                    self.conn.execute('ROLLBACK TO SAVEPOINT operation')
+                    self.conn.execute('RELEASE SAVEPOINT operation')
+                    self._savepoint = False
+                    del self._commit_actions[actions_mark:]
+                results.append(result)
+            self.conn.commit()
+        except Exception:
+            self._savepoint = False
+            self._commit_actions.clear()
+            self.conn.rollback()
+            raise
+        self._run_commit_actions()
+        return results
+
     def create_tables(self) -> int:
         """Создать все необходимые таблицы"""
         tables = [
@@ -51,6 +512,7 @@ class DatabaseManager:
                 payment_info BOOLEAN,
                 status_id INTEGER NOT NULL DEFAULT 1,
                 creation_date TEXT NOT NULL,
+                cost_confirmed BOOLEAN NOT NULL DEFAULT 0,
                 FOREIGN KEY (status_id) REFERENCES order_statuses(id)
             )''',
             '''CREATE TABLE IF NOT EXISTS order_materials (
@@ -69,6 +531,10 @@ class DatabaseManager:
                 description TEXT,
                 FOREIGN KEY (category_id) REFERENCES expense_categories(id)
             )''',
+            '''CREATE TABLE IF NOT EXISTS data_versions (
+                topic TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )''',
             '''CREATE TABLE IF NOT EXISTS revenue (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 order_id INTEGER,
@@ -77,84 +543,155 @@ class DatabaseManager:
                 FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
             )'''
         ]
+        indexes = [
+            'CREATE INDEX IF NOT EXISTS idx_orders_name ON orders(name)',
+            'CREATE INDEX IF NOT EXISTS idx_orders_creation_date ON orders(creation_date)',
+            # Replaced by idx_orders_status_sort, which matches the coalesce() sort of the order pages
+            'DROP INDEX IF EXISTS idx_orders_status',
+            '''CREATE INDEX IF NOT EXISTS idx_orders_status_sort
+                ON orders(status_id, coalesce(recommended_date, ''), coalesce(importance, 0) DESC)''',
+            'CREATE INDEX IF NOT EXISTS idx_order_materials_order_id ON order_materials(order_id)',
+            'CREATE INDEX IF NOT EXISTS idx_order_materials_material_id ON order_materials(material_id)',
+            'CREATE INDEX IF NOT EXISTS idx_expenses_date_spent ON expenses(date_spent)',
+            'CREATE INDEX IF NOT EXISTS idx_expenses_category_id ON expenses(category_id, date_spent)',
+            'CREATE INDEX IF NOT EXISTS idx_revenue_date_received ON revenue(date_received)',
+            'CREATE INDEX IF NOT EXISTS idx_revenue_order_id ON revenue(order_id)',
+        ]
         
         try:
             cursor = self.conn.cursor()
             for table in tables:
                 cursor.execute(table)
+            if 'cost_confirmed' not in {row[1] for row in cursor.execute('PRAGMA table_info(orders)')}:
+                cursor.execute('ALTER TABLE orders ADD COLUMN cost_confirmed BOOLEAN NOT NULL DEFAULT 0')
+                # Existing prices predate the pricing model, so they are not its own estimates
+                cursor.execute('UPDATE orders SET cost_confirmed = 1 WHERE cost > 0')
+            for index in indexes:
+                cursor.execute(index)
+            rollups_missing = cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE name = 'revenue_rollups_daily'").fetchone()[0] == 0
+            for statement in _rollup_schema():
+                cursor.execute(statement)
+            if rollups_missing:
+                # Existing history predates the rollup tables
+                self._fill_finance_rollups(cursor)
+            fts_missing = cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE name = 'orders_fts'").fetchone()[0] == 0
+            for statement in ORDERS_FTS_SCHEMA:
+                cursor.execute(statement)
+            if fts_missing:
+                cursor.execute("INSERT INTO orders_fts (orders_fts) VALUES ('rebuild')")
             
             # Initialize order statuses if empty
             cursor.execute("INSERT OR IGNORE INTO order_statuses (id, name) VALUES (1, 'pending'), (2, 'completed')")
-            self.conn.commit()
+            self._commit()
             return 1
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
 
     def update_material(self, material_name: str, amount: int, operation: str) -> int | float:
         """Обновить количество материала в базе данных"""
         try:
             cursor = self.conn.cursor()
-            cursor.execute('''INSERT OR IGNORE INTO materials (name, quantity) VALUES (?, 0)''', 
-                         (material_name,))
-            
-            cursor.execute('SELECT quantity FROM materials WHERE name = ?', (material_name,))
-            result = cursor.fetchone()
-            
+            # Both operations are a single conditional statement, so concurrent
+            # updates of the same material can not overdraw it
             match operation:
                 case 'add':
-                    new_quantity = result[0] + amount
-                    cursor.execute('UPDATE materials SET quantity = ? WHERE name = ?',
-                                 (new_quantity, material_name))
+                    result = self._query(cursor, 'add_material_quantity', (material_name, amount))
                 case 'subtract':
-                    if result[0] >= amount:
-                        new_quantity = result[0] - amount
-                        cursor.execute('UPDATE materials SET quantity = ? WHERE name = ?',
-                                     (new_quantity, material_name))
-                    else:
-                        return -1
+                    result = self._query(cursor, 'subtract_material_quantity', (amount, material_name, amount))
                 case _:
                     raise ValueError("Invalid operation")
-                    
-            self.conn.commit()
-            return new_quantity if 'new_quantity' in locals() else amount
+
+            if not result:
+                return -1
+
+            self._after_commit(lambda: self.cache.invalidate(('materials',), ('material', material_name)))
+            self._bump_version('materials')
+            self._commit()
+            return result[0][0]
+        except Exception as e:
+            logger.exception(e)
+            return 0
+
+    def adjust_materials(self, deltas: list[tuple[str, int]], atomic: bool = False) -> list[tuple[str, int | None]] | int:
+        """Изменить количество нескольких материалов в одной транзакции
+
+        Положительная дельта добавляет материал, отрицательная - списывает его.
+        Для каждой позиции возвращается (название, новое количество) или (название, -1),
+        если материала не хватило. При atomic=True нехватка любой позиции отменяет все изменения,
+        а позиции, которых хватало, возвращаются как (название, None).
+        """
+        try:
+            cursor = self.conn.cursor()
+            # Outside a transaction, releasing the savepoint would commit by itself,
+            # before the version bump and _commit
+            began = not self.conn.in_transaction
+            if began:
+                cursor.execute('BEGIN')
+            cursor.execute('SAVEPOINT adjust_materials')
+            results = []
+            for material_name, delta in deltas:
+                if delta >= 0:
+                    row = self._query(cursor, 'add_material_quantity', (material_name, delta))
+                else:
+                    row = self._query(cursor, 'subtract_material_quantity', (-delta, material_name, -delta))
+                results.append((material_name, row[0][0] if row else -1))
+
+            if atomic and any(quantity == -1 for _, quantity in results):
+                cursor.execute('ROLLBACK TO SAVEPOINT adjust_materials')
+                cursor.execute('RELEASE SAVEPOINT adjust_materials')
+                if began:
+                    self.conn.rollback()
+                return [(material_name, quantity if quantity == -1 else None) for material_name, quantity in results]
+
+            cursor.execute('RELEASE SAVEPOINT adjust_materials')
+            changed = [('material', material_name) for material_name, quantity in results if quantity != -1]
+            self._after_commit(lambda: self.cache.invalidate(('materials',), *changed))
+            self._bump_version('materials')
+            self._commit()
+            return results
         except Exception as e:
-            print(e)
+            logger.exception(e)
+            if not self._savepoint:
+                self._commit_actions.clear()
+                self.conn.rollback()
             return 0
 
     def add_order(self, name: str, link: str, material: str, material_amount: int, 
                  recommended_date: str, importance: int, settings: str, cost: float, 
-                 payment_info: bool, done: bool, creation_date: str) -> int:
-        """Добавить новый заказ в базу данных"""
+                 payment_info: bool, done: bool, creation_date: str, cost_confirmed: bool = True) -> int:
+        """Добавить новый заказ в базу данных
+
+        cost_confirmed=False - стоимость только предложена моделью цены и не попадает
+        в историю для её обучения, пока пользователь её не подтвердит.
+        """
         try:
             cursor = self.conn.cursor()
             status_id = 2 if done else 1
             
             # Add order
-            cursor.execute('''
-                INSERT INTO orders (name, link, recommended_date, importance, settings, 
-                                  cost, payment_info, status_id, creation_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (name, link, recommended_date, importance, settings, cost, 
-                 payment_info, status_id, creation_date))
+            self._query(cursor, 'insert_order', (name, link, recommended_date, importance, settings, cost,
+                                                 payment_info, status_id, creation_date, cost_confirmed))
             
             order_id = cursor.lastrowid
             
             # Ensure material exists and add order_materials relation
-            cursor.execute('INSERT OR IGNORE INTO materials (name, quantity) VALUES (?, 0)',
-                         (material,))
-            cursor.execute('SELECT id FROM materials WHERE name = ?', (material,))
-            material_id = cursor.fetchone()[0]
+            material_id = self._get_or_create_id('material_id', material, 'insert_material', 'material_id',
+                                                 invalidate=(('materials',), ('material', material)))
             
-            cursor.execute('''
-                INSERT INTO order_materials (order_id, material_id, quantity)
-                VALUES (?, ?, ?)
-            ''', (order_id, material_id, material_amount))
+            self._query(cursor, 'insert_order_material', (order_id, material_id, material_amount))
             
-            self.conn.commit()
+            self._after_commit(lambda: self.cache.invalidate(('order', 'name', name), ('order', 'id', order_id)))
+            self._bump_version('orders', 'materials')
+            self._notify('order_added', id=order_id, name=name, recommended_date=recommended_date,
+                         importance=importance, creation_date=creation_date, material=material,
+                         material_amount=material_amount, done=done, cost_confirmed=cost_confirmed)
+            self._commit()
             return order_id
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return -1
 
     def delete_unpaid_orders(self) -> int:
@@ -163,97 +700,168 @@ class DatabaseManager:
             cursor = self.conn.cursor()
             ten_days_ago = datetime.now() - timedelta(days=10)
             ten_days_ago_str = ten_days_ago.strftime('%Y-%m-%d')
-            cursor.execute('''
-                DELETE FROM orders 
-                WHERE creation_date <= ? AND (payment_info = 0 OR payment_info IS NULL)
-            ''', (ten_days_ago_str,))
-            self.conn.commit()
+            self._query(cursor, 'delete_unpaid_orders', (ten_days_ago_str,))
+            self._after_commit(lambda: self.cache.invalidate_namespace('order'))
+            self._notify('orders_purged')
+            self._bump_version('orders', 'finance')
+            self._commit()
             return 1
         except Exception as e:
-            print(e)
+            logger.exception(e)
+            return 0
+
+    def _delete_orders_chunk(self, query_name: str, cutoff_date: datetime, limit: int) -> int:
+        try:
+            cursor = self.conn.cursor()
+            self._query(cursor, query_name, (cutoff_date.strftime('%Y-%m-%d'), limit))
+            deleted = cursor.rowcount
+            if deleted:
+                self._after_commit(lambda: self.cache.invalidate_namespace('order'))
+                self._notify('orders_purged')
+                self._bump_version('orders', 'finance')
+            self._commit()
+            return deleted
+        except Exception as e:
+            logger.exception(e)
+            return -1
+
+    def delete_unpaid_orders_chunk(self, limit: int = 500, days: int = 10) -> int:
+        """Удалить не более limit неоплаченных заказов старше days дней
+
+        В отличие от delete_unpaid_orders держит блокировку записи только на время одной порции.
+        Возвращает количество удалённых заказов или -1 в случае ошибки.
+        """
+        return self._delete_orders_chunk('delete_unpaid_orders_chunk', datetime.now() - timedelta(days=days), limit)
+
+    def auto_delete_expired_records_chunk(self, days: int, limit: int = 500) -> int:
+        """Удалить не более limit заказов старше days дней
+
+        Возвращает количество удалённых заказов или -1 в случае ошибки.
+        """
+        return self._delete_orders_chunk('delete_expired_orders_chunk', datetime.now() - timedelta(days=days), limit)
+
+    def optimize(self) -> int:
+        """Обновить статистику планировщика и вернуть свободные страницы файлу базы"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('PRAGMA optimize')
+            if cursor.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                cursor.execute('PRAGMA incremental_vacuum').fetchall()
+            self._commit()
+            return 1
+        except Exception as e:
+            logger.exception(e)
             return 0
 
     def get_order(self, info: str, key: str = 'id') -> tuple | int:
         """Получить информацию о заказе по ID"""
         try:
             cursor = self.conn.cursor()
-            if key == 'id':
-                query = '''
-                    SELECT o.*, m.name as material, om.quantity as material_amount 
-                    FROM orders o
-                    LEFT JOIN order_materials om ON o.id = om.order_id
-                    LEFT JOIN materials m ON om.material_id = m.id
-                    WHERE o.id = ?
-                '''
-            else:
-                query = '''
-                    SELECT o.*, m.name as material, om.quantity as material_amount 
-                    FROM orders o
-                    LEFT JOIN order_materials om ON o.id = om.order_id
-                    LEFT JOIN materials m ON om.material_id = m.id
-                    WHERE o.name = ?
-                '''
-            cursor.execute(query, (info,))
-            return cursor.fetchone()
-        except Exception as e:
-            print(e)
+            query = 'get_order_by_id' if key == 'id' else 'get_order_by_name'
+            return self._cached(('order', 'id' if key == 'id' else 'name', info),
+                                lambda: next(iter(self._query(cursor, query, (info,))), None))
+        except Exception as e:
+            logger.exception(e)
             return 0
 
     def delete_order(self, order_id: int) -> int:
         """Удалить заказ по ID"""
         try:
             cursor = self.conn.cursor()
-            cursor.execute('DELETE FROM orders WHERE id = ?', (order_id,))
-            self.conn.commit()
+            self._query(cursor, 'delete_order', (order_id,))
+            self._after_commit(lambda: self._invalidate_order(order_id))
+            self._notify('order_deleted', id=order_id)
+            self._bump_version('orders', 'finance')
+            self._commit()
             return 1
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
 
     def add_revenue(self, order_id: int, amount: float, date_received: str) -> int:
         """Добавить запись о доходе от заказа"""
         try:
             cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT INTO revenue (order_id, amount, date_received)
-                VALUES (?, ?, ?)
-            ''', (order_id, amount, date_received))
-            self.conn.commit()
+            self._query(cursor, 'insert_revenue', (order_id, amount, date_received))
+            self._bump_version('finance')
+            self._commit()
             return 1
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
 
+    def import_rows(self, kind: str, rows: list[tuple]) -> int:
+        """Добавить порцию строк импорта (data/importer.py) одной транзакцией
+
+        kind - 'orders' (строки в порядке аргументов add_order), 'expenses' (как у add_expense)
+        или 'materials' ((название, количество), количество прибавляется к остатку).
+        Материалы и категории ищутся одним запросом на порцию, вставка - executemany.
+        Возвращает количество добавленных строк или -1 в случае ошибки (порция не записывается).
+        """
+        try:
+            cursor = self.conn.cursor()
+            match kind:
+                case 'orders':
+                    material_ids = self._resolve_ids(cursor, {row[2] for row in rows}, 'insert_material',
+                                                     'material_ids')
+                    self._query_many(cursor, 'insert_order', [
+                        (name, link, recommended_date, importance, settings, cost, payment_info,
+                         2 if done else 1, creation_date, True)
+                        for name, link, _, _, recommended_date, importance, settings, cost, payment_info, done,
+                        creation_date in rows])
+                    # AUTOINCREMENT ids of one executemany are consecutive, the writer is exclusive
+                    first_id = self._query(cursor, 'orders_last_id')[0][0] - len(rows) + 1
+                    self._query_many(cursor, 'insert_order_material', [
+                        (first_id + i, material_ids[row[2]], row[3]) for i, row in enumerate(rows)])
+                    self._after_commit(lambda: (self.cache.invalidate_namespace('order'),
+                                                self.cache.invalidate_namespace('material'),
+                                                self.cache.invalidate(('materials',))))
+                    self._bump_version('orders', 'materials')
+                    self._notify('orders_imported', count=len(rows))
+                case 'expenses':
+                    category_ids = self._resolve_ids(cursor, {row[0] for row in rows}, 'insert_category',
+                                                     'category_ids')
+                    self._query_many(cursor, 'insert_expense', [
+                        (category_ids[category], amount, date_spent, description)
+                        for category, amount, date_spent, description in rows])
+                    self._bump_version('finance')
+                case 'materials':
+                    self._query_many(cursor, 'add_material_quantity', rows)
+                    self._after_commit(lambda: (self.cache.invalidate_namespace('material'),
+                                                self.cache.invalidate(('materials',))))
+                    self._bump_version('materials')
+                case _:
+                    raise ValueError(f'Unknown import kind: {kind}')
+            self._commit()
+            return len(rows)
+        except Exception as e:
+            logger.exception(e)
+            if not self._savepoint:
+                self._commit_actions.clear()
+                self.conn.rollback()
+            return -1
+
     def add_expense(self, category: str, amount: float, date_spent: str, description: str) -> int:
         """Добавить запись о расходах"""
         try:
             cursor = self.conn.cursor()
-            cursor.execute('INSERT OR IGNORE INTO expense_categories (name) VALUES (?)',
-                         (category,))
-            cursor.execute('SELECT id FROM expense_categories WHERE name = ?', (category,))
-            category_id = cursor.fetchone()[0]
+            category_id = self._get_or_create_id('category_id', category, 'insert_category', 'category_id')
             
-            cursor.execute('''
-                INSERT INTO expenses (category_id, amount, date_spent, description)
-                VALUES (?, ?, ?, ?)
-            ''', (category_id, amount, date_spent, description))
-            
-            self.conn.commit()
+            self._query(cursor, 'insert_expense', (category_id, amount, date_spent, description))
+            self._bump_version('finance')
+            self._commit()
             return 1
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
 
     def get_all_materials_excel(self, excel_path: str) -> int:
-        """Экспортировать данные из таблицы inventory в файл Excel"""
+        """Экспортировать данные из таблицы materials в файл Excel"""
         try:
-            query = "SELECT * FROM inventory"
-            df = pd.read_sql_query(query, self.conn)
-            df.to_excel(excel_path, index=False)
-
+            export_queries_to_excel(self.conn, excel_path, [('Sheet1', QUERIES['all_materials'], ())])
             return 1
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
 
     def get_last_month_date_range(self) -> tuple[datetime | None, datetime | None]:
@@ -265,75 +873,40 @@ class DatabaseManager:
             first_day_last_month = last_day_last_month.replace(day=1)
             return first_day_last_month, last_day_last_month
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return None, None
 
     def export_last_month_data_to_excel(self, excel_path: str) -> int:
         """Экспортировать данные расходов и доходов за последний календарный месяц в один файл Excel"""
         try:
-            self.create_expenses_table()
-            self.create_revenue_table()
-
             start_date, end_date = self.get_last_month_date_range()
-
-            expenses_query = '''
-                SELECT * FROM expenses
-                WHERE date_spent BETWEEN ? AND ?
-            '''
-            revenue_query = '''
-                SELECT * FROM revenue
-                WHERE date_received BETWEEN ? AND ?
-            '''
-
-            expenses_df = pd.read_sql_query(expenses_query, self.conn,
-                                            params=(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
-            revenue_df = pd.read_sql_query(revenue_query, self.conn,
-                                           params=(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
-            with pd.ExcelWriter(excel_path) as writer:
-                expenses_df.to_excel(writer, sheet_name='Expenses', index=False)
-                revenue_df.to_excel(writer, sheet_name='Revenue', index=False)
-
-            return 1
+            return self.export_expenses_and_revenue_between_dates_to_excel(
+                start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), excel_path)
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
 
     def export_orders_to_excel(self, excel_path: str, done: bool = True) -> int:
         try:
-            query = '''
-                SELECT * FROM orders
-                WHERE done = ?
-                ORDER BY recommended_date, importance DESC
-            '''
-
-            df = pd.read_sql_query(query, self.conn, params=(int(done),))
-
+            status_id = 2 if done else 1
             sheet_name = 'Completed Orders' if done else 'Pending Orders'
-            df.to_excel(excel_path, sheet_name=sheet_name, index=False)
-
+            export_queries_to_excel(self.conn, excel_path,
+                                    [(sheet_name, QUERIES['orders_by_status'], (status_id,))])
             return 1
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
 
     def export_expenses_and_revenue_between_dates_to_excel(self, start_date: str, end_date: str, excel_path: str) -> int:
         """Получить расходы и доходы между указанными датами и сохранить их в Excel"""
         try:
-            cursor = self.conn.cursor()
-
-            expenses_query = "SELECT * FROM expenses WHERE date_spent BETWEEN ? AND ?"
-            expenses_df = pd.read_sql_query(expenses_query, self.conn, params=(start_date, end_date))
-
-            revenue_query = "SELECT * FROM revenue WHERE date_received BETWEEN ? AND ?"
-            revenue_df = pd.read_sql_query(revenue_query, self.conn, params=(start_date, end_date))
-
-            with pd.ExcelWriter(excel_path) as writer:
-                expenses_df.to_excel(writer, sheet_name='Expenses', index=False)
-                revenue_df.to_excel(writer, sheet_name='Revenue', index=False)
-
+            export_queries_to_excel(self.conn, excel_path, [
+                ('Expenses', QUERIES['expenses_between'], (start_date, end_date)),
+                ('Revenue', QUERIES['revenue_between'], (start_date, end_date)),
+            ])
             return 1
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
 
     def auto_delete_expired_records(self, days: int) -> int:
@@ -342,39 +915,34 @@ class DatabaseManager:
             cursor = self.conn.cursor()
             cutoff_date = datetime.now() - timedelta(days=days)
             cutoff_date_str = cutoff_date.strftime('%Y-%m-%d')
-            cursor.execute(f"DELETE FROM orders WHERE creation_date <= ?", (cutoff_date_str,))
-            self.conn.commit()
+            self._query(cursor, 'delete_expired_orders', (cutoff_date_str,))
+            self._after_commit(lambda: self.cache.invalidate_namespace('order'))
+            self._notify('orders_purged')
+            self._bump_version('orders', 'finance')
+            self._commit()
             return 1
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
 
     def get_material_by_name(self, material_name: str) -> tuple | int:
         """Получить информацию о материале по названию"""
         try:
             cursor = self.conn.cursor()
-            cursor.execute('SELECT name, quantity FROM materials WHERE name = ?', 
-                         (material_name,))
-            return cursor.fetchone()
+            return self._cached(('material', material_name),
+                                lambda: next(iter(self._query(cursor, 'material_by_name', (material_name,))), None))
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
 
     def get_expenses_by_category(self, category: str, excel_path: str) -> int:
         """Получить список расходов по категории и экспортировать в Excel"""
         try:
-            cursor = self.conn.cursor()
-            query = '''
-                SELECT e.amount, e.date_spent, e.description 
-                FROM expenses e
-                JOIN expense_categories ec ON e.category_id = ec.id
-                WHERE ec.name = ?
-            '''
-            df = pd.read_sql_query(query, self.conn, params=(category,))
-            df.to_excel(excel_path, index=False)
+            export_queries_to_excel(self.conn, excel_path,
+                                    [('Sheet1', QUERIES['expenses_by_category'], (category,))])
             return 1
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
 
     def update_order_status(self, order_id: int, done: bool) -> int:
@@ -382,12 +950,101 @@ class DatabaseManager:
         try:
             cursor = self.conn.cursor()
             status_id = 2 if done else 1
-            cursor.execute('UPDATE orders SET status_id = ? WHERE id = ?', 
-                         (status_id, order_id))
-            self.conn.commit()
+            self._query(cursor, 'update_order_status', (status_id, order_id))
+            self._after_commit(lambda: self._invalidate_order(order_id))
+            self._notify('order_status_updated', id=order_id, done=done)
+            self._bump_version('orders')
+            self._commit()
+            return 1
+        except Exception as e:
+            logger.exception(e)
+            return 0
+
+    def update_order_cost(self, order_id: int, cost: float) -> int:
+        """Изменить стоимость заказа по ID"""
+        try:
+            cursor = self.conn.cursor()
+            self._query(cursor, 'update_order_cost', (cost, order_id))
+            self._after_commit(lambda: self._invalidate_order(order_id))
+            self._notify('order_cost_updated', id=order_id, cost=cost)
+            self._bump_version('orders')
+            self._commit()
             return 1
         except Exception as e:
-            print(e)
+            logger.exception(e)
+            return 0
+
+    def confirm_order_cost(self, order_id: int) -> int:
+        """Подтвердить предложенную стоимость заказа, после этого она учится моделью цены"""
+        try:
+            cursor = self.conn.cursor()
+            rows = self._query(cursor, 'confirm_order_cost', (order_id,))
+            if not rows:
+                return -1
+            self._after_commit(lambda: self._invalidate_order(order_id))
+            self._notify('order_cost_updated', id=order_id, cost=rows[0][0])
+            self._bump_version('orders')
+            self._commit()
+            return 1
+        except Exception as e:
+            logger.exception(e)
+            return 0
+
+    def mark_order_paid(self, order_id: int, date_received: str) -> int:
+        """Отметить заказ оплаченным и записать доход на его стоимость
+
+        Оплаченные заказы не удаляет очистка неоплаченных (delete_unpaid_orders).
+        Возвращает 1, -1, если заказа нет или он уже оплачен, 0 в случае ошибки.
+        """
+        try:
+            cursor = self.conn.cursor()
+            rows = self._query(cursor, 'mark_order_paid', (order_id,))
+            if not rows:
+                return -1
+            self._query(cursor, 'insert_revenue', (order_id, rows[0][0] or 0, date_received))
+            self._after_commit(lambda: self._invalidate_order(order_id))
+            self._notify('order_paid', id=order_id, amount=rows[0][0] or 0)
+            self._bump_version('orders', 'finance')
+            self._commit()
+            return 1
+        except Exception as e:
+            logger.exception(e)
+            if not self._savepoint:
+                self._commit_actions.clear()
+                self.conn.rollback()
+            return 0
+
+    def get_pricing_history(self) -> list[tuple] | int:
+        """История заказов с подтверждённой ценой для обучения модели цены (data/pricing.py)
+
+        Возвращает строки (cost, material, grams, importance, recommended_date, creation_date).
+        """
+        try:
+            cursor = self.conn.cursor()
+            return self._query(cursor, 'pricing_history')
+        except Exception as e:
+            logger.exception(e)
+            return 0
+
+    def get_material_consumption(self, since: str) -> list[tuple] | int:
+        """Расход материалов по заказам, созданным начиная с since (data/forecast.py)
+
+        Возвращает строки (material, creation_date, quantity).
+        """
+        try:
+            cursor = self.conn.cursor()
+            return self._query(cursor, 'material_consumption', (since,))
+        except Exception as e:
+            logger.exception(e)
+            return 0
+
+    def get_pending_material_demand(self) -> list[tuple] | int:
+        """Сколько каждого материала нужно невыполненным заказам: строки (material, quantity)"""
+        try:
+            cursor = self.conn.cursor()
+            return self._query(cursor, 'pending_material_demand')
+        except Exception as e:
+            logger.exception(e)
             return 0
 
     def close_connection(self) -> int:
@@ -398,15 +1055,192 @@ class DatabaseManager:
                 return 1
             return 0
         except Exception as e:
-            print(e)
+            logger.exception(e)
+            return 0
+
+    def _fill_finance_rollups(self, cursor: sqlite3.Cursor):
+        for period, column, length in ROLLUP_PERIODS:
+            cursor.execute(f'DELETE FROM expense_rollups_{period}')
+            cursor.execute(f'DELETE FROM revenue_rollups_{period}')
+            cursor.execute(f'''
+                INSERT INTO expense_rollups_{period} ({column}, category_id, total, count)
+                SELECT substr(date_spent, 1, {length}), category_id, SUM(amount), COUNT(*)
+                FROM expenses GROUP BY 1, 2
+            ''')
+            cursor.execute(f'''
+                INSERT INTO revenue_rollups_{period} ({column}, total, count)
+                SELECT substr(date_received, 1, {length}), SUM(coalesce(amount, 0)), COUNT(*)
+                FROM revenue WHERE date_received IS NOT NULL GROUP BY 1
+            ''')
+
+    def rebuild_finance_rollups(self) -> int:
+        """Пересчитать агрегаты расходов и доходов по всей истории"""
+        try:
+            self._fill_finance_rollups(self.conn.cursor())
+            self._commit()
+            return 1
+        except Exception as e:
+            logger.exception(e)
+            return 0
+
+    def get_finance_totals(self, start_date: str, end_date: str) -> dict | int:
+        """Получить суммы доходов и расходов (всего и по категориям) за период по агрегатам
+
+        Полные месяцы периода берутся из месячных агрегатов, неполные края - из дневных,
+        поэтому стоимость запроса не зависит от количества записей о расходах и доходах.
+        """
+        try:
+            cursor = self.conn.cursor()
+            start = date.fromisoformat(str(start_date)[:10])
+            end = date.fromisoformat(str(end_date)[:10])
+            first_month = start if start.day == 1 else (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+            end_of_month = end.replace(day=calendar.monthrange(end.year, end.month)[1])
+            last_month = end.replace(day=1) if end == end_of_month else end.replace(day=1) - timedelta(days=1)
+
+            ranges = []
+            if first_month <= last_month:
+                ranges.append(('monthly', first_month.isoformat()[:7], last_month.isoformat()[:7]))
+                last_month_end = last_month.replace(day=calendar.monthrange(last_month.year, last_month.month)[1])
+                if start < first_month:
+                    ranges.append(('daily', start.isoformat(), (first_month - timedelta(days=1)).isoformat()))
+                if last_month_end < end:
+                    ranges.append(('daily', (last_month_end + timedelta(days=1)).isoformat(), end.isoformat()))
+            elif start <= end:
+                ranges.append(('daily', start.isoformat(), end.isoformat()))
+
+            revenue = 0.0
+            categories = {}
+            for period, range_start, range_end in ranges:
+                revenue += self._query(cursor, f'revenue_rollups_{period}', (range_start, range_end))[0][0] or 0
+                for category, total in self._query(cursor, f'expense_rollups_{period}', (range_start, range_end)):
+                    categories[category] = categories.get(category, 0) + total
+
+            categories = {category: round(total, 2) for category, total in categories.items() if round(total, 2)}
+            return {
+                'revenue': round(revenue, 2),
+                'expenses': round(sum(categories.values()), 2),
+                'categories': dict(sorted(categories.items(), key=lambda item: -item[1])),
+            }
+        except Exception as e:
+            logger.exception(e)
+            return 0
+
+    def get_pending_orders(self) -> list[tuple] | int:
+        """Получить все невыполненные заказы (id, name, recommended_date, importance, creation_date)"""
+        try:
+            cursor = self.conn.cursor()
+            return self._query(cursor, 'pending_orders')
+        except Exception as e:
+            logger.exception(e)
+            return 0
+
+    def _keyset_page(self, name: str, params: tuple, after: int | None, before: int | None,
+                     limit: int) -> dict:
+        cursor = self.conn.cursor()
+        page = None
+        if after:
+            rows = self._query(cursor, f'{name}_after', (*params, after, limit + 1))
+            page = {'rows': rows[:limit], 'has_prev': True, 'has_next': len(rows) > limit}
+        elif before:
+            rows = self._query(cursor, f'{name}_before', (*params, before, limit + 1))
+            page = {'rows': rows[:limit][::-1], 'has_prev': len(rows) > limit, 'has_next': True}
+        if page is None or not page['rows']:
+            # No cursor, or the cursor row is gone: start from the beginning
+            rows = self._query(cursor, f'{name}_first', (*params, limit + 1))
+            page = {'rows': rows[:limit], 'has_prev': False, 'has_next': len(rows) > limit}
+        return page
+
+    def get_orders_page(self, status_id: int, after: int | None = None, before: int | None = None,
+                        limit: int = 10) -> dict | int:
+        """Страница заказов со статусом status_id по дате выполнения и важности
+
+        after/before - id заказа, после или до которого начинается страница.
+        Возвращает {'rows': [(id, name, recommended_date, importance)], 'has_prev', 'has_next'}.
+        """
+        try:
+            return self._keyset_page('orders_page', (status_id,), after, before, limit)
+        except Exception as e:
+            logger.exception(e)
+            return 0
+
+    def get_materials_page(self, after: int | None = None, before: int | None = None,
+                           limit: int = 10) -> dict | int:
+        """Страница материалов по названию
+
+        after/before - id материала, после или до которого начинается страница.
+        Возвращает {'rows': [(id, name, quantity)], 'has_prev', 'has_next'}.
+        """
+        try:
+            return self._keyset_page('materials_page', (), after, before, limit)
+        except Exception as e:
+            logger.exception(e)
             return 0
 
+    def search_orders(self, query: str, limit: int = 10) -> list[tuple] | int:
+        """Найти заказы по части названия, ссылки или настроек печати
+
+        Каждое слово запроса (не короче FTS_MIN_TERM символов) должно встречаться в заказе
+        (без trigram - как начало слова); результаты упорядочены по релевантности. Возвращает строки
+        (id, name, recommended_date, importance, status_id).
+        """
+        try:
+            terms = [term for term in query.split() if len(term) >= FTS_MIN_TERM]
+            if not terms:
+                return []
+            suffix = '' if FTS_TRIGRAM else '*'
+            match = ' '.join('"' + term.replace('"', '""') + '"' + suffix for term in terms)
+            cursor = self.conn.cursor()
+            return self._query(cursor, 'search_orders', (match, limit))
+        except Exception as e:
+            logger.exception(e)
+            return 0
+
+    def check_query_plans(self) -> dict[str, list[str]]:
+        """Проверить планы запросов и вернуть те, что выполняют полный просмотр таблицы
+
+        Для каждого запроса из QUERIES выполняется EXPLAIN QUERY PLAN. Запрос попадает
+        в результат, если в плане есть SCAN и он не входит в FULL_SCAN_QUERIES. Также
+        проверяется, что у каждого внешнего ключа есть индекс, иначе каскадное удаление
+        просматривает дочернюю таблицу целиком.
+        """
+        problems = {}
+        cursor = self.conn.cursor()
+        for name, query in QUERIES.items():
+            params = (None,) * query.count('?')
+            cursor.execute(f'EXPLAIN QUERY PLAN {query}', params)
+            plan = [row[3] for row in cursor.fetchall()]
+            # A virtual table "scan" with an index (FTS MATCH) is an index lookup
+            if name not in FULL_SCAN_QUERIES and any(
+                    step.startswith('SCAN') and 'VIRTUAL TABLE INDEX' not in step for step in plan):
+                problems[name] = plan
+
+        tables = [row[0] for row in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        for table in tables:
+            indexed = {cursor.execute(f'PRAGMA index_info("{index[1]}")').fetchone()[2]
+                       for index in cursor.execute(f'PRAGMA index_list("{table}")').fetchall()}
+            for fk in cursor.execute(f'PRAGMA foreign_key_list("{table}")').fetchall():
+                if fk[3] not in indexed:
+                    problems[f'{table}.{fk[3]} -> {fk[2]}'] = ['foreign key column is not indexed']
+        return problems
+
     def get_all_materials(self) -> list[tuple] | int:
         """Получить список всех материалов из базы данных"""
         try:
             cursor = self.conn.cursor()
-            cursor.execute('SELECT name, quantity FROM materials')
-            return cursor.fetchall()
+            return list(self._cached(('materials',),
+                                     lambda: tuple(self._query(cursor, 'all_materials'))))
         except Exception as e:
-            print(e)
+            logger.exception(e)
             return 0
+
+
+if __name__ == '__main__':
+    import sys
+
+    db_manager = DatabaseManager(sys.argv[1] if len(sys.argv) > 1 else ':memory:')
+    regressions = db_manager.check_query_plans()
+    for query_name, query_plan in regressions.items():
+        print(f'{query_name}: {" | ".join(query_plan)}')
+    db_manager.close_connection()
+    sys.exit(1 if regressions else 0)
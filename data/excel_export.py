@@ -0,0 +1,26 @@
+import sqlite3
+
+
+CHUNK_SIZE = 1000
+
+
+def export_queries_to_excel(conn: sqlite3.Connection, excel_path: str,
+                            sheets: list[tuple[str, str, tuple]], chunk_size: int = CHUNK_SIZE):
+    """Записать результаты запросов в файл Excel, по листу на запрос
+
+    sheets - список кортежей (название листа, запрос, параметры). Строки читаются
+    из курсора порциями по chunk_size и сразу пишутся в книгу в режиме write-only,
+    поэтому потребление памяти не зависит от количества выгружаемых строк.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for title, query, params in sheets:
+        sheet = workbook.create_sheet(title)
+        cursor = conn.execute(query, params)
+        sheet.append([column[0] for column in cursor.description])
+        while rows := cursor.fetchmany(chunk_size):
+            for row in rows:
+                sheet.append(row)
+        cursor.close()
+    workbook.save(excel_path)
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from datetime import date, timedelta
+
+
+# Stock lasting longer than this has no depletion date (and cannot overflow date)
+FORECAST_HORIZON_DAYS = 3650
+
+def compute_rates(rows: list[tuple], today: date, window_days: int = 90, short_window: int = 7,
+                  long_window: int = 30) -> dict[str, float]:
+    """Суточный расход материалов (грамм в день) по строкам (material, creation_date, quantity)
+
+    Расход по дням сворачивается в таблицу дата x материал, по ней считаются скользящие
+    средние за short_window и long_window дней; берётся большее из двух на сегодня,
+    чтобы недавний рост расхода сразу сокращал прогноз.
+    """
+    import pandas as pd
+
+    if not rows:
+        return {}
+    frame = pd.DataFrame(rows, columns=['material', 'date', 'quantity'])
+    frame['date'] = pd.to_datetime(frame['date'].astype(str).str[:10], errors='coerce')
+    frame['quantity'] = pd.to_numeric(frame['quantity'], errors='coerce')
+    frame = frame.dropna()
+    if frame.empty:
+        return {}
+    daily = frame.pivot_table(index='date', columns='material', values='quantity', aggfunc='sum')
+    days = pd.date_range(pd.Timestamp(today) - pd.Timedelta(days=window_days - 1), pd.Timestamp(today))
+    daily = daily.reindex(days, fill_value=0).fillna(0)
+    short = daily.rolling(short_window, min_periods=1).mean().iloc[-1]
+    long = daily.rolling(long_window, min_periods=1).mean().iloc[-1]
+    return {material: float(rate) for material, rate in pd.concat([short, long], axis=1).max(axis=1).items()}
+
+
+class MaterialForecast:
+    """Прогноз исчерпания материалов.
+
+    Доступный остаток = quantity минус материал, уже нужный невыполненным заказам;
+    дата исчерпания = сегодня + остаток / суточный расход (compute_rates по заказам
+    за window_days). Расход пересчитывается не чаще раза в rates_ttl секунд (и при
+    смене дня), спрос невыполненных заказов - при изменении заказов; если изменились
+    только остатки, прогноз пересчитывается по сохранённым расходу и спросу без
+    тяжёлых запросов. Версии берутся из db.data_version.
+    """
+
+    def __init__(self, db, window_days: int = 90, rates_ttl: float = 3600):
+        self.db = db
+        self.window_days = window_days
+        self.rates_ttl = rates_ttl
+        self.alerted: set[str] = set()
+        self._rates: dict[str, float] = {}
+        self._rates_key = None
+        self._rates_at = 0.0
+        self._pending: dict[str, int] = {}
+        self._pending_version = None
+        self._forecast: list[dict] | None = None
+        self._forecast_key = None
+        self._lock = asyncio.Lock()
+
+    async def _refresh_rates(self, today: date, orders_version: tuple):
+        if self._rates_key is not None and self._rates_key[0] == today and (
+                self._rates_key[1] == orders_version or time.monotonic() - self._rates_at < self.rates_ttl):
+            return
+        rows = await self.db.get_material_consumption((today - timedelta(days=self.window_days - 1)).isoformat())
+        if rows == 0:
+            return
+        loop = asyncio.get_running_loop()
+        self._rates = await loop.run_in_executor(None, compute_rates, rows, today, self.window_days)
+        self._rates_key = (today, orders_version)
+        self._rates_at = time.monotonic()
+
+    async def forecast(self) -> list[dict] | int:
+        """Прогноз по всем материалам, сначала те, что закончатся раньше
+
+        Элементы: material, quantity, pending, available, rate (г/день), days_left и
+        depletion_date (None, если материал не расходуется или его хватит дольше
+        FORECAST_HORIZON_DAYS дней).
+        """
+        async with self._lock:
+            today = date.today()
+            key = (today, self.db.data_version('orders', 'materials'))
+            if self._forecast is not None and self._forecast_key == key:
+                return self._forecast
+            orders_version = key[1][:1]
+            await self._refresh_rates(today, orders_version)
+            if self._pending_version != orders_version:
+                pending = await self.db.get_pending_material_demand()
+                if pending == 0:
+                    return 0
+                self._pending = dict(pending)
+                self._pending_version = orders_version
+            materials = await self.db.get_all_materials()
+            if materials == 0:
+                return 0
+
+            result = []
+            for material, quantity in materials:
+                pending = self._pending.get(material, 0)
+                available = quantity - pending
+                rate = self._rates.get(material, 0.0)
+                if available <= 0:
+                    days_left = 0.0
+                elif rate > 0 and available / rate <= FORECAST_HORIZON_DAYS:
+                    days_left = available / rate
+                else:
+                    days_left = None
+                result.append({
+                    'material': material, 'quantity': quantity, 'pending': pending, 'available': available,
+                    'rate': rate, 'days_left': days_left,
+                    'depletion_date': today + timedelta(days=int(days_left)) if days_left is not None else None,
+                })
+            result.sort(key=lambda item: (item['days_left'] is None, item['days_left'] or 0, item['material']))
+            self._forecast, self._forecast_key = result, key
+            return result
+
+    async def new_alerts(self, days: float) -> list[dict]:
+        """Материалы, которые закончатся в ближайшие days дней и о которых ещё не предупреждали
+
+        Материал снова попадёт в предупреждения, после того как его пополнят.
+        """
+        forecast = await self.forecast()
+        if forecast == 0:
+            return []
+        due = {item['material']: item for item in forecast
+               if item['days_left'] is not None and item['days_left'] <= days}
+        self.alerted &= set(due)
+        alerts = [item for material, item in due.items() if material not in self.alerted]
+        self.alerted.update(item['material'] for item in alerts)
+        return alerts
@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import csv
+import itertools
+import os
+import sys
+import time
+from datetime import date, datetime
+from typing import Callable, Iterator
+
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+
+
+CHUNK_SIZE = 1000
+# Per-row errors kept in the report, the rest are only counted
+MAX_ERRORS = 100
+IMPORT_SUFFIXES = ('.csv', '.xlsx')
+
+
+def _parse_date(value):
+    """Даты из Excel приходят как datetime, из CSV - как ГГГГ-ММ-ДД или ДД.ММ.ГГГГ"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        value = value.strip().split(' ')[0]
+        if '.' in value:
+            day, month, year = value.split('.')
+            return date(int(year), int(month), int(day))
+    return value
+
+
+class _ImportRow(BaseModel):
+    @model_validator(mode='before')
+    @classmethod
+    def _drop_empty(cls, data):
+        # Empty cells mean "use the default"
+        if isinstance(data, dict):
+            return {key: value for key, value in data.items() if value is not None and str(value).strip() != ''}
+        return data
+
+    def as_row(self) -> tuple:
+        return tuple(self.model_dump(mode='json').values())
+
+
+class OrderRow(_ImportRow):
+    """Строка заказа, поля в порядке аргументов DatabaseManager.add_order"""
+    name: str = Field(min_length=1)
+    link: str = ''
+    material: str = Field(min_length=1)
+    material_amount: int = Field(ge=0)
+    recommended_date: date
+    importance: int = Field(default=5, ge=1, le=10)
+    settings: str = ''
+    cost: float = Field(default=0, ge=0)
+    # Imported orders are usually history, so without the column they count as paid
+    # and the unpaid purge (UNPAID_ORDER_DAYS) leaves them alone
+    payment_info: bool = True
+    done: bool = False
+    creation_date: date = Field(default_factory=date.today)
+
+    _parse_dates = field_validator('recommended_date', 'creation_date', mode='before')(_parse_date)
+
+
+class ExpenseRow(_ImportRow):
+    """Строка расхода, поля в порядке аргументов DatabaseManager.add_expense"""
+    category: str = Field(min_length=1)
+    amount: float = Field(ge=0)
+    date_spent: date
+    description: str = ''
+
+    _parse_dates = field_validator('date_spent', mode='before')(_parse_date)
+
+
+class MaterialRow(_ImportRow):
+    """Поступление материала: количество прибавляется к остатку"""
+    name: str = Field(min_length=1)
+    quantity: int = Field(ge=0)
+
+
+ROW_MODELS = {'orders': OrderRow, 'expenses': ExpenseRow, 'materials': MaterialRow}
+
+
+def detect_kind(columns) -> str | None:
+    """Тип данных файла по заголовку: orders, expenses или materials"""
+    columns = set(columns)
+    if {'material', 'material_amount'} <= columns:
+        return 'orders'
+    if {'category', 'amount'} <= columns:
+        return 'expenses'
+    if {'name', 'quantity'} <= columns:
+        return 'materials'
+    return None
+
+
+def _normalize_header(header) -> list[str]:
+    return [str(column).strip().lower() if column is not None else '' for column in header]
+
+
+def _csv_records(path: str) -> Iterator[tuple[int, dict]]:
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        sample = file.read(4096)
+        file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(file, dialect)
+        header = _normalize_header(next(reader, []))
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield reader.line_num, dict(zip(header, row))
+
+
+def _xlsx_records(path: str) -> Iterator[tuple[int, dict]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _normalize_header(next(rows, ()))
+        for line, row in enumerate(rows, start=2):
+            if any(cell is not None and str(cell).strip() != '' for cell in row):
+                yield line, dict(zip(header, row))
+    finally:
+        workbook.close()
+
+
+def read_records(path: str) -> Iterator[tuple[int, dict]]:
+    """Строки файла CSV или XLSX по одной: (номер строки файла, {столбец: значение})"""
+    if os.path.splitext(path)[1].lower() == '.xlsx':
+        return _xlsx_records(path)
+    return _csv_records(path)
+
+
+def validated_chunks(path: str, kind: str | None = None,
+                     chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[str, list[tuple], list[tuple[int, str]], int]]:
+    """Читать файл порциями по chunk_size строк и проверять их моделью типа kind
+
+    Если kind не указан, он определяется по заголовку. Выдаёт (kind, строки для
+    DatabaseManager.import_rows, ошибки [(номер строки, текст)], номер последней строки порции).
+    """
+    source = read_records(path)
+    try:
+        first = next(source, None)
+        if first is None:
+            return
+        kind = kind or detect_kind(first[1])
+        if kind not in ROW_MODELS:
+            raise ValueError(f'Cannot detect the data type from columns: {", ".join(first[1])}')
+        model = ROW_MODELS[kind]
+        records = itertools.chain([first], source)
+        while chunk := list(itertools.islice(records, chunk_size)):
+            rows, errors = [], []
+            for line, record in chunk:
+                try:
+                    rows.append(model.model_validate(record).as_row())
+                except ValidationError as e:
+                    errors.append((line, '; '.join(
+                        f'{".".join(map(str, error["loc"])) or "row"}: {error["msg"]}' for error in e.errors())))
+            yield kind, rows, errors, chunk[-1][0]
+    finally:
+        source.close()
+
+
+def _account(report: dict, kind: str, rows: list[tuple], errors: list[tuple[int, str]], last_line: int,
+             written: int):
+    report['kind'] = kind
+    report['rows'] += len(rows) + len(errors)
+    report['failed'] += len(errors)
+    report['errors'].extend(errors[:MAX_ERRORS - len(report['errors'])])
+    if written < 0:
+        report['failed'] += len(rows)
+        if len(report['errors']) < MAX_ERRORS:
+            report['errors'].append((last_line, f'database error, {len(rows)} rows of the chunk were not saved'))
+    else:
+        report['imported'] += written
+
+
+def _new_report() -> dict:
+    return {'kind': None, 'rows': 0, 'imported': 0, 'failed': 0, 'errors': [], 'seconds': 0.0}
+
+
+async def import_file(db, path: str, kind: str | None = None, chunk_size: int = CHUNK_SIZE,
+                      progress: Callable[[dict], None] | None = None) -> dict:
+    """Импортировать файл в базу AsyncDatabaseManager
+
+    Чтение и проверка порции выполняются в пуле потоков, запись - одной транзакцией
+    на порцию через db.import_rows. После каждой порции вызывается progress(report).
+    Возвращает отчёт: kind, rows, imported, failed, errors (первые MAX_ERRORS), seconds.
+    """
+    loop = asyncio.get_running_loop()
+    report = _new_report()
+    started = time.perf_counter()
+    chunks = validated_chunks(path, kind, chunk_size)
+    try:
+        while (chunk := await loop.run_in_executor(None, next, chunks, None)) is not None:
+            chunk_kind, rows, errors, last_line = chunk
+            written = await db.import_rows(chunk_kind, rows) if rows else 0
+            _account(report, chunk_kind, rows, errors, last_line, written)
+            report['seconds'] = time.perf_counter() - started
+            if progress is not None:
+                progress(report)
+    finally:
+        chunks.close()
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+
+def import_file_sync(db, path: str, kind: str | None = None, chunk_size: int = CHUNK_SIZE,
+                     progress: Callable[[dict], None] | None = None) -> dict:
+    """То же, что import_file, для синхронного DatabaseManager"""
+    report = _new_report()
+    started = time.perf_counter()
+    for chunk_kind, rows, errors, last_line in validated_chunks(path, kind, chunk_size):
+        written = db.import_rows(chunk_kind, rows) if rows else 0
+        _account(report, chunk_kind, rows, errors, last_line, written)
+        report['seconds'] = time.perf_counter() - started
+        if progress is not None:
+            progress(report)
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+
+def main() -> int:
+    from data.db_manage import DatabaseManager
+
+    parser = argparse.ArgumentParser(description='Импорт заказов, расходов или материалов из CSV/XLSX.')
+    parser.add_argument('db_file', help='файл базы данных')
+    parser.add_argument('path', help='файл .csv или .xlsx с заголовком в первой строке')
+    parser.add_argument('--kind', choices=sorted(ROW_MODELS), help='тип данных (по умолчанию - по заголовку)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='строк в одной транзакции')
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db_file)
+    try:
+        report = import_file_sync(db, args.path, args.kind, args.chunk_size, progress=lambda report: print(
+            f'\r{report["rows"]} rows read, {report["imported"]} imported, {report["failed"]} failed',
+            end='', file=sys.stderr))
+    finally:
+        db.close_connection()
+    print(file=sys.stderr)
+    for line, error in report['errors']:
+        print(f'line {line}: {error}')
+    print(f'{report["kind"]}: {report["imported"]} of {report["rows"]} rows imported in {report["seconds"]:.2f} s')
+    if report['kind'] == 'orders':
+        print('orders with an empty payment_info were imported as paid')
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import threading
+from datetime import date
+
+
+logger = logging.getLogger(__name__)
+
+# Price per gram used until there is enough history (the old `material_amount * 7`)
+FALLBACK_PRICE_PER_GRAM = 7
+
+
+def _lead_days(recommended_date, creation_date) -> int:
+    try:
+        lead = date.fromisoformat(str(recommended_date)[:10]) - date.fromisoformat(str(creation_date)[:10])
+        return max(lead.days, 0)
+    except ValueError:
+        return 0
+
+
+def fit_coefficients(rows: list[tuple], ridge: float = 1e-3, min_material_samples: int = 5) -> dict:
+    """Подобрать коэффициенты линейной модели цены по истории заказов
+
+    rows - строки (cost, material, grams, importance, recommended_date, creation_date).
+    Цена = intercept + grams * (grams_rate + поправка материала) + importance * w
+           + urgency * w, где urgency = 1 / (1 + дней до срока).
+    Поправки есть только у материалов, встретившихся не реже min_material_samples раз.
+    """
+    import numpy as np
+    import pandas as pd
+
+    frame = pd.DataFrame(rows, columns=['cost', 'material', 'grams', 'importance', 'recommended_date',
+                                        'creation_date'])
+    frame['grams'] = pd.to_numeric(frame['grams'], errors='coerce')
+    frame['importance'] = pd.to_numeric(frame['importance'], errors='coerce').fillna(5)
+    frame['cost'] = pd.to_numeric(frame['cost'], errors='coerce')
+    lead = (pd.to_datetime(frame['recommended_date'], errors='coerce')
+            - pd.to_datetime(frame['creation_date'], errors='coerce')).dt.days
+    frame['urgency'] = 1 / (1 + lead.clip(lower=0).fillna(0))
+    frame = frame.dropna(subset=['cost', 'grams'])
+    if frame.empty:
+        return {'intercept': 0.0, 'grams': 0.0, 'importance': 0.0, 'urgency': 0.0, 'materials': {},
+                'samples': 0, 'mae': 0.0}
+
+    counts = frame['material'].value_counts()
+    materials = sorted(counts[counts >= min_material_samples].index)
+    grams = frame['grams'].to_numpy(dtype=float)
+    columns = [np.ones(len(frame)), grams, frame['importance'].to_numpy(dtype=float),
+               frame['urgency'].to_numpy(dtype=float)]
+    columns += [grams * (frame['material'] == material).to_numpy() for material in materials]
+    x = np.column_stack(columns)
+    y = frame['cost'].to_numpy(dtype=float)
+
+    # Ridge regularisation (the intercept is not penalised) keeps per-material terms stable
+    scale = np.sqrt(ridge * len(frame)) * np.maximum(x.std(axis=0), 1e-9)
+    penalty = np.diag(scale)[1:]
+    weights = np.linalg.lstsq(np.vstack([x, penalty]), np.concatenate([y, np.zeros(len(penalty))]), rcond=None)[0]
+    return {
+        'intercept': float(weights[0]),
+        'grams': float(weights[1]),
+        'importance': float(weights[2]),
+        'urgency': float(weights[3]),
+        'materials': {material: float(weight) for material, weight in zip(materials, weights[4:])},
+        'samples': len(frame),
+        'mae': float(np.abs(x @ weights - y).mean()),
+    }
+
+
+class PricingModel:
+    """Оценка стоимости заказа по истории заказов.
+
+    Коэффициенты (fit_coefficients) хранятся в памяти, поэтому оценка - несколько
+    арифметических операций без обращения к базе. Модель подписывается на события
+    базы и переобучается в фоне, когда подтверждена цена refit_after заказов. Учится
+    модель только на ценах, которые указал или подтвердил пользователь (cost_confirmed).
+    Пока в истории меньше min_samples таких заказов, цена - FALLBACK_PRICE_PER_GRAM за грамм.
+    """
+
+    def __init__(self, db, refit_after: int = 50, min_samples: int = 20):
+        self.db = db
+        self.refit_after = refit_after
+        self.min_samples = min_samples
+        self.coefficients: dict | None = None
+        self.new_orders = 0
+        self._lock = threading.Lock()
+        self._refit_task: asyncio.Task | None = None
+        db.subscribe(self.handle_event)
+
+    def handle_event(self, event: str, payload: dict):
+        """Обработчик событий DatabaseManager.subscribe (вызывается в потоке-писателе)"""
+        # Only confirmed prices are learned, so the model does not fit its own estimates
+        if event == 'order_cost_updated' or (event == 'order_added' and payload.get('cost_confirmed')):
+            with self._lock:
+                self.new_orders += 1
+        elif event == 'orders_imported':
+            with self._lock:
+                self.new_orders += payload['count']
+
+    @property
+    def stale(self) -> bool:
+        return self.coefficients is None or self.new_orders >= self.refit_after
+
+    async def refit(self) -> dict | None:
+        """Переобучить модель по всей истории заказов"""
+        with self._lock:
+            seen = self.new_orders
+        rows = await self.db.get_pricing_history()
+        if rows == 0:
+            return None
+        loop = asyncio.get_running_loop()
+        coefficients = await loop.run_in_executor(None, fit_coefficients, rows)
+        with self._lock:
+            self.new_orders -= seen
+        self.coefficients = coefficients
+        logger.info('Pricing model fitted on %s orders, MAE %.2f', coefficients['samples'], coefficients['mae'])
+        return coefficients
+
+    async def _refit_in_background(self):
+        try:
+            await self.refit()
+        except Exception as e:
+            logger.exception(e)
+
+    def _start_refit(self) -> asyncio.Task:
+        if self._refit_task is None or self._refit_task.done():
+            self._refit_task = asyncio.create_task(self._refit_in_background())
+        return self._refit_task
+
+    async def estimate(self, material: str, material_amount: int, importance: int, recommended_date,
+                       creation_date) -> float:
+        """Рекомендуемая стоимость заказа в рублях
+
+        Первый вызов ждёт обучения модели; дальше устаревшая модель переобучается
+        в фоне, а оценка считается по текущим коэффициентам.
+        """
+        if self.coefficients is None:
+            await asyncio.shield(self._start_refit())
+        elif self.stale:
+            self._start_refit()
+        return self.predict(material, material_amount, importance, recommended_date, creation_date)
+
+    def predict(self, material: str, material_amount: int, importance: int, recommended_date,
+                creation_date) -> float:
+        fallback = float(material_amount * FALLBACK_PRICE_PER_GRAM)
+        coefficients = self.coefficients
+        if coefficients is None or coefficients['samples'] < self.min_samples:
+            return fallback
+        price = (coefficients['intercept']
+                 + material_amount * (coefficients['grams'] + coefficients['materials'].get(material, 0.0))
+                 + importance * coefficients['importance']
+                 + coefficients['urgency'] / (1 + _lead_days(recommended_date, creation_date)))
+        return round(price) if price > 0 else fallback
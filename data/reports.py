@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from data.db_manage import DatabaseManager
+
+
+logger = logging.getLogger(__name__)
+
+
+def _export(db_file: str, method: str, kwargs: dict, path: str) -> int:
+    """Выполнить метод выгрузки DatabaseManager в процессе пула"""
+    db = DatabaseManager(db_file, create_schema=False)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        result = getattr(db, method)(excel_path=temp_path, **kwargs)
+        if result == 1:
+            # Readers never see a half-written file
+            os.replace(temp_path, path)
+        return result
+    finally:
+        db.close_connection()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class ReportCache:
+    """Выгрузки Excel в пуле процессов с кэшем готовых файлов.
+
+    Файл строится методом выгрузки DatabaseManager (get_all_materials_excel,
+    export_orders_to_excel, ...) в отдельном процессе, поэтому openpyxl не держит
+    GIL бота. Имя файла - хэш базы, метода, параметров и версий данных (data_version
+    тем, из которых построен отчёт): пока данные не менялись, повторный запрос
+    отдаёт готовый файл, а после remember() - и file_id уже загруженного в Telegram
+    документа. Одинаковые запросы, пришедшие во время построения, ждут один результат.
+    Хранится не больше max_files файлов, дольше всех не запрошенные удаляются.
+    """
+
+    def __init__(self, directory: str, workers: int = 2, max_files: int = 200):
+        self.directory = directory
+        self.workers = workers
+        self.max_files = max_files
+        self.hits = 0
+        self.builds = 0
+        self._executor: ProcessPoolExecutor | None = None
+        self._building: dict[str, asyncio.Future] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # Started on the first report, so bot startup does not spawn processes;
+        # spawn instead of fork, because the bot process has database threads
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    @staticmethod
+    def key(db_file: str, method: str, kwargs: dict, version: tuple) -> str:
+        payload = json.dumps([os.path.abspath(db_file), method, kwargs, version], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str, suffix: str = '.xlsx') -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def _report(self, key: str) -> dict:
+        try:
+            with open(self._path(key, '.file_id'), encoding='utf-8') as file:
+                file_id = file.read().strip() or None
+        except FileNotFoundError:
+            file_id = None
+        return {'key': key, 'path': self._path(key), 'file_id': file_id}
+
+    async def get(self, db, method: str, topics: tuple[str, ...], **kwargs) -> dict | None:
+        """Готовый отчёт {'key', 'path', 'file_id'} или None, если выгрузка не удалась
+
+        db - AsyncDatabaseManager (нужны db_file и data_version), method - метод
+        выгрузки DatabaseManager, topics - темы данных отчёта, kwargs - параметры
+        метода, кроме excel_path.
+        """
+        # Read before the export: if data changes meanwhile, the next request rebuilds
+        key = self.key(db.db_file, method, kwargs, db.data_version(*topics))
+        path = self._path(key)
+        if os.path.exists(path):
+            self.hits += 1
+            os.utime(path)
+            return self._report(key)
+
+        future = self._building.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, _export, db.db_file, method, kwargs, path)
+            self._building[key] = future
+            future.add_done_callback(lambda _: self._building.pop(key, None))
+            self.builds += 1
+        try:
+            result = await asyncio.shield(future)
+        except Exception as e:
+            logger.exception(e)
+            return None
+        if result != 1:
+            return None
+        self._prune()
+        return self._report(key)
+
+    def remember(self, key: str, file_id: str):
+        """Запомнить file_id документа, отправленного из файла отчёта key"""
+        with open(self._path(key, '.file_id'), 'w', encoding='utf-8') as file:
+            file.write(file_id)
+
+    def _prune(self):
+        files = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.xlsx')]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.max_files]:
+            for path in (entry.path, entry.path[:-len('.xlsx')] + '.file_id'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,222 @@
+"""Отдельная база SQLite для каждого рабочего пространства.
+
+Разделить существующую общую базу по рабочим пространствам:
+
+    python -m data.tenants data/database.db data/tenants --map orders.csv --default 123456789
+
+orders.csv содержит строки `order_id,рабочее пространство`; заказы, которых нет в файле,
+а также все расходы и остатки материалов попадают в пространство --default.
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import re
+import sqlite3
+import sys
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import partial
+
+from data.async_db import AsyncDatabaseManager
+from data.db_manage import DatabaseManager
+
+
+logger = logging.getLogger(__name__)
+
+
+def tenant_db_file(directory: str, tenant: str | int) -> str:
+    """Путь к файлу базы рабочего пространства"""
+    return os.path.join(directory, re.sub(r'[^\w-]', '_', str(tenant)) + '.db')
+
+
+class _Tenant:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.users = 0
+
+
+class TenantRouter:
+    """Пул баз рабочих пространств с ограничением числа открытых.
+
+    Чат отображается на рабочее пространство через workspaces (chat_id -> имя),
+    по умолчанию у каждого чата своё пространство с именем, равным chat_id.
+    Для каждого пространства открывается свой AsyncDatabaseManager (db_kwargs
+    передаются ему); setup(db) может вернуть словарь дополнительных объектов
+    пространства, например очередь печати. Открыто не больше max_open баз:
+    при превышении закрываются давно не использованные и сейчас не занятые.
+    """
+
+    def __init__(self, directory: str, max_open: int = 64, workspaces: dict[int, str] | None = None,
+                 setup=None, **db_kwargs):
+        self.directory = directory
+        self.max_open = max_open
+        self.workspaces = workspaces or {}
+        self.setup = setup
+        self.db_kwargs = db_kwargs
+        self.opened = 0
+        self.evicted = 0
+        self._tenants: OrderedDict[str, _Tenant] = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def workspace(self, chat_id: int) -> str:
+        return self.workspaces.get(chat_id, str(chat_id))
+
+    def chats(self, tenant: str) -> list[int]:
+        """Чаты, которые работают с пространством tenant"""
+        chats = [chat_id for chat_id, workspace in self.workspaces.items() if workspace == tenant]
+        if not chats and tenant.lstrip('-').isdigit():
+            chats.append(int(tenant))
+        return chats
+
+    def open_tenants(self) -> list[str]:
+        return list(self._tenants)
+
+    async def _open(self, tenant: str) -> dict:
+        loop = asyncio.get_running_loop()
+        # The constructor waits for the writer to create the schema
+        db = await loop.run_in_executor(None, partial(AsyncDatabaseManager, tenant_db_file(self.directory, tenant),
+                                                      **self.db_kwargs))
+        try:
+            workspace = {'db': db}
+            if self.setup is not None:
+                workspace.update(await self.setup(db))
+        except Exception:
+            await db.close_connection()
+            raise
+        self.opened += 1
+        return workspace
+
+    @asynccontextmanager
+    async def acquire(self, tenant: str):
+        """Открыть (или взять из пула) рабочее пространство на время блока with
+
+        Возвращает словарь {'db': AsyncDatabaseManager, ...объекты из setup}.
+        """
+        entry = self._tenants.get(tenant)
+        if entry is None:
+            entry = self._tenants[tenant] = _Tenant(asyncio.create_task(self._open(tenant)))
+        self._tenants.move_to_end(tenant)
+        entry.users += 1
+        try:
+            try:
+                workspace = await asyncio.shield(entry.task)
+            except Exception:
+                if self._tenants.get(tenant) is entry:
+                    del self._tenants[tenant]
+                raise
+            yield workspace
+        finally:
+            entry.users -= 1
+            await self._evict()
+
+    async def _evict(self):
+        while len(self._tenants) > self.max_open:
+            tenant = next((name for name, entry in self._tenants.items()
+                           if entry.users == 0 and entry.task.done()), None)
+            if tenant is None:
+                # Every open database is in use, the pool shrinks once they are released
+                return
+            entry = self._tenants.pop(tenant)
+            self.evicted += 1
+            if entry.task.exception() is None:
+                await entry.task.result()['db'].close_connection()
+
+    async def close(self):
+        """Закрыть все открытые базы"""
+        tenants, self._tenants = list(self._tenants.values()), OrderedDict()
+        for entry in tenants:
+            try:
+                workspace = await entry.task
+            except Exception as e:
+                logger.exception(e)
+                continue
+            await workspace['db'].close_connection()
+
+
+def split_database(source: str, directory: str, assignments: dict[int, str], default_tenant: str) -> dict[str, int]:
+    """Разделить общую базу source на базы рабочих пространств в directory
+
+    assignments - order_id -> рабочее пространство; остальные заказы, расходы, доходы без
+    заказа и остатки материалов получает default_tenant. Справочники копируются во все базы
+    с сохранением id. Возвращает число перенесённых заказов по пространствам.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tenants = sorted({default_tenant, *assignments.values()})
+    for tenant in tenants:
+        if os.path.exists(tenant_db_file(directory, tenant)):
+            raise FileExistsError(tenant_db_file(directory, tenant))
+
+    # Brings an older source schema up to date, so its columns match the new databases
+    DatabaseManager(source).close_connection()
+    conn = sqlite3.connect(source)
+    counts = {}
+    try:
+        conn.execute('CREATE TEMP TABLE split_assignments (order_id INTEGER PRIMARY KEY, tenant TEXT NOT NULL)')
+        conn.executemany('INSERT INTO split_assignments VALUES (?, ?)', assignments.items())
+        for tenant in tenants:
+            target = tenant_db_file(directory, tenant)
+            DatabaseManager(target).close_connection()
+            is_default = int(tenant == default_tenant)
+            conn.execute('ATTACH DATABASE ? AS tenant', (target,))
+            try:
+                conn.execute('INSERT OR IGNORE INTO tenant.order_statuses SELECT * FROM main.order_statuses')
+                conn.execute('INSERT INTO tenant.expense_categories SELECT * FROM main.expense_categories')
+                conn.execute('''
+                    INSERT INTO tenant.materials (id, name, quantity)
+                    SELECT id, name, CASE WHEN ? THEN quantity ELSE 0 END FROM main.materials
+                ''', (is_default,))
+                conn.execute('''
+                    INSERT INTO tenant.orders
+                    SELECT o.* FROM main.orders o
+                    LEFT JOIN split_assignments a ON a.order_id = o.id
+                    WHERE coalesce(a.tenant, ?) = ?
+                ''', (default_tenant, tenant))
+                conn.execute('''
+                    INSERT INTO tenant.order_materials
+                    SELECT * FROM main.order_materials WHERE order_id IN (SELECT id FROM tenant.orders)
+                ''')
+                conn.execute('''
+                    INSERT INTO tenant.revenue
+                    SELECT * FROM main.revenue
+                    WHERE order_id IN (SELECT id FROM tenant.orders) OR (order_id IS NULL AND ?)
+                ''', (is_default,))
+                if is_default:
+                    conn.execute('INSERT INTO tenant.expenses SELECT * FROM main.expenses')
+                counts[tenant] = conn.execute('SELECT count(*) FROM tenant.orders').fetchone()[0]
+                conn.commit()
+            finally:
+                conn.execute('DETACH DATABASE tenant')
+    finally:
+        conn.close()
+    return counts
+
+
+def read_assignments(path: str) -> dict[int, str]:
+    """Прочитать CSV со строками order_id,рабочее пространство (строки без числового id пропускаются)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        return {int(row[0]): row[1].strip() for row in csv.reader(f) if len(row) >= 2 and row[0].strip().isdigit()}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='общая база')
+    parser.add_argument('directory', help='каталог баз рабочих пространств (TENANTS_DIR)')
+    parser.add_argument('--map', help='CSV order_id,рабочее пространство')
+    parser.add_argument('--default', required=True, help='пространство для остальных данных')
+    args = parser.parse_args()
+
+    try:
+        counts = split_database(args.source, args.directory, read_assignments(args.map) if args.map else {},
+                                args.default)
+    except FileExistsError as e:
+        print(f'База {e} уже существует')
+        return 1
+    for tenant, orders in counts.items():
+        print(f'{tenant}: {orders} заказов -> {tenant_db_file(args.directory, tenant)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
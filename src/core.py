@@ -1,67 +1,134 @@
 import asyncio
 import logging
 import os
+import tempfile
 from datetime import date
+from functools import partial
 
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters.command import Command, Message, CommandObject
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.filters import StateFilter
+from aiogram.filters.command import Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import StatesGroup, State
-from aiogram.types import CallbackQuery
+from aiogram.types import BufferedInputFile, CallbackQuery, FSInputFile
 
 import src.root.keyboards as kb
-from src.root.fsm_order import Ord, ord_1, ord_2, ord_3, ord_4, ord_5, ord_6, ord_7, ord_8, get_order_data
-
+from src.root.render_cache import RenderCache, safe_edit
+from src.root.fsm_order import Ord, OrderCost, Search, ord_1, ord_2, ord_3, ord_4, ord_5, ord_6, ord_7, ord_8, get_order_data
+
+from src.utils.fsm_storage import SQLiteStorage
+from src.utils.logging_setup import setup_logging
+from src.utils.maintenance import MaintenanceScheduler
+from src.utils.metrics import Metrics, MetricsMiddleware
+from src.utils.outbox import Outbox
+from src.utils.print_queue import PrintQueue
+from src.utils.stock_alerts import StockAlertScheduler
+from src.utils.tenants import TenantMiddleware
+from src.utils.webhook import run_webhook
+
+from data.async_db import AsyncDatabaseManager
 from data.config_reader import config
-from data.db_manage import *
-
-
-log_file = 'data/logs/bot.log'
-with open(log_file, 'w', encoding='utf-8') as f:
-    f.write('')
-
-log_dir = os.path.join('data', 'logs')
-os.makedirs(log_dir, exist_ok=True)
-log_file = os.path.join(log_dir, 'bot.log')
-with open(log_file, 'w', encoding='utf-8') as f:
-    f.write('')
-
-logging.basicConfig(level=logging.INFO,
-                   format='%(asctime)s - %(levelname)s - %(message)s',
-                   handlers=[logging.FileHandler(log_file, encoding='utf-8'),
-                           logging.StreamHandler()])
-
-bot = Bot(token=config.bot_token.get_secret_value())
-dp = Dispatcher()
+from data.db_manage import FTS_MIN_TERM
+from data.forecast import FORECAST_HORIZON_DAYS, MaterialForecast
+from data.importer import IMPORT_SUFFIXES, import_file
+from data.pricing import PricingModel
+from data.reports import ReportCache
+from data.tenants import TenantRouter
 
 
-class Ord(StatesGroup):
-    name = State()
-    link = State()
-    material = State()
-    material_amount = State()
-    recommended_date = State()
-    importance = State()
-    settings = State()
-
-
-class Payment(StatesGroup):
-    summ = State()
+session = AiohttpSession(api=TelegramAPIServer.from_base(config.telegram_api_url)) if config.telegram_api_url else None
+bot = Bot(token=config.bot_token.get_secret_value(), session=session)
+dp = Dispatcher(storage=SQLiteStorage(config.fsm_db_file, ttl=config.fsm_ttl))
 
 
 @dp.message(Command("start"))
-async def cmd_start(message: types.Message):
-    await message.answer(
+async def cmd_start(message: types.Message, outbox: Outbox):
+    outbox.send(message.answer(
         "👋 Вас приветствует команда разработчиков Binary Brigade."
-        "\n*↓Нажмите, чтобы вызвать меню↓*", reply_markup=kb.keyboard_inline2, parse_mode="Markdown")
+        "\n*↓Нажмите, чтобы вызвать меню↓*", reply_markup=kb.keyboard_inline2, parse_mode="Markdown"))
 
 
 @dp.message(Command("menu"))
-async def menu(message: types.Message):
-    await message.answer('Добро пожаловать в меню бота-помощника в 3D печати!\
- Выберите нужный вам пункт меню.', reply_markup=kb.keyboard_inline_main_menu)
-
-dp.message.register(ord_1)
+async def menu(message: types.Message, outbox: Outbox):
+    outbox.send(message.answer('Добро пожаловать в меню бота-помощника в 3D печати!\
+ Выберите нужный вам пункт меню.', reply_markup=kb.keyboard_inline_main_menu))
+
+@dp.message(Command("stats"), F.from_user.id.in_(config.admin_ids))
+async def cmd_stats(message: types.Message, command: CommandObject, metrics: Metrics, render_cache: RenderCache,
+                    outbox: Outbox, reports: ReportCache, db: AsyncDatabaseManager):
+    if command.args == 'prometheus':
+        await message.answer_document(BufferedInputFile(metrics.prometheus().encode(), filename='metrics.txt'))
+        return
+    text = metrics.format_stats()
+    text += f'\n\nКэш экранов: {render_cache.hits} попаданий, {render_cache.misses} промахов'
+    cache = db.cache.stats()
+    text += f'\nКэш базы: {cache["size"]} записей, {cache["hits"]} попаданий, {cache["misses"]} промахов'
+    for namespace, counters in cache['namespaces'].items():
+        text += f'\n• {namespace}: {counters["hits"]} / {counters["misses"]}'
+    text += (f'\nОчередь отправки: {len(outbox)} ждут, {outbox.sent} отправлено, {outbox.coalesced} правок '
+             f'объединено, {outbox.retries} повторов, {outbox.failed} ошибок')
+    text += f'\nОтчёты: {reports.hits} из кэша, {reports.builds} построено'
+    await message.answer(text)
+
+
+IMPORT_KINDS = {'orders': 'заказов', 'expenses': 'расходов', 'materials': 'материалов'}
+IMPORT_HELP = ('Отправьте файл .csv или .xlsx с подписью /import (или /import orders|expenses|materials).\n'
+               'Первая строка - заголовок:\n'
+               '• заказы: name, link, material, material_amount, recommended_date, importance, settings, cost, '
+               'payment_info, done, creation_date\n'
+               '  (пустой payment_info - заказ оплачен, 0 - не оплачен)\n'
+               '• расходы: category, amount, date_spent, description\n'
+               '• материалы: name, quantity (прибавляется к остатку)')
+
+
+def format_import_report(report: dict, errors: int = 10) -> str:
+    text = (f'Импорт {IMPORT_KINDS.get(report["kind"], "")}: добавлено {report["imported"]} из '
+            f'{report["rows"]} строк за {report["seconds"]:.1f} с')
+    if report['kind'] == 'orders':
+        text += '\nЗаказы с пустым payment_info добавлены как оплаченные'
+    if report['failed']:
+        text += f'\nСтрок с ошибками: {report["failed"]}'
+        for line, error in report['errors'][:errors]:
+            text += f'\n• строка {line}: {error[:200]}'
+    return text
+
+
+@dp.message(Command("import"), F.document)
+async def import_document(message: types.Message, command: CommandObject, bot: Bot, db: AsyncDatabaseManager,
+                          outbox: Outbox):
+    suffix = os.path.splitext(message.document.file_name or '')[1].lower()
+    kind = command.args.strip() if command.args else None
+    if suffix not in IMPORT_SUFFIXES or (kind is not None and kind not in IMPORT_KINDS):
+        outbox.send(message.answer(IMPORT_HELP))
+        return
+    status = await outbox.send(message.answer('Импорт: загрузка файла...'))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'import' + suffix)
+        await bot.download(message.document, destination=path)
+        try:
+            # Progress edits of the same message are coalesced by the outbox
+            report = await import_file(db, path, kind, progress=lambda report: outbox.send(status.edit_text(
+                f'Импорт: обработано {report["rows"]} строк, добавлено {report["imported"]}')))
+        except Exception as e:
+            logging.exception(e)
+            outbox.send(status.edit_text(f'Не удалось прочитать файл: {e}'))
+            return
+    outbox.send(status.edit_text(format_import_report(report)))
+
+
+@dp.message(Command("import"))
+async def import_help(message: types.Message, outbox: Outbox):
+    outbox.send(message.answer(IMPORT_HELP))
+
+@dp.message(Command("paid"))
+async def paid_command(message: types.Message, command: CommandObject, db: AsyncDatabaseManager, outbox: Outbox):
+    if not command.args or not command.args.strip().isdigit():
+        outbox.send(message.answer('Отметить оплату заказа: /paid <id заказа>'))
+        return
+    outbox.send(message.answer(await mark_paid(int(command.args), db), reply_markup=kb.keyboard_inline7))
+
+dp.message.register(ord_1, StateFilter(None))
 dp.message.register(ord_2, Ord.name)
 dp.message.register(ord_3, Ord.link)
 dp.message.register(ord_4, Ord.material)
@@ -71,43 +138,101 @@ dp.message.register(ord_7, Ord.importance)
 dp.message.register(ord_8, Ord.settings)
 
 @dp.callback_query(F.data == 'no_makeorder')
-async def no_makeorder(callback: CallbackQuery, state: FSMContext):
+async def no_makeorder(callback: CallbackQuery, state: FSMContext, outbox: Outbox):
     data = await get_order_data(state)
     await callback.answer("Отмена создания заказа")
-    await callback.message.edit_text(
+    outbox.send(callback.message.edit_text(
         f'Заказ *{data["name"]}* не создан',
         reply_markup=kb.keyboard_inline7,
         parse_mode="Markdown"
-    )
+    ))
 
 @dp.callback_query(F.data == 'yes_makeorder')
-async def yes_makeorder(callback: CallbackQuery, state: FSMContext):
+async def yes_makeorder(callback: CallbackQuery, state: FSMContext, db: AsyncDatabaseManager, pricing: PricingModel,
+                        outbox: Outbox):
     data = await get_order_data(state)
+    creation_date = date.today().isoformat()
+    recommended_date = str(data['recommended_date'])
+    cost = await pricing.estimate(data['material'], data['material_amount'], data['importance'], recommended_date,
+                                  creation_date)
+    order_id = await db.add_order(data['name'], data['link'], data['material'], data['material_amount'],
+                                  recommended_date, data['importance'], data['settings'], cost, False, False,
+                                  creation_date, cost_confirmed=False)
+    if order_id == -1:
+        await callback.answer("Не удалось создать заказ")
+        outbox.send(callback.message.edit_text(
+            f'Не удалось создать заказ *{data["name"]}*, попробуйте ещё раз',
+            reply_markup=kb.keyboard_inline7,
+            parse_mode="Markdown"
+        ))
+        return
     await callback.answer("Продоложение создания заказа")
-    await callback.message.edit_text(
-        f'Заказ *{data["name"]}* был создан, его id *<id>*,\
-         мы рекомендуем присвоить ему стоимость *<стоимость>* руб',
-        reply_markup=kb.keyboard_inline8,
+    outbox.send(callback.message.edit_text(
+        f'Заказ *{data["name"]}* был создан, его id *{order_id}*,\
+ мы рекомендуем присвоить ему стоимость *{cost:g}* руб',
+        reply_markup=kb.order_price_keyboard(order_id),
         parse_mode="Markdown"
-    )
-
-@dp.callback_query(F.data == 'our_price_makeorder')
-async def our_price_makeorder(callback: CallbackQuery):
+    ))
+
+@dp.callback_query(kb.OrderPrice.filter(~F.custom))
+async def our_price_makeorder(callback: CallbackQuery, callback_data: kb.OrderPrice, db: AsyncDatabaseManager,
+                              outbox: Outbox):
+    if await db.confirm_order_cost(callback_data.order_id) != 1:
+        await callback.answer("Не удалось сохранить стоимость")
+        outbox.send(callback.message.edit_text('Не удалось сохранить стоимость заказа, возможно, он уже удалён',
+                                               reply_markup=kb.keyboard_inline7))
+        return
     await callback.answer("Готово")
-    await callback.message.edit_text(
-        f'Готово! Вы можете вернуться к меню',
-        reply_markup=kb.keyboard_inline7,
-        parse_mode="Markdown"
-    )
-
-@dp.callback_query(F.data == 'custom_price_makeorder')
-async def custom_price_makeorder(callback: CallbackQuery):
+    outbox.send(callback.message.edit_text(
+        f'Готово! Когда заказ id {callback_data.order_id} оплатят, отметьте оплату - '
+        f'неоплаченные заказы может удалять автоматическая очистка',
+        reply_markup=kb.order_paid_keyboard(callback_data.order_id)
+    ))
+
+@dp.callback_query(kb.OrderPrice.filter(F.custom))
+async def custom_price_makeorder(callback: CallbackQuery, callback_data: kb.OrderPrice, state: FSMContext,
+                                 outbox: Outbox):
     await callback.answer("Переход к вводу стоимости")
-    await callback.message.answer("Введите стоимость")
-    await callback.message.edit_text(
-        f'Готово! Вы можете вернуться к меню',
-        reply_markup=kb.keyboard_inline7
-    )
+    await state.set_state(OrderCost.cost)
+    await state.update_data(order_id=callback_data.order_id)
+    outbox.send(callback.message.edit_text(
+        f'Введите стоимость заказа id {callback_data.order_id} в рублях',
+        reply_markup=kb.keyboard_inline6
+    ))
+
+@dp.message(OrderCost.cost, F.text)
+async def custom_price(message: types.Message, state: FSMContext, db: AsyncDatabaseManager, outbox: Outbox):
+    try:
+        cost = float(message.text.replace(',', '.'))
+        if cost <= 0:
+            raise ValueError
+    except ValueError:
+        outbox.send(message.answer("Ошибка: стоимость должна быть положительным числом. Пожалуйста, введите заново.",
+                                   reply_markup=kb.keyboard_inline6))
+        return
+    order_id = (await state.get_data())['order_id']
+    await state.clear()
+    if not await db.update_order_cost(order_id, cost):
+        outbox.send(message.answer("Не удалось изменить стоимость заказа", reply_markup=kb.keyboard_inline7))
+        return
+    outbox.send(message.answer(f'Готово! Стоимость заказа id {order_id}: {cost:g} руб. Когда заказ оплатят, '
+                               f'отметьте оплату - неоплаченные заказы может удалять автоматическая очистка',
+                               reply_markup=kb.order_paid_keyboard(order_id)))
+
+async def mark_paid(order_id: int, db: AsyncDatabaseManager) -> str:
+    result = await db.mark_order_paid(order_id, date.today().isoformat())
+    if result == 1:
+        return f'Заказ id {order_id} отмечен оплаченным, доход записан'
+    if result == -1:
+        return f'Заказ id {order_id} не найден или уже оплачен'
+    return f'Не удалось отметить оплату заказа id {order_id}'
+
+@dp.callback_query(kb.OrderPaid.filter())
+async def order_paid(callback: CallbackQuery, callback_data: kb.OrderPaid, db: AsyncDatabaseManager,
+                     outbox: Outbox):
+    text = await mark_paid(callback_data.order_id, db)
+    await callback.answer("Готово")
+    outbox.send(callback.message.edit_text(text, reply_markup=kb.keyboard_inline7))
 
 # @dp.message(Command("help"))
 # async def cmd_help(message: types.Message):
@@ -289,65 +414,356 @@ async def custom_price_makeorder(callback: CallbackQuery):
 #     await message.answer(generate_link(summ)[0])
 
 @dp.callback_query(F.data == "back_universal")
-async def universal_back(callback: CallbackQuery, state: FSMContext):
+async def universal_back(callback: CallbackQuery, state: FSMContext, outbox: Outbox):
     current_state = await state.get_state()
     
     if current_state is not None:
         await state.clear()
 
     await callback.answer("Вы вернулись назад")
-    await callback.message.edit_text(
+    outbox.send(callback.message.edit_text(
         'Добро пожаловать в меню бота-помощника в 3D печати! Выберите нужный вам пункт меню.',
         reply_markup=kb.keyboard_inline_main_menu
-    )
+    ))
 
 @dp.callback_query(F.data == 'make_order')
-async def make_order(callback: CallbackQuery, state: FSMContext):
+async def make_order(callback: CallbackQuery, state: FSMContext, outbox: Outbox):
     await callback.answer("Переход к созданию заказа")
-    await callback.message.edit_text("Введите название заказа")
+    outbox.send(callback.message.edit_text("Введите название заказа"))
     await state.set_state(Ord.name)
 
 
 @dp.callback_query(F.data == 'menus')
-async def make_order(callback: CallbackQuery):
+async def show_menu(callback: CallbackQuery, outbox: Outbox):
     await callback.answer("Вы перешли к меню")
-    await callback.message.edit_text('Добро пожаловать в меню бота-помощника в 3D печати!\
- Выберите нужный вам пункт меню.', reply_markup=kb.keyboard_inline_main_menu)
+    outbox.send(callback.message.edit_text('Добро пожаловать в меню бота-помощника в 3D печати!\
+ Выберите нужный вам пункт меню.', reply_markup=kb.keyboard_inline_main_menu))
+
+
+def format_print_queue(print_queue: PrintQueue, count: int = 5) -> str:
+    text = 'Ваши не выполненные заказы:'
+    for printer, job in print_queue.jobs().items():
+        text += f'\n🖨 {printer}: ' + (f'{job["name"]} (id {job["id"]})' if job else 'свободен')
+    upcoming = print_queue.peek(count)
+    if upcoming:
+        text += f'\n\nОчередь печати ({len(print_queue)}):'
+        for position, order in enumerate(upcoming, 1):
+            text += (f'\n{position}. {order["name"]} (id {order["id"]}) - до {order["recommended_date"]}, '
+                     f'важность {order["importance"]}')
+    return text
+
+
+async def refresh_print_queue(db: AsyncDatabaseManager, print_queue: PrintQueue):
+    if print_queue.stale:
+        print_queue.load(await db.get_pending_orders())
 
 
 @dp.callback_query(F.data == 'order_manage')
-async def make_order(callback: CallbackQuery):
+async def order_manage(callback: CallbackQuery, db: AsyncDatabaseManager, print_queue: PrintQueue,
+                       outbox: Outbox):
+    await refresh_print_queue(db, print_queue)
     await callback.answer("Вы перешли к панели управления заказами")
-    await callback.message.edit_text('Ваши не выполненные заказы:', reply_markup=kb.keyboard_inline1)
+    await safe_edit(callback.message, format_print_queue(print_queue), reply_markup=kb.keyboard_inline1,
+                    outbox=outbox)
+
+
+@dp.callback_query(F.data == 'next_job')
+async def next_job(callback: CallbackQuery, db: AsyncDatabaseManager, print_queue: PrintQueue, outbox: Outbox):
+    await refresh_print_queue(db, print_queue)
+    assigned = print_queue.assign()
+    if assigned is None:
+        await callback.answer("Нет свободных принтеров или заказов в очереди")
+        return
+    printer, order = assigned
+    await callback.answer(f'{printer}: {order["name"]}')
+    await safe_edit(callback.message, format_print_queue(print_queue), reply_markup=kb.keyboard_inline1,
+                    outbox=outbox)
 
 
 @dp.callback_query(F.data == 'back_menu')
-async def make_order(callback: CallbackQuery):
+async def back_menu(callback: CallbackQuery, outbox: Outbox):
     await callback.answer("Вы перешли к меню")
-    await callback.message.edit_text('Добро пожаловать в меню бота-помощника в 3D печати!\
- Выберите нужный вам пункт меню.', reply_markup=kb.keyboard_inline_main_menu)
+    outbox.send(callback.message.edit_text('Добро пожаловать в меню бота-помощника в 3D печати!\
+ Выберите нужный вам пункт меню.', reply_markup=kb.keyboard_inline_main_menu))
 
 
 @dp.callback_query(F.data == 'cancel_order_manage')
-async def make_order(callback: CallbackQuery):
+async def cancel_order_manage(callback: CallbackQuery, state: FSMContext, db: AsyncDatabaseManager,
+                              print_queue: PrintQueue, outbox: Outbox):
+    await state.clear()
+    await refresh_print_queue(db, print_queue)
     await callback.answer("Вы перешли к панели управления заказами")
-    await callback.message.edit_text('Ваши не выполненные заказы:', reply_markup=kb.keyboard_inline1)
+    await safe_edit(callback.message, format_print_queue(print_queue), reply_markup=kb.keyboard_inline1,
+                    outbox=outbox)
+
+
+ORDER_LIST_TITLES = {1: 'Невыполненные заказы', 2: 'Выполненные заказы'}
+PAGE_SIZE = 10
+
+
+def format_orders_page(status_id: int, page: dict | int) -> str:
+    text = f'{ORDER_LIST_TITLES.get(status_id, "Заказы")}:'
+    if not page:
+        return text + '\nНе удалось получить данные'
+    if not page['rows']:
+        return text + '\nЗаказов нет'
+    for order_id, name, recommended_date, importance in page['rows']:
+        text += f'\n• {name} (id {order_id}) - до {recommended_date}, важность {importance}'
+    return text
+
+
+async def show_orders_page(callback: CallbackQuery, db: AsyncDatabaseManager, render_cache: RenderCache,
+                           outbox: Outbox, status_id: int, after: int = 0, before: int = 0):
+    async def render():
+        page = await db.get_orders_page(status_id, after=after or None, before=before or None, limit=PAGE_SIZE)
+        if page:
+            return format_orders_page(status_id, page), kb.orders_page_keyboard(status_id, page)
+
+    text, markup = (await render_cache.get(('orders', status_id, after, before), db.data_version('orders'), render)
+                    or (format_orders_page(status_id, 0), kb.orders_page_keyboard(status_id, 0)))
+    await callback.answer()
+    await safe_edit(callback.message, text, reply_markup=markup, outbox=outbox)
+
+
+@dp.callback_query(F.data == 'show_pending_orders')
+async def show_pending_orders(callback: CallbackQuery, db: AsyncDatabaseManager, render_cache: RenderCache,
+                              outbox: Outbox):
+    await show_orders_page(callback, db, render_cache, outbox, 1)
+
+
+@dp.callback_query(F.data == 'show_orders')
+async def show_done_orders(callback: CallbackQuery, db: AsyncDatabaseManager, render_cache: RenderCache,
+                           outbox: Outbox):
+    await show_orders_page(callback, db, render_cache, outbox, 2)
+
+
+@dp.callback_query(kb.OrdersPage.filter())
+async def orders_page(callback: CallbackQuery, callback_data: kb.OrdersPage, db: AsyncDatabaseManager,
+                      render_cache: RenderCache, outbox: Outbox):
+    await show_orders_page(callback, db, render_cache, outbox, callback_data.status_id, callback_data.after,
+                           callback_data.before)
+
+
+SEARCH_LIMIT = 10
+
+
+def format_search_results(query: str, orders: list[tuple] | int) -> str:
+    text = f'Поиск «{query}»:'
+    if orders == 0:
+        return text + '\nНе удалось выполнить поиск'
+    if not orders:
+        return text + '\nНичего не найдено'
+    for order_id, name, recommended_date, importance, status_id in orders:
+        status = 'выполнен' if status_id == 2 else 'не выполнен'
+        text += f'\n• {name} (id {order_id}) - до {recommended_date}, важность {importance}, {status}'
+    return text
+
+
+@dp.callback_query(F.data == 'search_orders')
+async def search_orders(callback: CallbackQuery, state: FSMContext, outbox: Outbox):
+    await callback.answer("Поиск заказа")
+    await state.set_state(Search.query)
+    outbox.send(callback.message.edit_text('Введите часть названия, ссылки или настроек печати заказа',
+                                           reply_markup=kb.keyboard_inline6))
+
+
+@dp.message(Search.query, F.text)
+async def search_query(message: types.Message, state: FSMContext, db: AsyncDatabaseManager, outbox: Outbox):
+    if not any(len(term) >= FTS_MIN_TERM for term in message.text.split()):
+        outbox.send(message.answer(f'Слова запроса должны быть не короче {FTS_MIN_TERM} символов, '
+                                   f'введите запрос заново', reply_markup=kb.keyboard_inline6))
+        return
+    await state.clear()
+    orders = await db.search_orders(message.text, limit=SEARCH_LIMIT)
+    outbox.send(message.answer(format_search_results(message.text, orders), reply_markup=kb.keyboard_search))
+
+
+def format_materials_page(page: dict | int) -> str:
+    text = 'Материалы в наличии:'
+    if not page:
+        return text + '\nНе удалось получить данные'
+    if not page['rows']:
+        return text + '\nМатериалов нет'
+    for _, name, quantity in page['rows']:
+        text += f'\n• {name}: {quantity}'
+    return text
+
+
+async def show_materials_page(callback: CallbackQuery, db: AsyncDatabaseManager, render_cache: RenderCache,
+                              outbox: Outbox, after: int = 0, before: int = 0):
+    async def render():
+        page = await db.get_materials_page(after=after or None, before=before or None, limit=PAGE_SIZE)
+        if page:
+            return format_materials_page(page), kb.materials_page_keyboard(page)
+
+    text, markup = (await render_cache.get(('materials', after, before), db.data_version('materials'), render)
+                    or (format_materials_page(0), kb.materials_page_keyboard(0)))
+    await safe_edit(callback.message, text, reply_markup=markup, outbox=outbox)
 
 
 @dp.callback_query(F.data == 'material_manage')
-async def make_order(callback: CallbackQuery):
+async def material_manage(callback: CallbackQuery, db: AsyncDatabaseManager, render_cache: RenderCache,
+                          outbox: Outbox):
     await callback.answer("Вы перешли к панели управления материалами")
-    await callback.message.edit_text('Материалы в наличии:', reply_markup=kb.keyboard_inline3)
+    await show_materials_page(callback, db, render_cache, outbox)
+
+
+@dp.callback_query(kb.MaterialsPage.filter())
+async def materials_page(callback: CallbackQuery, callback_data: kb.MaterialsPage, db: AsyncDatabaseManager,
+                         render_cache: RenderCache, outbox: Outbox):
+    await callback.answer()
+    await show_materials_page(callback, db, render_cache, outbox, callback_data.after, callback_data.before)
+
+
+def format_forecast(forecast: list[dict] | int) -> str:
+    text = 'Прогноз расхода материалов:'
+    if forecast == 0:
+        return text + '\nНе удалось получить данные'
+    if not forecast:
+        return text + '\nМатериалов нет'
+    for item in forecast:
+        line = f'\n• {item["material"]}: {item["quantity"]} г'
+        if item['pending']:
+            line += f', в заказах {item["pending"]} г'
+        if item['available'] <= 0:
+            line += ' - не хватает уже сейчас'
+        elif item['days_left'] is None and item['rate'] > 0:
+            line += f', {item["rate"]:.1f} г/день - хватит больше чем на {FORECAST_HORIZON_DAYS // 365} лет'
+        elif item['days_left'] is None:
+            line += ' - не расходуется'
+        else:
+            line += f', {item["rate"]:.1f} г/день - до {item["depletion_date"]:%d.%m.%Y}'
+        text += line
+    return text
+
+
+@dp.callback_query(F.data == 'material_forecast')
+async def material_forecast(callback: CallbackQuery, forecast: MaterialForecast, outbox: Outbox):
+    await callback.answer()
+    await safe_edit(callback.message, format_forecast(await forecast.forecast()),
+                    reply_markup=kb.keyboard_forecast, outbox=outbox)
+
+
+def format_finance_totals(totals: dict | int, start_date: str, end_date: str) -> str:
+    text = f'Финансы за последний месяц ({start_date} - {end_date}):'
+    if not totals:
+        return text + '\nНе удалось получить данные'
+    text += f'\nДоходы: {totals["revenue"]} руб\nРасходы: {totals["expenses"]} руб'
+    for category, total in totals['categories'].items():
+        text += f'\n  • {category}: {total} руб'
+    text += f'\nПрибыль: {round(totals["revenue"] - totals["expenses"], 2)} руб'
+    return text
 
 
 @dp.callback_query(F.data == 'finance_manage')
-async def make_order(callback: CallbackQuery):
+async def finance_manage(callback: CallbackQuery, db: AsyncDatabaseManager, render_cache: RenderCache,
+                         outbox: Outbox):
+    start_date, end_date = await db.get_last_month_date_range()
+    start_date, end_date = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+
+    async def render():
+        totals = await db.get_finance_totals(start_date, end_date)
+        if totals:
+            return format_finance_totals(totals, start_date, end_date), kb.keyboard_inline4
+
+    text, markup = (await render_cache.get(('finance', start_date, end_date), db.data_version('finance'), render)
+                    or (format_finance_totals(0, start_date, end_date), kb.keyboard_inline4))
     await callback.answer("Вы перешли к панели управления финансами")
-    await callback.message.edit_text('Финансы за последний месяц:', reply_markup=kb.keyboard_inline4)
+    await safe_edit(callback.message, text, reply_markup=markup, outbox=outbox)
+
+
+@dp.callback_query(F.data.in_({'report_orders', 'report_materials', 'report_finance'}))
+async def send_report(callback: CallbackQuery, db: AsyncDatabaseManager, reports: ReportCache, outbox: Outbox):
+    match callback.data:
+        case 'report_orders':
+            method, topics, kwargs, filename = 'export_orders_to_excel', ('orders',), {'done': True}, 'orders.xlsx'
+        case 'report_materials':
+            method, topics, kwargs, filename = 'get_all_materials_excel', ('materials',), {}, 'materials.xlsx'
+        case _:
+            start_date, end_date = await db.get_last_month_date_range()
+            start_date, end_date = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+            method, topics = 'export_expenses_and_revenue_between_dates_to_excel', ('finance',)
+            kwargs = {'start_date': start_date, 'end_date': end_date}
+            filename = f'finance_{start_date}_{end_date}.xlsx'
+    await callback.answer('Готовим отчёт...')
+    report = await reports.get(db, method, topics, **kwargs)
+    if report is None:
+        outbox.send(callback.message.answer('Не удалось построить отчёт'))
+        return
+    if report['file_id']:
+        # Already uploaded for this data version, Telegram resends it without a new upload
+        outbox.send(callback.message.answer_document(report['file_id']))
+        return
+    sent = await outbox.send(callback.message.answer_document(FSInputFile(report['path'], filename=filename)))
+    reports.remember(report['key'], sent.document.file_id)
+
+
+async def setup_workspace(db: AsyncDatabaseManager) -> dict:
+    """Очередь печати, кэш экранов, модель цены и прогноз материалов для базы db"""
+    print_queue = PrintQueue(config.printers)
+    print_queue.load(await db.get_pending_orders())
+    db.subscribe(print_queue.handle_event)
+    return {'print_queue': print_queue, 'render_cache': RenderCache(), 'pricing': PricingModel(db),
+            'forecast': MaterialForecast(db)}
+
+
+async def create_workflow_data() -> dict:
+    """Создать общие объекты, которые получают обработчики, и подключить метрики к dp
+
+    Если задан TENANTS_DIR, у каждого чата своя база: db, print_queue и render_cache
+    подставляет TenantMiddleware, а в данных диспетчера лежит пул tenants.
+    """
+    metrics = Metrics()
+    query_hook = partial(metrics.observe, 'query')
+    outbox = Outbox(bot, global_rate=config.outbox_global_rate, chat_rate=config.outbox_chat_rate,
+                    chat_burst=config.outbox_chat_burst)
+    reports = ReportCache(config.reports_dir, workers=config.report_workers, max_files=config.reports_max_files)
+    dp.message.middleware(MetricsMiddleware(metrics))
+    dp.callback_query.middleware(MetricsMiddleware(metrics))
+    if config.tenants_dir:
+        tenants = TenantRouter(config.tenants_dir, max_open=config.tenants_max_open,
+                               workspaces=config.tenant_workspaces, setup=setup_workspace,
+                               readers=1, query_hook=query_hook)
+        dp.message.outer_middleware(TenantMiddleware(tenants))
+        dp.callback_query.outer_middleware(TenantMiddleware(tenants))
+        return {'tenants': tenants, 'metrics': metrics, 'outbox': outbox, 'reports': reports}
+    db = AsyncDatabaseManager(config.db_file, query_hook=query_hook)
+    return {'db': db, **await setup_workspace(db), 'metrics': metrics, 'outbox': outbox, 'reports': reports}
 
 
 async def main():
-    await dp.start_polling(bot)
+    # Not at import: spawned report workers import the main module too
+    setup_logging(config.log_file, level=config.log_level, json_lines=config.log_json,
+                  max_bytes=config.log_max_bytes, backup_count=config.log_backup_count,
+                  rotate_when=config.log_rotate_when)
+    workflow_data = await create_workflow_data()
+    db = workflow_data.get('db') or workflow_data['tenants']
+    maintenance = MaintenanceScheduler(db, interval=config.maintenance_interval,
+                                       batch_size=config.maintenance_batch_size,
+                                       retention_days=config.retention_days,
+                                       unpaid_days=config.unpaid_order_days)
+    maintenance.start()
+    stock_alerts = StockAlertScheduler(workflow_data.get('forecast') or db, workflow_data['outbox'],
+                                       config.admin_ids, alert_days=config.stock_alert_days,
+                                       interval=config.stock_alert_interval)
+    stock_alerts.start()
+    try:
+        if config.webhook_url:
+            await run_webhook(dp, bot, config.webhook_url, path=config.webhook_path,
+                              host=config.webhook_host, port=config.webhook_port,
+                              secret_token=config.webhook_secret.get_secret_value() if config.webhook_secret else None,
+                              concurrency=config.webhook_concurrency, **workflow_data)
+        else:
+            await dp.start_polling(bot, **workflow_data)
+    finally:
+        await maintenance.stop()
+        await stock_alerts.stop()
+        await workflow_data['outbox'].close()
+        workflow_data['reports'].close()
+        if isinstance(db, TenantRouter):
+            await db.close()
+        else:
+            await db.close_connection()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,3 +1,4 @@
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import (InlineKeyboardButton, InlineKeyboardMarkup)
 
 back_button = InlineKeyboardButton(text='⬅️ Назад', callback_data='back_universal')
@@ -7,8 +8,12 @@ backmenu_button = InlineKeyboardButton(text='💼Возврат к меню💼'
 keyboard_inline1 = InlineKeyboardMarkup(
     inline_keyboard=[
         [InlineKeyboardButton(text='Новый заказ', callback_data='make_order')],
+        [InlineKeyboardButton(text='Взять следующий заказ в печать', callback_data='next_job')],
+        [InlineKeyboardButton(text='Все невыполненные заказы', callback_data='show_pending_orders')],
+        [InlineKeyboardButton(text='🔍 Поиск заказа', callback_data='search_orders')],
         [InlineKeyboardButton(text='Заказ выполнен', callback_data='done_order')],
         [InlineKeyboardButton(text='Посмотреть выполненные заказы', callback_data='show_orders')],
+        [InlineKeyboardButton(text='📄 Выгрузить выполненные заказы', callback_data='report_orders')],
         [InlineKeyboardButton(text='Удалить заказ', callback_data='delete_order')],
         [InlineKeyboardButton(text='💼Возврат к меню💼', callback_data='back_menu')]
                      ])
@@ -28,14 +33,22 @@ keyboard_inline3 = InlineKeyboardMarkup(
     inline_keyboard=[
         [InlineKeyboardButton(text='Добавить материал', callback_data='add_material')],
         [InlineKeyboardButton(text='Использовать материал', callback_data='use_material')],
+        [InlineKeyboardButton(text='📉 Прогноз расхода', callback_data='material_forecast')],
+        [InlineKeyboardButton(text='📄 Выгрузить в Excel', callback_data='report_materials')],
         [InlineKeyboardButton(text='💼Возврат к меню💼', callback_data='back_menu')]
                      ])
 
+keyboard_forecast = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text='⬅️ Назад', callback_data='material_manage')]
+                     ])
+
 keyboard_inline4 = InlineKeyboardMarkup(
     inline_keyboard=[
         [InlineKeyboardButton(text='Добавить доход', callback_data='add_income')],
         [InlineKeyboardButton(text='Добавить расход', callback_data='add_expense')],
         [InlineKeyboardButton(text='Финансы за промежуток времени', callback_data='finance_interval')],
+        [InlineKeyboardButton(text='📄 Отчёт за прошлый месяц', callback_data='report_finance')],
         [InlineKeyboardButton(text='💼Возврат к меню💼', callback_data='back_menu')]
                      ])
 
@@ -49,12 +62,72 @@ keyboard_inline6 = InlineKeyboardMarkup(
     inline_keyboard=[
         [InlineKeyboardButton(text='Отмена❌', callback_data='cancel_order_manage')]])
 
+keyboard_search = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text='🔍 Искать ещё', callback_data='search_orders')],
+        [InlineKeyboardButton(text='⬅️ Назад', callback_data='order_manage')]
+                     ])
+
 keyboard_inline7 = InlineKeyboardMarkup(
     inline_keyboard=[
         [InlineKeyboardButton(text='💼Возврат к меню💼', callback_data='back_menu')]])
 
-keyboard_inline8 = InlineKeyboardMarkup(
-    inline_keyboard=[
-        [InlineKeyboardButton(text='Своя стоимость', callback_data='custom_price_makeorder')],
-        [InlineKeyboardButton(text='Предложенная стоимость', callback_data='our_price_makeorder')]
-                     ])
+
+
+class OrdersPage(CallbackData, prefix='orders'):
+    """Страница списка заказов: after/before - id заказа, от которого листать"""
+    status_id: int
+    after: int = 0
+    before: int = 0
+
+
+class MaterialsPage(CallbackData, prefix='materials'):
+    """Страница списка материалов: after/before - id материала, от которого листать"""
+    after: int = 0
+    before: int = 0
+
+
+def page_buttons(page: dict | int, make_callback) -> list[InlineKeyboardButton]:
+    """Кнопки «назад/вперёд» для страницы из get_orders_page/get_materials_page"""
+    buttons = []
+    if not page:
+        return buttons
+    if page['has_prev']:
+        buttons.append(InlineKeyboardButton(text='◀️', callback_data=make_callback(before=page['rows'][0][0]).pack()))
+    if page['has_next']:
+        buttons.append(InlineKeyboardButton(text='▶️', callback_data=make_callback(after=page['rows'][-1][0]).pack()))
+    return buttons
+
+
+def orders_page_keyboard(status_id: int, page: dict | int) -> InlineKeyboardMarkup:
+    buttons = page_buttons(page, lambda **cursor: OrdersPage(status_id=status_id, **cursor))
+    return InlineKeyboardMarkup(inline_keyboard=([buttons] if buttons else []) + [
+        [InlineKeyboardButton(text='⬅️ Назад', callback_data='order_manage')]])
+
+
+def materials_page_keyboard(page: dict | int) -> InlineKeyboardMarkup:
+    buttons = page_buttons(page, lambda **cursor: MaterialsPage(**cursor))
+    return InlineKeyboardMarkup(inline_keyboard=([buttons] if buttons else []) + keyboard_inline3.inline_keyboard)
+
+
+class OrderPrice(CallbackData, prefix='price'):
+    """Выбор стоимости созданного заказа: custom - ввести свою"""
+    order_id: int
+    custom: bool = False
+
+
+def order_price_keyboard(order_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text='Своя стоимость', callback_data=OrderPrice(order_id=order_id, custom=True).pack())],
+        [InlineKeyboardButton(text='Предложенная стоимость', callback_data=OrderPrice(order_id=order_id).pack())]])
+
+
+class OrderPaid(CallbackData, prefix='paid'):
+    """Отметка оплаты заказа"""
+    order_id: int
+
+
+def order_paid_keyboard(order_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text='💰Заказ оплачен💰', callback_data=OrderPaid(order_id=order_id).pack())],
+        [InlineKeyboardButton(text='💼Возврат к меню💼', callback_data='back_menu')]])
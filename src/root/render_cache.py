@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, Message
+
+from src.utils.outbox import Outbox
+
+
+class RenderCache:
+    """Кэш готовых экранов бота: текста сообщения и клавиатуры.
+
+    Экран хранится по ключу (экран, страница, ...) вместе с версией данных, из которых
+    он построен (DatabaseManager.data_version). Пока версия не изменилась, экран
+    отдаётся из памяти без обращения к базе и повторного построения клавиатуры.
+    Для каждого ключа хранится только последняя версия, всего не более maxsize экранов.
+    """
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[tuple, tuple] = OrderedDict()
+
+    async def get(self, key: tuple, version: tuple, render) -> tuple[str, InlineKeyboardMarkup] | None:
+        """Вернуть экран из кэша или построить его вызовом await render()
+
+        Версию нужно получить до вызова, чтобы экран, построенный из уже устаревших
+        данных, не сохранился под новой версией. Если render вернул None (ошибка
+        чтения), результат не кэшируется.
+        """
+        item = self._data.get(key)
+        if item is not None and item[0] == version:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+        self.misses += 1
+        screen = await render()
+        if screen is not None:
+            self._data[key] = (version, screen)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return screen
+
+    def clear(self):
+        self._data.clear()
+
+
+async def safe_edit(message: Message, text: str, reply_markup: InlineKeyboardMarkup | None = None,
+                    outbox: Outbox | None = None) -> bool:
+    """Изменить текст и клавиатуру сообщения, если они отличаются от текущих
+
+    Возвращает False, если сообщение уже выглядит так же и запрос к Telegram не нужен.
+    С outbox правка ставится в очередь отправки и функция не ждёт ответа Telegram.
+    """
+    if message.text == text and message.reply_markup == reply_markup:
+        return False
+    if outbox is not None:
+        outbox.send(message.edit_text(text, reply_markup=reply_markup))
+        return True
+    try:
+        await message.edit_text(text, reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        # The message could have been changed since the update was received
+        if 'message is not modified' not in str(e):
+            raise
+        return False
+    return True
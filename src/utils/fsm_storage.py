@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+
+logger = logging.getLogger(__name__)
+
+def _encode(value: Any) -> str:
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в файле SQLite.
+
+    Состояния и данные сессий держатся в памяти (не более max_cached записей,
+    вытесняются давно не использованные) и сбрасываются на диск одной транзакцией
+    раз в flush_interval секунд, так что несколько update_data/set_state одного шага
+    мастера превращаются в одну запись. Сессии, не менявшиеся дольше ttl секунд,
+    удаляются и из памяти, и из файла. Даты в данных сохраняются строками ISO.
+    """
+
+    def __init__(self, db_file: str, ttl: float = 86400, flush_interval: float = 1.0,
+                 max_cached: int = 10000):
+        self.db_file = db_file
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_cached = max_cached
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # key -> [state, data, updated_at]
+        self._records: OrderedDict[str, list] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fsm-storage')
+        self._flush_task: asyncio.Task | None = None
+        self._purged_at = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_file)
+            self._conn.execute('PRAGMA journal_mode = WAL')
+            self._conn.execute('PRAGMA synchronous = NORMAL')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS fsm_sessions (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_fsm_sessions_updated_at ON fsm_sessions(updated_at)')
+            self._conn.commit()
+        return self._conn
+
+    def _load(self, key: str) -> tuple[str | None, dict, float] | None:
+        row = self._connect().execute('SELECT state, data, updated_at FROM fsm_sessions WHERE key = ?',
+                                      (key,)).fetchone()
+        if row is None or row[2] < time.time() - self.ttl:
+            return None
+        return row[0], json.loads(row[1]), row[2]
+
+    def _write(self, upserts: list[tuple], deletes: list[tuple], purge: bool):
+        conn = self._connect()
+        with conn:
+            conn.executemany('''
+                INSERT INTO fsm_sessions (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE
+                SET state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+            ''', upserts)
+            conn.executemany('DELETE FROM fsm_sessions WHERE key = ?', deletes)
+            if purge:
+                conn.execute('DELETE FROM fsm_sessions WHERE updated_at < ?', (time.time() - self.ttl,))
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _record(self, key: StorageKey) -> list:
+        raw_key = self.key_builder.build(key)
+        record = self._records.get(raw_key)
+        if record is not None and record[2] < time.time() - self.ttl:
+            del self._records[raw_key]
+            record = None
+        if record is None:
+            loaded = await self._run(self._load, raw_key)
+            # The session could have been written while the row was being loaded
+            record = self._records.get(raw_key)
+            if record is None:
+                record = list(loaded) if loaded else [None, {}, time.time()]
+                self._records[raw_key] = record
+        self._records.move_to_end(raw_key)
+        if len(self._records) > self.max_cached:
+            self._evict()
+        return record
+
+    def _touch(self, key: StorageKey, record: list):
+        raw_key = self.key_builder.build(key)
+        record[2] = time.time()
+        self._dirty.add(raw_key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def _evict(self, expired: bool = False):
+        """Вытеснить из памяти давно не использованные (и при expired - устаревшие) сессии
+
+        Несохранённые сессии не вытесняются до следующего сброса на диск.
+        """
+        if expired:
+            expired_before = time.time() - self.ttl
+            for raw_key in [raw_key for raw_key, record in self._records.items() if record[2] < expired_before]:
+                del self._records[raw_key]
+        for raw_key in list(self._records):
+            if len(self._records) <= self.max_cached:
+                break
+            if raw_key not in self._dirty:
+                del self._records[raw_key]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record[0] = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._record(key))[0]
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        record = await self._record(key)
+        record[1] = data.copy()
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return (await self._record(key))[1].copy()
+
+    async def flush(self):
+        """Сохранить на диск все изменённые сессии одной транзакцией и удалить устаревшие
+
+        Если запись не удалась, сессии остаются изменёнными до следующего сброса.
+        """
+        purge = time.monotonic() - self._purged_at > min(self.ttl, 60)
+        if not self._dirty and not purge:
+            return
+        dirty, self._dirty = self._dirty, set()
+        try:
+            upserts, deletes = [], []
+            for raw_key in dirty:
+                record = self._records.get(raw_key)
+                if record is None:
+                    continue
+                if record[0] is None and not record[1]:
+                    deletes.append((raw_key,))
+                else:
+                    upserts.append((raw_key, record[0], json.dumps(record[1], default=_encode), record[2]))
+            await self._run(self._write, upserts, deletes, purge)
+        except BaseException:
+            # Sessions changed during the write are already back in _dirty
+            self._dirty |= dirty
+            raise
+        if purge:
+            self._purged_at = time.monotonic()
+        self._evict(expired=purge)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception(e)
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
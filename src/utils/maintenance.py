@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+
+from data.async_db import AsyncDatabaseManager
+from data.tenants import TenantRouter
+
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceScheduler:
+    """Периодическое обслуживание базы в фоне.
+
+    Удаляет неоплаченные заказы старше unpaid_days дней и заказы старше retention_days
+    дней (каждое удаление - только если задан его срок) порциями по batch_size, отдавая
+    цикл событий между порциями, затем выполняет PRAGMA optimize и incremental vacuum.
+    Первый запуск - через interval после start(), а не при старте бота. Время каждого шага пишется в лог и хранится в last_run.
+    Вместо одной базы можно передать TenantRouter: тогда обслуживаются открытые
+    в пуле базы рабочих пространств, счётчики и время суммируются.
+    """
+
+    def __init__(self, db: AsyncDatabaseManager | TenantRouter, interval: float = 3600, batch_size: int = 500,
+                 pause: float = 0.05, retention_days: int | None = None, unpaid_days: int | None = None):
+        self.db = db
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.retention_days = retention_days
+        self.unpaid_days = unpaid_days
+        self.last_run: dict = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception(e)
+
+    async def _purge(self, db: AsyncDatabaseManager, method: str, **kwargs) -> int:
+        """Удалять порции, пока метод удаляет полный batch_size строк"""
+        total = 0
+        while True:
+            deleted = await getattr(db, method)(limit=self.batch_size, **kwargs)
+            if deleted <= 0:
+                return total
+            total += deleted
+            if deleted < self.batch_size:
+                return total
+            await asyncio.sleep(self.pause)
+
+    async def _run_steps(self, db: AsyncDatabaseManager, report: dict):
+        def add(key: str, value):
+            report[key] = report.get(key, 0) + value
+
+        if self.unpaid_days is not None:
+            started = time.perf_counter()
+            add('unpaid_orders_deleted', await self._purge(db, 'delete_unpaid_orders_chunk', days=self.unpaid_days))
+            add('unpaid_orders_seconds', time.perf_counter() - started)
+
+        if self.retention_days is not None:
+            started = time.perf_counter()
+            add('expired_orders_deleted', await self._purge(db, 'auto_delete_expired_records_chunk',
+                                                            days=self.retention_days))
+            add('expired_orders_seconds', time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await db.optimize()
+        add('optimize_seconds', time.perf_counter() - started)
+
+    async def run_once(self) -> dict:
+        """Выполнить все задачи обслуживания один раз и вернуть отчёт о времени"""
+        report = {'started_at': time.time()}
+        if isinstance(self.db, TenantRouter):
+            report['tenants'] = 0
+            for tenant in self.db.open_tenants():
+                async with self.db.acquire(tenant) as workspace:
+                    await self._run_steps(workspace['db'], report)
+                report['tenants'] += 1
+        else:
+            await self._run_steps(self.db, report)
+
+        self.last_run = report
+        logger.info('Maintenance: %s', ', '.join(
+            f'{key}={value:.3f}' if isinstance(value, float) else f'{key}={value}'
+            for key, value in report.items() if key != 'started_at'))
+        return report
@@ -0,0 +1,144 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+
+# Upper bounds of histogram buckets in seconds: 0.1 ms doubling up to ~52 s
+BUCKETS = tuple(0.0001 * 2 ** i for i in range(20))
+
+KIND_TITLES = {'handler': 'Обработчики', 'callback': 'Кнопки (callback_data)', 'query': 'Запросы к базе'}
+
+
+class Histogram:
+    """Гистограмма задержек с фиксированными корзинами BUCKETS"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float, error: bool = False):
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+
+    def percentile(self, q: float) -> float:
+        """Оценка квантиля q (0..1) с линейной интерполяцией внутри корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1] * 2
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return BUCKETS[-1]
+
+
+class Metrics:
+    """Реестр задержек обработчиков, кнопок и запросов к базе.
+
+    Серии задаются парой (вид, имя), например ('query', 'pending_orders').
+    observe можно вызывать из любого потока, в том числе из потоков базы.
+    """
+
+    def __init__(self):
+        self._series: dict[tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def observe(self, kind: str, name: str, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self._series.get((kind, name))
+            if histogram is None:
+                histogram = self._series[(kind, name)] = Histogram()
+            histogram.observe(seconds, error)
+
+    def summary(self, kind: str | None = None) -> list[dict]:
+        """Счётчики и квантили по сериям, самые медленные (по p95) первыми"""
+        with self._lock:
+            rows = [{
+                'kind': series_kind, 'name': name, 'count': histogram.count, 'errors': histogram.errors,
+                'error_rate': histogram.errors / histogram.count,
+                'p50': histogram.percentile(0.5), 'p95': histogram.percentile(0.95),
+                'p99': histogram.percentile(0.99),
+            } for (series_kind, name), histogram in self._series.items() if kind in (None, series_kind)]
+        return sorted(rows, key=lambda row: row['p95'], reverse=True)
+
+    def format_stats(self, limit: int = 10) -> str:
+        """Текст для команды /stats"""
+        text = f'Статистика за {(time.time() - self.started_at) / 3600:.1f} ч'
+        for kind, title in KIND_TITLES.items():
+            rows = self.summary(kind)
+            if not rows:
+                continue
+            text += f'\n\n{title}:'
+            for row in rows[:limit]:
+                text += (f'\n{row["name"]}: {row["count"]} шт, p50 {row["p50"] * 1000:.1f} мс, '
+                         f'p95 {row["p95"] * 1000:.1f} мс, p99 {row["p99"] * 1000:.1f} мс')
+                if row['errors']:
+                    text += f', ошибок {row["error_rate"]:.1%}'
+        return text
+
+    def prometheus(self) -> str:
+        """Все серии в текстовом формате Prometheus"""
+        lines = []
+        with self._lock:
+            series = sorted(self._series.items())
+            for kind in sorted({kind for kind, _ in self._series}):
+                metric = f'printplanner_{kind}_seconds'
+                lines.append(f'# TYPE {metric} histogram')
+                for (series_kind, name), histogram in series:
+                    if series_kind != kind:
+                        continue
+                    label = name.replace('\\', '\\\\').replace('"', '\\"')
+                    cumulative = 0
+                    for bound, bucket_count in zip(BUCKETS, histogram.buckets):
+                        cumulative += bucket_count
+                        lines.append(f'{metric}_bucket{{name="{label}",le="{bound:g}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{name="{label}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{name="{label}"}} {histogram.total}')
+                    lines.append(f'{metric}_count{{name="{label}"}} {histogram.count}')
+                lines.append(f'# TYPE printplanner_{kind}_errors_total counter')
+                for (series_kind, name), histogram in series:
+                    if series_kind == kind:
+                        label = name.replace('\\', '\\\\').replace('"', '\\"')
+                        lines.append(f'printplanner_{kind}_errors_total{{name="{label}"}} {histogram.errors}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware: время работы каждого обработчика и каждой кнопки
+
+    Кнопки группируются по префиксу callback_data (до первого ':'), чтобы
+    страницы списков с разными курсорами попадали в одну серию.
+    """
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def __call__(self, handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        error = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            handler_object = data.get('handler')
+            name = handler_object.callback.__name__ if handler_object is not None else type(event).__name__
+            self.metrics.observe('handler', name, seconds, error)
+            if isinstance(event, CallbackQuery) and event.data:
+                self.metrics.observe('callback', event.data.split(':', 1)[0], seconds, error)
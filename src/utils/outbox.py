@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import EditMessageCaption, EditMessageReplyMarkup, EditMessageText, TelegramMethod
+
+
+logger = logging.getLogger(__name__)
+
+# Edits that replace the whole previous edit of the same kind, so only the last one matters
+COALESCED_METHODS = (EditMessageText, EditMessageReplyMarkup, EditMessageCaption)
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def reserve(self) -> float:
+        """Забрать токен и вернуть, сколько секунд нужно подождать до его появления
+
+        Токены резервируются в долг, поэтому ожидающие обслуживаются по порядку вызовов.
+        """
+        self.tokens = self.refill() - 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def pause(self, seconds: float):
+        """Не выдавать токены ещё seconds секунд (после RetryAfter)"""
+        self.tokens = min(self.refill(), 0.0) - seconds * self.rate
+
+
+class _Job:
+    def __init__(self, method: TelegramMethod, future: asyncio.Future, key: tuple | None):
+        self.method = method
+        self.future = future
+        self.key = key
+
+
+class Outbox:
+    """Очередь исходящих запросов к Telegram с учётом ограничений API.
+
+    send() ставит запрос в очередь чата и сразу возвращает future с результатом,
+    так что обработчику не нужно ждать отправки. Запросы одного чата уходят по
+    порядку; темп ограничен ведром чата (chat_rate в секунду, до chat_burst подряд)
+    и общим ведром бота (global_rate). Если правка того же сообщения ещё ждёт
+    отправки, она заменяется новой. RetryAfter, сетевые ошибки и ошибки сервера
+    повторяются в фоне до max_retries раз. Запрос отправляет бот, к которому он
+    привязан (message.answer(...) без await), иначе bot.
+    """
+
+    def __init__(self, bot: Bot | None = None, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 max_retries: int = 5, max_idle_buckets: int = 4096):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_idle_buckets = max_idle_buckets
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failed = 0
+        self._queues: dict[int | str | None, deque[_Job]] = {}
+        self._buckets: dict[int | str | None, TokenBucket] = {}
+        self._edits: dict[tuple, _Job] = {}
+        self._workers: dict[int | str | None, asyncio.Task] = {}
+        self._pruned_at = 0.0
+
+    def send(self, method: TelegramMethod) -> asyncio.Future:
+        """Поставить запрос в очередь; future получит ответ Telegram или исключение"""
+        chat_id = getattr(method, 'chat_id', None)
+        key = None
+        if isinstance(method, COALESCED_METHODS) and method.message_id is not None:
+            key = (type(method), chat_id, method.message_id)
+            job = self._edits.get(key)
+            if job is not None:
+                job.method = method
+                self.coalesced += 1
+                return job.future
+
+        job = _Job(method, asyncio.get_running_loop().create_future(), key)
+        if key is not None:
+            self._edits[key] = job
+        self._queues.setdefault(chat_id, deque()).append(job)
+        if chat_id not in self._workers:
+            if len(self._buckets) > self.max_idle_buckets:
+                self._prune_buckets()
+            self._workers[chat_id] = asyncio.create_task(self._drain(chat_id))
+        return job.future
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def _drain(self, chat_id: int | str | None):
+        queue = self._queues[chat_id]
+        bucket = self._buckets.setdefault(chat_id, TokenBucket(self.chat_rate, self.chat_burst))
+        try:
+            while queue:
+                delay = bucket.reserve()
+                if delay:
+                    await asyncio.sleep(delay)
+                # Picked after the wait, so edits queued meanwhile are coalesced into it
+                job = queue.popleft()
+                if job.key is not None and self._edits.get(job.key) is job:
+                    del self._edits[job.key]
+                try:
+                    await self._deliver(job, bucket)
+                except asyncio.CancelledError:
+                    job.future.cancel()
+                    raise
+        finally:
+            del self._workers[chat_id]
+            if not queue:
+                del self._queues[chat_id]
+
+    def _prune_buckets(self):
+        """Забыть вёдра простаивающих чатов, которые уже заполнились"""
+        now = time.monotonic()
+        if now - self._pruned_at < 1:
+            return
+        self._pruned_at = now
+        for chat_id, bucket in list(self._buckets.items()):
+            if chat_id not in self._workers and bucket.refill() >= bucket.capacity:
+                del self._buckets[chat_id]
+
+    async def _deliver(self, job: _Job, bucket: TokenBucket):
+        for attempt in range(self.max_retries + 1):
+            delay = self.global_bucket.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                result = await (job.method.bot or self.bot)(job.method)
+            except TelegramRetryAfter as e:
+                error, wait = e, e.retry_after
+                bucket.pause(wait)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                error, wait = e, min(2 ** attempt, 30)
+            except TelegramBadRequest as e:
+                # The screen is already shown, nothing to send
+                if 'message is not modified' in str(e):
+                    self._resolve(job, False)
+                else:
+                    self._fail(job, e)
+                return
+            except Exception as e:
+                self._fail(job, e)
+                return
+            else:
+                self.sent += 1
+                self._resolve(job, result)
+                return
+            if attempt == self.max_retries:
+                break
+            self.retries += 1
+            logger.warning('Retrying %s in %s s: %s', type(job.method).__name__, wait, error)
+            await asyncio.sleep(wait)
+        self._fail(job, error)
+
+    @staticmethod
+    def _resolve(job: _Job, result):
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def _fail(self, job: _Job, error: Exception):
+        self.failed += 1
+        logger.error('Failed to send %s: %s', type(job.method).__name__, error)
+        if not job.future.done():
+            job.future.set_exception(error)
+            # Handlers usually do not await the future, so the error is only logged
+            job.future.exception()
+
+    async def close(self, timeout: float | None = 10):
+        """Дождаться отправки очереди (не дольше timeout секунд) и остановить отправку"""
+        workers = list(self._workers.values())
+        if workers:
+            await asyncio.wait(workers, timeout=timeout)
+        for worker in list(self._workers.values()):
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        for queue in self._queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._queues.clear()
+        self._edits.clear()
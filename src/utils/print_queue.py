@@ -0,0 +1,147 @@
+import heapq
+import itertools
+import threading
+
+
+ORDER_FIELDS = ('id', 'name', 'recommended_date', 'importance', 'creation_date')
+
+
+def default_score(order: dict) -> tuple:
+    """Сначала заказы с ближайшей датой выполнения, при равной дате - более важные"""
+    recommended_date = order.get('recommended_date')
+    return (str(recommended_date) if recommended_date else '9999-12-31',
+            -(order.get('importance') or 0),
+            str(order.get('creation_date') or ''))
+
+
+class PrintQueue:
+    """Очередь печати невыполненных заказов с приоритетами.
+
+    Заказы хранятся в двоичной куче, упорядоченной функцией score (меньше - раньше).
+    Добавление, изменение и удаление заказа выполняются за O(log n): устаревшие
+    элементы кучи помечаются удалёнными и отбрасываются при извлечении.
+    Заказ, взятый в работу принтером, покидает кучу до выполнения или удаления.
+    Методы потокобезопасны, так как события приходят из потока-писателя базы.
+    """
+
+    def __init__(self, printers: list[str] | tuple[str, ...] = ('Принтер 1',), score=default_score):
+        self.score = score
+        self.stale = False
+        self._heap: list[list] = []
+        self._entries: dict[int, list] = {}
+        self._printers: dict[str, dict | None] = {printer: None for printer in printers}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def load(self, orders: list[tuple] | list[dict]):
+        """Перестроить очередь по списку невыполненных заказов за O(n)
+
+        Заказы, уже взятые в работу и всё ещё невыполненные, остаются за своими принтерами.
+        """
+        orders = [dict(zip(ORDER_FIELDS, order)) if not isinstance(order, dict) else order for order in orders]
+        with self._lock:
+            pending_ids = {order['id'] for order in orders}
+            running_ids = set()
+            for printer, job in self._printers.items():
+                if job is not None and job['id'] not in pending_ids:
+                    self._printers[printer] = None
+                elif job is not None:
+                    running_ids.add(job['id'])
+
+            self._entries = {}
+            for order in orders:
+                if order['id'] not in running_ids:
+                    self._entries[order['id']] = [self.score(order), next(self._counter), order]
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+            self.stale = False
+
+    def push(self, order: dict):
+        """Добавить заказ или обновить его приоритет"""
+        with self._lock:
+            self._remove(order['id'])
+            entry = [self.score(order), next(self._counter), order]
+            self._entries[order['id']] = entry
+            heapq.heappush(self._heap, entry)
+
+    def remove(self, order_id: int) -> dict | None:
+        """Убрать заказ из очереди и освободить принтер, если заказ был в работе"""
+        with self._lock:
+            return self._remove(order_id)
+
+    def _remove(self, order_id: int) -> dict | None:
+        entry = self._entries.pop(order_id, None)
+        if entry is not None:
+            order, entry[2] = entry[2], None
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                # Drop accumulated removed entries so the heap stays proportional to the queue
+                self._heap = list(self._entries.values())
+                heapq.heapify(self._heap)
+            return order
+        for printer, job in self._printers.items():
+            if job is not None and job['id'] == order_id:
+                self._printers[printer] = None
+                return job
+        return None
+
+    def _pop(self) -> dict | None:
+        while self._heap:
+            order = heapq.heappop(self._heap)[2]
+            if order is not None:
+                del self._entries[order['id']]
+                return order
+        return None
+
+    def peek(self, count: int = 1) -> list[dict]:
+        """Следующие count заказов в порядке приоритета, за O(count log n)"""
+        with self._lock:
+            taken = []
+            while len(taken) < count and (order := self._pop()) is not None:
+                taken.append(order)
+            for order in taken:
+                entry = [self.score(order), next(self._counter), order]
+                self._entries[order['id']] = entry
+                heapq.heappush(self._heap, entry)
+            return taken
+
+    def assign(self, printer: str | None = None) -> tuple[str, dict] | None:
+        """Отдать следующий заказ свободному принтеру (или указанному)
+
+        Возвращает (принтер, заказ) или None, если нет свободного принтера или заказов.
+        """
+        with self._lock:
+            if printer is None:
+                printer = next((name for name, job in self._printers.items() if job is None), None)
+            if printer is None or self._printers.get(printer, True) is not None:
+                return None
+            order = self._pop()
+            if order is None:
+                return None
+            self._printers[printer] = order
+            return printer, order
+
+    def jobs(self) -> dict[str, dict | None]:
+        """Текущие заказы принтеров"""
+        with self._lock:
+            return dict(self._printers)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def handle_event(self, event: str, payload: dict):
+        """Обработчик событий DatabaseManager.subscribe"""
+        match event:
+            case 'order_added':
+                if not payload['done']:
+                    self.push({field: payload[field] for field in ORDER_FIELDS})
+            case 'order_status_updated':
+                if payload['done']:
+                    self.remove(int(payload['id']))
+                else:
+                    # The order details are not part of the event, so reload lazily
+                    self.stale = True
+            case 'order_deleted':
+                self.remove(int(payload['id']))
+            case 'orders_purged' | 'orders_imported':
+                self.stale = True
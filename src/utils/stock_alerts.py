@@ -0,0 +1,82 @@
+import asyncio
+import logging
+
+from aiogram.methods import SendMessage
+
+from data.forecast import MaterialForecast
+from data.tenants import TenantRouter
+from src.utils.outbox import Outbox
+
+
+logger = logging.getLogger(__name__)
+
+
+def format_stock_alert(alerts: list[dict]) -> str:
+    text = '⚠️ Заканчиваются материалы:'
+    for item in alerts:
+        if item['available'] <= 0:
+            text += f'\n• {item["material"]}: не хватает {-item["available"]} г для текущих заказов'
+        else:
+            text += (f'\n• {item["material"]}: осталось {item["available"]} г, '
+                     f'хватит до {item["depletion_date"]:%d.%m.%Y}')
+    return text
+
+
+class StockAlertScheduler:
+    """Периодическая проверка прогноза материалов и предупреждения владельцу.
+
+    Раз в interval секунд берёт MaterialForecast.new_alerts(alert_days) и отправляет
+    одно сообщение через outbox каждому из recipients. Для TenantRouter проверяются
+    открытые пространства, а сообщение уходит в чаты пространства (TenantRouter.chats),
+    если их нет - recipients. Первая проверка - через interval после запуска, чтобы
+    не загружать pandas при старте бота.
+    """
+
+    def __init__(self, target: MaterialForecast | TenantRouter, outbox: Outbox, recipients: list[int],
+                 alert_days: float = 7, interval: float = 1800):
+        self.target = target
+        self.outbox = outbox
+        self.recipients = recipients
+        self.alert_days = alert_days
+        self.interval = interval
+        self.sent = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception(e)
+
+    async def _check(self, forecast: MaterialForecast, recipients: list[int]):
+        alerts = await forecast.new_alerts(self.alert_days)
+        if not alerts:
+            return
+        text = format_stock_alert(alerts)
+        for chat_id in recipients:
+            self.outbox.send(SendMessage(chat_id=chat_id, text=text))
+            self.sent += 1
+
+    async def run_once(self):
+        """Проверить прогноз и разослать новые предупреждения"""
+        if isinstance(self.target, TenantRouter):
+            for tenant in self.target.open_tenants():
+                async with self.target.acquire(tenant) as workspace:
+                    await self._check(workspace['forecast'], self.target.chats(tenant) or self.recipients)
+        else:
+            await self._check(self.target, self.recipients)
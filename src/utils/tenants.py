@@ -0,0 +1,27 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from data.tenants import TenantRouter
+
+
+class TenantMiddleware(BaseMiddleware):
+    """Внешний middleware: подставляет обработчику объекты рабочего пространства чата
+
+    Ключи из TenantRouter.acquire (db, print_queue, render_cache, pricing, forecast) заменяют
+    одноимённые данные диспетчера, имя пространства передаётся как tenant.
+    """
+
+    def __init__(self, router: TenantRouter):
+        self.router = router
+
+    async def __call__(self, handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: dict[str, Any]) -> Any:
+        chat = data.get('event_chat') or data.get('event_from_user')
+        if chat is None:
+            return await handler(event, data)
+        tenant = self.router.workspace(chat.id)
+        async with self.router.acquire(tenant) as workspace:
+            data.update(workspace, tenant=tenant)
+            return await handler(event, data)
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """Обработчик вебхука, обрабатывающий не более concurrency обновлений одновременно.
+
+    Обновления обрабатываются в фоне, а Telegram сразу получает ответ. Когда все
+    слоты заняты, ответ на новый запрос задерживается до освобождения слота, и
+    Telegram сам снижает темп отправки.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, concurrency: int = 100, **kwargs: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        await self._semaphore.acquire()
+        try:
+            return await super()._handle_request_background(bot, request)
+        except Exception:
+            # The update was not scheduled, so nobody else will release the slot
+            self._semaphore.release()
+            raise
+
+    async def _background_feed_update(self, bot: Bot, update: dict[str, Any]) -> None:
+        try:
+            await super()._background_feed_update(bot, update)
+        finally:
+            self._semaphore.release()
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, base_url: str, path: str = '/webhook',
+                      host: str = '0.0.0.0', port: int = 8080, secret_token: str | None = None,
+                      concurrency: int = 100, **data: Any):
+    """Запустить встроенный aiohttp-сервер и зарегистрировать вебхук в Telegram
+
+    data передаётся обработчикам так же, как именованные аргументы start_polling.
+    Работает до отмены задачи, после чего сервер останавливается.
+    """
+    app = web.Application()
+    LimitedRequestHandler(dispatcher, bot, concurrency=concurrency, secret_token=secret_token,
+                          **data).register(app, path=path)
+    setup_application(app, dispatcher, bot=bot, **data)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        await bot.set_webhook(base_url.rstrip('/') + path, secret_token=secret_token,
+                              max_connections=min(concurrency, 100),
+                              allowed_updates=dispatcher.resolve_used_update_types())
+        logger.info('Webhook server is listening on %s:%s%s', host, port, path)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,55 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from data.db_manage import DatabaseManager
+
+
+MATERIALS = ('PLA', 'PETG', 'ABS', 'TPU', 'Nylon')
+CATEGORIES = ('Пластик', 'Электричество', 'Запчасти', 'Аренда', 'Доставка')
+
+
+def fill(db: DatabaseManager, size: int, seed: int = 1):
+    """Заполнить базу size заказами, расходами и доходами за последние два года и выполнить ANALYZE"""
+    rng = random.Random(seed)
+    today = date.today()
+
+    def day() -> str:
+        return (today - timedelta(days=rng.randrange(730))).isoformat()
+
+    cursor = db.conn.cursor()
+    cursor.executemany('INSERT INTO materials (name, quantity) VALUES (?, ?)',
+                       [(name, rng.randrange(10000)) for name in MATERIALS])
+    cursor.executemany('INSERT INTO expense_categories (name) VALUES (?)', [(name,) for name in CATEGORIES])
+    cursor.executemany('''
+        INSERT INTO orders (id, name, link, recommended_date, importance, settings, cost, payment_info,
+                            status_id, creation_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(order_id, f'Заказ {order_id}', 'https://example.com/model.stl', day(), rng.randint(1, 10), '0.2 мм',
+           rng.randrange(100, 5000), rng.random() < 0.8, rng.choice((1, 2)), day())
+          for order_id in range(1, size + 1)])
+    cursor.executemany('INSERT INTO order_materials (order_id, material_id, quantity) VALUES (?, ?, ?)',
+                       [(order_id, rng.randint(1, len(MATERIALS)), rng.randrange(10, 500))
+                        for order_id in range(1, size + 1)])
+    cursor.executemany('INSERT INTO expenses (category_id, amount, date_spent, description) VALUES (?, ?, ?, ?)',
+                       [(rng.randint(1, len(CATEGORIES)), round(rng.uniform(10, 3000), 2), day(), 'test')
+                        for _ in range(size)])
+    cursor.executemany('INSERT INTO revenue (order_id, amount, date_received) VALUES (?, ?, ?)',
+                       [(rng.randint(1, size), round(rng.uniform(100, 5000), 2), day()) for _ in range(size)])
+    db.conn.commit()
+    cursor.execute('ANALYZE')
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'test.db'))
+    yield manager
+    manager.close_connection()
+
+
+@pytest.fixture
+def filled_db(db):
+    """База с 2000 заказов, расходов и доходов после ANALYZE"""
+    fill(db, 2000)
+    return db
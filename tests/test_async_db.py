@@ -0,0 +1,39 @@
+import asyncio
+
+from data.async_db import AsyncDatabaseManager
+
+
+def test_batched_writes_get_their_own_results(tmp_path):
+    async def main():
+        db = AsyncDatabaseManager(str(tmp_path / 'test.db'), batch_writes=True, batch_interval=0.05)
+        batches = []
+        run_batch = db.writer.run_batch
+        db.writer.run_batch = lambda calls: batches.append(len(calls)) or run_batch(calls)
+        try:
+            await db.update_material('PLA', 100, 'add')
+            results = await asyncio.gather(
+                db.add_order('Первый', '', 'PLA', 10, '2025-01-10', 5, '', 100, True, False, '2025-01-01'),
+                db.update_material('PLA', 1000, 'subtract'),
+                db.adjust_materials([('PLA', -30), ('ABS', -1)], atomic=True),
+                db.update_material('PLA', 1, 'multiply'),
+                db.add_order('Второй', '', 'PETG', 20, '2025-01-11', 3, '', 200, False, False, '2025-01-01'),
+                db.update_material('PLA', 40, 'subtract'),
+            )
+            materials = dict(await db.get_all_materials())
+            order = await db.get_order(results[4])
+        finally:
+            await db.close_connection()
+        return batches, results, materials, order
+
+    batches, results, materials, order = asyncio.run(main())
+    assert batches == [1, 6]
+    first_id, not_enough, atomic, invalid, second_id, subtracted = results
+    assert second_id == first_id + 1
+    assert not_enough == -1
+    assert atomic == [('PLA', None), ('ABS', -1)]
+    assert invalid == 0
+    assert subtracted == 60
+    # Failed operations of the batch leave no changes behind
+    assert materials['PLA'] == 60
+    assert materials['PETG'] == 0
+    assert order[1] == 'Второй'
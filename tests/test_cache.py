@@ -0,0 +1,118 @@
+import pytest
+
+from data import cache as cache_module
+from data.cache import LRUCache, MISSING
+
+
+def test_hits_and_misses_by_namespace():
+    cache = LRUCache()
+    assert cache.get(('order', 'id', 1)) is MISSING
+    cache.set(('order', 'id', 1), 'row')
+    assert cache.get(('order', 'id', 1)) == 'row'
+    assert cache.get(('material', 'PLA'), None) is None
+    assert cache.stats() == {
+        'size': 1, 'hits': 1, 'misses': 2,
+        'namespaces': {'material': {'hits': 0, 'misses': 1}, 'order': {'hits': 1, 'misses': 1}},
+    }
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.set(('material', 'PLA'), 5)
+    now[0] += 9
+    assert cache.get(('material', 'PLA')) == 5
+    now[0] += 2
+    assert cache.get(('material', 'PLA')) is MISSING
+    assert cache.stats()['size'] == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = LRUCache(maxsize=2)
+    cache.set(('k', 1), 1)
+    cache.set(('k', 2), 2)
+    cache.get(('k', 1))
+    cache.set(('k', 3), 3)
+    assert cache.get(('k', 2)) is MISSING
+    assert cache.get(('k', 1)) == 1
+    assert cache.get(('k', 3)) == 3
+
+
+def test_set_after_invalidation_is_dropped():
+    cache = LRUCache()
+    generation = cache.generation
+    cache.invalidate(('order', 'id', 1))
+    cache.set(('order', 'id', 1), 'stale', generation)
+    assert cache.get(('order', 'id', 1)) is MISSING
+    cache.set(('order', 'id', 1), 'fresh', cache.generation)
+    assert cache.get(('order', 'id', 1)) == 'fresh'
+
+
+def test_stale_read_does_not_repopulate_cache(db):
+    order_id = db.add_order('Заказ', '', 'PLA', 10, '2025-01-10', 5, '', 100, True, False, '2025-01-01')
+
+    def load_during_write():
+        # A write commits between the read and the cache update
+        row = db._query(db.conn.cursor(), 'get_order_by_id', (order_id,))[0]
+        db.update_order_status(order_id, True)
+        return row
+
+    assert db._cached(('order', 'id', order_id), load_during_write) is not None
+    assert db.cache.get(('order', 'id', order_id)) is MISSING
+
+
+def status(db, order_id: int) -> int:
+    columns = [row[1] for row in db.conn.execute('PRAGMA table_info(orders)')]
+    return db.get_order(order_id)[columns.index('status_id')]
+
+
+@pytest.fixture
+def order_id(db):
+    return db.add_order('Заказ', '', 'PLA', 10, '2025-01-10', 5, '', 100, True, False, '2025-01-01')
+
+
+def test_add_order_invalidates_missing_name(db):
+    assert db.get_order('Новый', key='name') is None
+    db.add_order('Новый', '', 'PLA', 10, '2025-01-10', 5, '', 100, True, False, '2025-01-01')
+    assert db.get_order('Новый', key='name')[1] == 'Новый'
+
+
+def test_add_order_caches_material_id(db, order_id):
+    material_id = db.conn.execute("SELECT id FROM materials WHERE name = 'PLA'").fetchone()[0]
+    assert db.cache.get(('material_id', 'PLA')) == material_id
+
+
+def test_update_order_status_invalidates_order(db, order_id):
+    assert status(db, order_id) == 1
+    db.get_order('Заказ', key='name')
+    db.update_order_status(order_id, True)
+    assert status(db, order_id) == 2
+    assert db.cache.get(('order', 'name', 'Заказ')) is MISSING
+
+
+def test_delete_order_invalidates_id_and_name(db, order_id):
+    db.get_order(order_id)
+    db.get_order('Заказ', key='name')
+    db.delete_order(order_id)
+    assert db.get_order(order_id) is None
+    assert db.get_order('Заказ', key='name') is None
+
+
+def test_update_material_invalidates_material(db, order_id):
+    assert db.get_material_by_name('PLA') == ('PLA', 0)
+    assert db.get_all_materials() == [('PLA', 0)]
+    db.update_material('PLA', 50, 'add')
+    assert db.get_material_by_name('PLA') == ('PLA', 50)
+    assert db.get_all_materials() == [('PLA', 50)]
+
+
+def test_import_rows_invalidates_orders_and_materials(db, order_id):
+    assert db.get_order('Импорт', key='name') is None
+    db.get_material_by_name('PLA')
+    db.get_all_materials()
+    db.import_rows('orders', [('Импорт', '', 'PETG', 20, '2025-01-10', 5, '', 100, True, False, '2025-01-01')])
+    db.import_rows('materials', [('PLA', 30)])
+    assert db.get_order('Импорт', key='name')[1] == 'Импорт'
+    assert db.get_material_by_name('PLA') == ('PLA', 30)
+    assert sorted(db.get_all_materials()) == [('PETG', 0), ('PLA', 30)]
@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+import pytest
+
+
+def raw_totals(db, start: str, end: str) -> dict:
+    """Суммы за период прямо по таблицам расходов и доходов"""
+    revenue = db.conn.execute('SELECT SUM(amount) FROM revenue WHERE date_received BETWEEN ? AND ?',
+                              (start, end)).fetchone()[0] or 0
+    categories = {name: round(total, 2) for name, total in db.conn.execute('''
+        SELECT ec.name, SUM(e.amount) FROM expenses e
+        JOIN expense_categories ec ON ec.id = e.category_id
+        WHERE e.date_spent BETWEEN ? AND ?
+        GROUP BY ec.name
+    ''', (start, end)) if round(total, 2)}
+    return {'revenue': round(revenue, 2), 'expenses': round(sum(categories.values()), 2), 'categories': categories}
+
+
+def assert_matches_raw(db, start: str, end: str):
+    totals = db.get_finance_totals(start, end)
+    expected = raw_totals(db, start, end)
+    assert totals['revenue'] == pytest.approx(expected['revenue'], abs=0.01)
+    assert totals['expenses'] == pytest.approx(expected['expenses'], abs=0.05)
+    assert totals['categories'].keys() == expected['categories'].keys()
+    for name, total in expected['categories'].items():
+        assert totals['categories'][name] == pytest.approx(total, abs=0.01)
+
+
+def ranges() -> list[tuple[str, str]]:
+    today = date.today()
+    return [
+        ((today - timedelta(days=800)).isoformat(), today.isoformat()),
+        # Partial months at both ends
+        ((today - timedelta(days=200)).isoformat(), (today - timedelta(days=17)).isoformat()),
+        # Whole months only
+        (date(today.year - 1, 1, 1).isoformat(), date(today.year - 1, 12, 31).isoformat()),
+        # Inside one month
+        (date(today.year - 1, 3, 5).isoformat(), date(today.year - 1, 3, 20).isoformat()),
+        ((today - timedelta(days=30)).isoformat(), (today - timedelta(days=30)).isoformat()),
+        ((today + timedelta(days=1)).isoformat(), (today + timedelta(days=40)).isoformat()),
+    ]
+
+
+@pytest.mark.parametrize('start, end', ranges())
+def test_totals_match_raw_sums(filled_db, start, end):
+    assert_matches_raw(filled_db, start, end)
+
+
+def test_rollups_follow_writes(filled_db):
+    today = date.today().isoformat()
+    filled_db.add_expense('Новая категория', 123.45, today, 'test')
+    filled_db.add_revenue(1, 500, today)
+    # Deleting an order removes its revenue by cascade
+    filled_db.delete_order(2)
+    filled_db.auto_delete_expired_records(365)
+    for start, end in ranges():
+        assert_matches_raw(filled_db, start, end)
+
+
+def test_rebuild_keeps_totals(filled_db):
+    start, end = ranges()[0]
+    before = filled_db.get_finance_totals(start, end)
+    assert filled_db.rebuild_finance_rollups() == 1
+    assert filled_db.get_finance_totals(start, end) == before
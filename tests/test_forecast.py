@@ -0,0 +1,80 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from data.async_db import AsyncDatabaseManager
+from data.forecast import MaterialForecast, compute_rates
+
+
+TODAY = date(2025, 3, 31)
+
+
+def day(days_ago: int) -> str:
+    return (TODAY - timedelta(days=days_ago)).isoformat()
+
+
+def test_compute_rates_takes_the_larger_rolling_mean():
+    rows = [('PLA', day(days_ago), 30) for days_ago in range(30)]
+    # Used up today only: the 7-day mean is higher than the 30-day one
+    rows += [('PETG', day(0), 40), ('PETG', day(0), 30)]
+    # Used 20 days ago: only the 30-day mean sees it
+    rows += [('ABS', day(20) + ' 12:00:00', 300)]
+    # Older than the window
+    rows += [('TPU', day(100), 500)]
+    rates = compute_rates(rows, TODAY, window_days=90)
+    assert rates['PLA'] == pytest.approx(30)
+    assert rates['PETG'] == pytest.approx(10)
+    assert rates['ABS'] == pytest.approx(10)
+    assert rates['TPU'] == 0
+    assert compute_rates([], TODAY) == {}
+    assert compute_rates([('PLA', 'не дата', 10)], TODAY) == {}
+
+
+def test_days_left_and_depletion_date(tmp_path):
+    today = date.today()
+
+    async def main():
+        db = AsyncDatabaseManager(str(tmp_path / 'test.db'))
+        try:
+            forecast = MaterialForecast(db)
+            for days_ago in range(7):
+                await db.add_order(f'Заказ {days_ago}', '', 'PLA', 70, today.isoformat(), 5, '', 0, True, True,
+                                   (today - timedelta(days=days_ago)).isoformat())
+            # Not printed yet, so its material is already taken from the stock
+            await db.add_order('Ожидает', '', 'PLA', 140, today.isoformat(), 5, '', 0, True, False,
+                               today.isoformat())
+            await db.add_order('Большой', '', 'PETG', 500, today.isoformat(), 5, '', 0, True, False,
+                               today.isoformat())
+            await db.update_material('PLA', 1000, 'add')
+            await db.update_material('PETG', 100, 'add')
+            await db.update_material('ABS', 300, 'add')
+            first = await forecast.forecast()
+            alerts = [item['material'] for item in await forecast.new_alerts(30)]
+            repeated = await forecast.new_alerts(30)
+            # Restocking changes only the materials version, the rates are reused
+            await db.update_material('PLA', 5000, 'add')
+            restocked = {item['material']: item for item in await forecast.forecast()}
+        finally:
+            await db.close_connection()
+        return first, alerts, repeated, restocked
+
+    first, alerts, repeated, restocked = asyncio.run(main())
+    assert [item['material'] for item in first] == ['PETG', 'PLA', 'ABS']
+    petg, pla, abs_ = first
+
+    # 7 orders of 70 g and one of 140 g within the last week
+    assert pla['rate'] == pytest.approx((7 * 70 + 140) / 7)
+    assert (pla['quantity'], pla['pending'], pla['available']) == (1000, 140, 860)
+    assert pla['days_left'] == pytest.approx(860 / pla['rate'])
+    assert pla['depletion_date'] == today + timedelta(days=int(860 / pla['rate']))
+
+    # More is needed than is in stock
+    assert (petg['available'], petg['days_left'], petg['depletion_date']) == (-400, 0.0, today)
+    # Not used at all
+    assert (abs_['rate'], abs_['days_left'], abs_['depletion_date']) == (0.0, None, None)
+
+    assert alerts == ['PETG', 'PLA']
+    assert repeated == []
+    assert restocked['PLA']['available'] == 5860
+    assert restocked['PLA']['rate'] == pla['rate']
@@ -0,0 +1,122 @@
+import asyncio
+import sqlite3
+import time
+from datetime import date
+
+import pytest
+from aiogram.fsm.storage.base import DefaultKeyBuilder, StorageKey
+
+from src.utils.fsm_storage import SQLiteStorage
+
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+OTHER_KEY = StorageKey(bot_id=1, chat_id=20, user_id=20)
+key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+
+def rows(path: str) -> list[tuple]:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT key, state, data FROM fsm_sessions ORDER BY key').fetchall()
+    finally:
+        conn.close()
+
+
+def test_changes_are_coalesced_into_one_write(tmp_path):
+    async def main():
+        storage = SQLiteStorage(str(tmp_path / 'fsm.db'), flush_interval=60)
+        writes = []
+        write = storage._write
+        storage._write = lambda upserts, deletes, purge: (writes.append(len(upserts)), write(upserts, deletes, purge))
+        try:
+            for step in range(5):
+                await storage.set_state(KEY, f'Order:step{step}')
+                await storage.update_data(KEY, {f'field{step}': step})
+            await storage.flush()
+            # Nothing changed since the last flush
+            await storage.flush()
+        finally:
+            await storage.close()
+        return writes
+
+    assert asyncio.run(main()) == [1]
+    ((_, state, data),) = rows(str(tmp_path / 'fsm.db'))
+    assert state == 'Order:step4'
+    assert data == '{"field0": 0, "field1": 1, "field2": 2, "field3": 3, "field4": 4}'
+
+
+def test_sessions_survive_restart(tmp_path):
+    path = str(tmp_path / 'fsm.db')
+
+    async def main():
+        storage = SQLiteStorage(path)
+        await storage.set_state(KEY, 'Order:date')
+        await storage.set_data(KEY, {'name': 'Дракон', 'date': date(2025, 2, 1)})
+        await storage.set_state(OTHER_KEY, 'Order:name')
+        # A cleared session is deleted from the file
+        await storage.set_state(OTHER_KEY, None)
+        await storage.close()
+
+        storage = SQLiteStorage(path)
+        try:
+            return (await storage.get_state(KEY), await storage.get_data(KEY),
+                    await storage.get_state(OTHER_KEY), len(rows(path)))
+        finally:
+            await storage.close()
+
+    assert asyncio.run(main()) == ('Order:date', {'name': 'Дракон', 'date': '2025-02-01'}, None, 1)
+
+
+def test_expired_sessions_are_purged(tmp_path):
+    path = str(tmp_path / 'fsm.db')
+
+    async def main():
+        storage = SQLiteStorage(path, ttl=10, flush_interval=60)
+        try:
+            await storage.set_state(KEY, 'Order:name')
+            await storage.flush()
+            # The session was last changed longer than ttl ago
+            storage._records[key_builder.build(KEY)][2] -= 100
+            conn = sqlite3.connect(path)
+            conn.execute('UPDATE fsm_sessions SET updated_at = ?', (time.time() - 100,))
+            conn.commit()
+            conn.close()
+
+            await storage.set_state(OTHER_KEY, 'Order:date')
+            storage._purged_at = 0.0
+            await storage.flush()
+            return [key for key, *_ in rows(path)], await storage.get_state(KEY)
+        finally:
+            await storage.close()
+
+    keys, state = asyncio.run(main())
+    assert keys == [key_builder.build(OTHER_KEY)]
+    assert state is None
+
+
+def test_failed_write_keeps_sessions_dirty(tmp_path):
+    path = str(tmp_path / 'fsm.db')
+
+    async def main():
+        storage = SQLiteStorage(path, flush_interval=60)
+        write = storage._write
+
+        def failing_write(upserts, deletes, purge):
+            raise sqlite3.OperationalError('database is locked')
+
+        try:
+            await storage.set_state(KEY, 'Order:name')
+            storage._write = failing_write
+            with pytest.raises(sqlite3.OperationalError):
+                await storage.flush()
+            dirty = set(storage._dirty)
+            storage._write = write
+            await storage.flush()
+            return dirty, set(storage._dirty)
+        finally:
+            await storage.close()
+
+    dirty, after_retry = asyncio.run(main())
+    assert dirty == {key_builder.build(KEY)}
+    assert after_retry == set()
+    assert [state for _, state, _ in rows(path)] == ['Order:name']
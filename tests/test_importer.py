@@ -0,0 +1,152 @@
+import asyncio
+
+from data import importer
+from data.async_db import AsyncDatabaseManager
+from data.importer import import_file, import_file_sync, validated_chunks
+
+
+ORDERS_HEADER = ['name', 'link', 'material', 'material_amount', 'recommended_date', 'importance', 'settings', 'cost',
+                 'payment_info', 'done', 'creation_date']
+
+
+def write_csv(path, rows: list[list], delimiter: str = ','):
+    path.write_text('\n'.join(delimiter.join(map(str, row)) for row in rows) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def imported_orders(db) -> list[tuple]:
+    return db.conn.execute('''
+        SELECT o.name, o.recommended_date, o.importance, o.payment_info, o.status_id, m.name, om.quantity
+        FROM orders o
+        JOIN order_materials om ON om.order_id = o.id
+        JOIN materials m ON m.id = om.material_id
+        ORDER BY o.id
+    ''').fetchall()
+
+
+def test_csv_with_commas(tmp_path, db):
+    path = write_csv(tmp_path / 'orders.csv', [
+        ORDERS_HEADER,
+        ['Дракон', 'https://example.com', 'PLA', 120, '2025-02-01', 7, '0.2', 900, 0, 0, '2025-01-01'],
+        ['Ваза', '', 'PETG', 80, '15.03.2025', '', '', '', '', 1, '01.02.2025'],
+    ])
+    report = import_file_sync(db, path)
+    assert (report['kind'], report['rows'], report['imported'], report['failed']) == ('orders', 2, 2, 0)
+    assert imported_orders(db) == [
+        ('Дракон', '2025-02-01', 7, 0, 1, 'PLA', 120),
+        # Empty cells take the defaults, an empty payment_info means paid
+        ('Ваза', '2025-03-15', 5, 1, 2, 'PETG', 80),
+    ]
+
+
+def test_csv_with_semicolons(tmp_path, db):
+    path = write_csv(tmp_path / 'expenses.csv', [
+        ['Category', 'Amount', 'Date_spent', 'Description'],
+        ['Пластик', '1500.5', '03.01.2025', 'катушка, 1 кг'],
+        ['Аренда', '20000', '2025-01-05', ''],
+    ], delimiter=';')
+    report = import_file_sync(db, path)
+    assert (report['kind'], report['imported'], report['failed']) == ('expenses', 2, 0)
+    assert db.conn.execute('''
+        SELECT ec.name, e.amount, e.date_spent, e.description FROM expenses e
+        JOIN expense_categories ec ON ec.id = e.category_id ORDER BY e.id
+    ''').fetchall() == [('Пластик', 1500.5, '2025-01-03', 'катушка, 1 кг'), ('Аренда', 20000.0, '2025-01-05', '')]
+
+
+def test_xlsx(tmp_path, db):
+    from datetime import datetime
+
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(ORDERS_HEADER)
+    sheet.append(['Дракон', None, 'PLA', 120, datetime(2025, 2, 1), 7, None, 900, 1, 0, '01.01.2025'])
+    sheet.append([None] * len(ORDERS_HEADER))
+    sheet.append(['Ваза', None, 'PETG', 80, '15.03.2025', None, None, None, None, None, datetime(2025, 2, 1, 12)])
+    path = str(tmp_path / 'orders.xlsx')
+    workbook.save(path)
+
+    report = import_file_sync(db, path)
+    assert (report['kind'], report['rows'], report['imported'], report['failed']) == ('orders', 2, 2, 0)
+    assert imported_orders(db) == [('Дракон', '2025-02-01', 7, 1, 1, 'PLA', 120),
+                                   ('Ваза', '2025-03-15', 5, 1, 1, 'PETG', 80)]
+
+
+def test_invalid_rows_are_reported(tmp_path, db):
+    path = write_csv(tmp_path / 'materials.csv', [
+        ['name', 'quantity'], ['PLA', 100], ['', 5], ['PETG', -1], ['ABS', 'много'], ['PLA', 20]])
+    report = import_file_sync(db, path)
+    assert (report['rows'], report['imported'], report['failed']) == (5, 2, 3)
+    assert [line for line, _ in report['errors']] == [3, 4, 5]
+    assert 'quantity' in report['errors'][1][1]
+    assert db.get_material_by_name('PLA') == ('PLA', 120)
+
+
+def test_errors_are_capped(tmp_path, db, monkeypatch):
+    monkeypatch.setattr(importer, 'MAX_ERRORS', 5)
+    path = write_csv(tmp_path / 'materials.csv', [['name', 'quantity']] + [['PLA', -1]] * 12 + [['PLA', 1]])
+    report = import_file_sync(db, path, chunk_size=4)
+    assert (report['rows'], report['imported'], report['failed']) == (13, 1, 12)
+    assert [line for line, _ in report['errors']] == [2, 3, 4, 5, 6]
+
+
+def test_failed_chunk_is_rolled_back(tmp_path, db):
+    path = write_csv(tmp_path / 'orders.csv', [ORDERS_HEADER] + [
+        [f'Заказ {index}', '', 'PLA', 10, '2025-02-01', 5, '', 100, 1, 0, '2025-01-01'] for index in range(5)])
+    query_many = db._query_many
+    calls = []
+
+    def failing_query_many(cursor, name, rows):
+        # The second chunk fails after its orders were inserted
+        if name == 'insert_order_material':
+            calls.append(name)
+            if len(calls) == 2:
+                raise RuntimeError('disk I/O error')
+        query_many(cursor, name, rows)
+
+    db._query_many = failing_query_many
+    report = import_file_sync(db, path, chunk_size=2)
+    assert (report['rows'], report['imported'], report['failed']) == (5, 3, 2)
+    assert report['errors'] == [(5, 'database error, 2 rows of the chunk were not saved')]
+    assert [name for name, *_ in imported_orders(db)] == ['Заказ 0', 'Заказ 1', 'Заказ 4']
+    assert db.conn.execute('SELECT count(*) FROM orders').fetchone()[0] == 3
+
+
+def test_chunk_ids_map_to_order_materials(tmp_path, db):
+    # A gap in the ids: the next AUTOINCREMENT id is not count(*) + 1
+    for index in range(3):
+        db.add_order(f'Старый {index}', '', 'PLA', 1, '2025-01-01', 5, '', 0, True, False, '2025-01-01')
+    db.delete_order(3)
+    rows = [[f'Новый {index}', '', ('PLA', 'PETG', 'ABS')[index % 3], 10 + index, '2025-02-01', 5, '', 0, 1, 0,
+             '2025-01-01'] for index in range(7)]
+    report = import_file_sync(db, write_csv(tmp_path / 'orders.csv', [ORDERS_HEADER] + rows), chunk_size=3)
+    assert report['imported'] == 7
+    imported = [(name, material, quantity) for name, *_, material, quantity in imported_orders(db)[2:]]
+    assert imported == [(row[0], row[2], row[3]) for row in rows]
+
+
+def test_validated_chunks_detects_kind(tmp_path):
+    path = write_csv(tmp_path / 'materials.csv', [['name', 'quantity'], ['PLA', 1], ['PETG', 2], ['ABS', 3]])
+    chunks = list(validated_chunks(path, chunk_size=2))
+    assert chunks == [('materials', [('PLA', 1), ('PETG', 2)], [], 3), ('materials', [('ABS', 3)], [], 4)]
+
+
+def test_async_import(tmp_path):
+    path = write_csv(tmp_path / 'materials.csv', [['name', 'quantity'], ['PLA', 1], ['PETG', 2], ['PLA', 3]])
+
+    async def main():
+        db = AsyncDatabaseManager(str(tmp_path / 'test.db'))
+        progress = []
+        try:
+            report = await import_file(db, path, chunk_size=2, progress=lambda report: progress.append(
+                report['imported']))
+            materials = sorted(await db.get_all_materials())
+        finally:
+            await db.close_connection()
+        return report, progress, materials
+
+    report, progress, materials = asyncio.run(main())
+    assert report['imported'] == 3
+    assert progress == [2, 3]
+    assert materials == [('PETG', 2), ('PLA', 4)]
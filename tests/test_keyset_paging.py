@@ -0,0 +1,73 @@
+import pytest
+
+
+@pytest.fixture
+def orders(db):
+    """id невыполненных заказов в порядке страниц; у части заказов нет даты или важности"""
+    keys = []
+    for index in range(23):
+        recommended_date = None if index % 4 == 0 else f'2025-01-{index % 6 + 1:02d}'
+        importance = None if index % 5 == 0 else index % 3 + 1
+        order_id = db.add_order(f'Заказ {index}', '', 'PLA', 10, recommended_date, importance, '', 100, True,
+                                index % 7 == 0, '2025-01-01')
+        if index % 7:
+            keys.append((recommended_date or '', -(importance or 0), order_id))
+    return [order_id for *_, order_id in sorted(keys)]
+
+
+def page_ids(page: dict) -> list[int]:
+    return [row[0] for row in page['rows']]
+
+
+@pytest.mark.parametrize('limit', [1, 4, 5, 30])
+def test_forward_pages_cover_all_orders(db, orders, limit):
+    page = db.get_orders_page(1, limit=limit)
+    assert not page['has_prev']
+    seen = page_ids(page)
+    while page['has_next']:
+        page = db.get_orders_page(1, after=seen[-1], limit=limit)
+        assert page['has_prev']
+        seen += page_ids(page)
+    assert seen == orders
+
+
+@pytest.mark.parametrize('limit', [1, 4, 5])
+def test_backward_pages_cover_all_orders(db, orders, limit):
+    seen = [orders[-1]]
+    while True:
+        page = db.get_orders_page(1, before=seen[0], limit=limit)
+        assert page['has_next']
+        seen = page_ids(page) + seen
+        if not page['has_prev']:
+            break
+    assert seen == orders
+
+
+def test_page_after_order_without_date(db, orders):
+    index = next(index for index, order_id in enumerate(orders)
+                 if db.conn.execute('SELECT recommended_date FROM orders WHERE id = ?', (order_id,)).fetchone()[0]
+                 is None)
+    page = db.get_orders_page(1, after=orders[index], limit=3)
+    assert page_ids(page) == orders[index + 1:index + 4]
+    assert page['has_prev']
+
+
+def test_deleted_cursor_starts_from_first_page(db, orders):
+    db.delete_order(orders[5])
+    page = db.get_orders_page(1, after=orders[5], limit=3)
+    assert page_ids(page) == orders[:3]
+    assert not page['has_prev'] and page['has_next']
+
+
+def test_materials_pages(db):
+    names = sorted(f'Материал {index:02d}' for index in range(12))
+    for name in names:
+        db.update_material(name, 1, 'add')
+    page = db.get_materials_page(limit=5)
+    seen = [row[1] for row in page['rows']]
+    while page['has_next']:
+        page = db.get_materials_page(after=page['rows'][-1][0], limit=5)
+        seen += [row[1] for row in page['rows']]
+    assert seen == names
+    page = db.get_materials_page(before=page['rows'][0][0], limit=5)
+    assert [row[1] for row in page['rows']] == names[5:10]
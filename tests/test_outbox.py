@@ -0,0 +1,62 @@
+import asyncio
+
+from aiogram.methods import EditMessageText, SendMessage
+
+from src.utils.outbox import Outbox
+
+
+class FakeBot:
+    """Бот, который записывает запросы вместо отправки в Telegram"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.requests = []
+
+    async def __call__(self, method):
+        self.requests.append(method)
+        await asyncio.sleep(self.delay)
+        return len(self.requests)
+
+
+def test_edits_of_one_message_are_coalesced():
+    async def main():
+        bot = FakeBot()
+        outbox = Outbox(bot, chat_rate=1000, chat_burst=1000)
+        futures = [outbox.send(EditMessageText(chat_id=1, message_id=10, text=str(index))) for index in range(5)]
+        # Queued before the worker ran, so they collapse into the last one; once it is
+        # being sent, later edits queue behind it and collapse again
+        await asyncio.sleep(0)
+        futures += [outbox.send(EditMessageText(chat_id=1, message_id=10, text=str(index))) for index in range(5, 8)]
+        results = await asyncio.gather(*futures)
+        await outbox.close()
+        return bot, outbox, results
+
+    bot, outbox, results = asyncio.run(main())
+    assert [request.text for request in bot.requests] == ['4', '7']
+    assert results == [1] * 5 + [2] * 3
+    assert outbox.coalesced == 6
+    assert outbox.sent == 2
+
+
+def test_other_requests_keep_their_order():
+    async def main():
+        bot = FakeBot(delay=0)
+        outbox = Outbox(bot, chat_rate=1000, chat_burst=1000)
+        futures = [
+            outbox.send(SendMessage(chat_id=1, text='a')),
+            outbox.send(EditMessageText(chat_id=1, message_id=10, text='b')),
+            outbox.send(EditMessageText(chat_id=1, message_id=11, text='c')),
+            outbox.send(SendMessage(chat_id=1, text='d')),
+            outbox.send(EditMessageText(chat_id=1, message_id=10, text='e')),
+            outbox.send(EditMessageText(chat_id=2, message_id=10, text='f')),
+        ]
+        await asyncio.gather(*futures)
+        await outbox.close()
+        return bot, outbox
+
+    bot, outbox = asyncio.run(main())
+    texts = [request.text for request in bot.requests]
+    # The second edit of message 10 replaced the first one in its place in the queue
+    assert [text for text in texts if text != 'f'] == ['a', 'e', 'c', 'd']
+    assert 'f' in texts
+    assert outbox.coalesced == 1
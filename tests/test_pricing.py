@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from data.async_db import AsyncDatabaseManager
+from data.pricing import FALLBACK_PRICE_PER_GRAM, PricingModel, fit_coefficients
+
+
+def history(count: int, price_per_gram: float = 10) -> list[tuple]:
+    return [(100 + price_per_gram * grams, ('PLA', 'PETG')[index % 2], grams, 5, '2025-02-01', '2025-01-01')
+            for index, grams in enumerate(range(10, 10 + 5 * count, 5))]
+
+
+def test_fit_recovers_linear_prices():
+    coefficients = fit_coefficients(history(40), ridge=0)
+    assert coefficients['samples'] == 40
+    assert coefficients['grams'] + coefficients['materials']['PLA'] == pytest.approx(10, abs=0.01)
+    assert coefficients['mae'] == pytest.approx(0, abs=0.01)
+    # Materials seen less than min_material_samples times get no own term
+    assert fit_coefficients(history(6), min_material_samples=5)['materials'] == {}
+
+
+def add_orders(db, count: int, cost_confirmed: bool, price_per_gram: float):
+    return asyncio.gather(*[
+        db.add_order(f'Заказ {grams}', '', 'PLA', grams, '2025-02-01', 5, '', price_per_gram * grams, True, False,
+                     '2025-01-01', cost_confirmed=cost_confirmed)
+        for grams in range(10, 10 + 5 * count, 5)])
+
+
+def test_only_confirmed_prices_are_learned(tmp_path):
+    async def main():
+        db = AsyncDatabaseManager(str(tmp_path / 'test.db'))
+        try:
+            pricing = PricingModel(db, min_samples=20)
+            # Without history the price is the fallback per gram
+            fallback = await pricing.estimate('PLA', 100, 5, '2025-02-01', '2025-01-01')
+            await add_orders(db, 25, True, 10)
+            # Prices suggested by the model itself and never confirmed
+            await add_orders(db, 25, False, 1000)
+            coefficients = await pricing.refit()
+            estimate = await pricing.estimate('PLA', 100, 5, '2025-02-01', '2025-01-01')
+        finally:
+            await db.close_connection()
+        return coefficients, estimate, fallback
+
+    coefficients, estimate, fallback = asyncio.run(main())
+    assert coefficients['samples'] == 25
+    assert estimate == pytest.approx(1000, abs=20)
+    assert fallback == 100 * FALLBACK_PRICE_PER_GRAM
+
+
+def test_refit_after_confirmed_orders(tmp_path):
+    async def main():
+        db = AsyncDatabaseManager(str(tmp_path / 'test.db'))
+        try:
+            pricing = PricingModel(db, refit_after=4)
+            await pricing.refit()
+            counts = [(pricing.new_orders, pricing.stale)]
+            await add_orders(db, 1, False, 10)
+            counts.append((pricing.new_orders, pricing.stale))
+            (order_id,) = await add_orders(db, 1, True, 10)
+            await db.update_order_cost(order_id, 200)
+            await db.import_rows('orders', [('Импорт', '', 'PLA', 10, '2025-02-01', 5, '', 100, True, False,
+                                            '2025-01-01')] * 2)
+            counts.append((pricing.new_orders, pricing.stale))
+            await pricing.refit()
+            counts.append((pricing.new_orders, pricing.stale))
+        finally:
+            await db.close_connection()
+        return counts
+
+    # Unconfirmed orders do not count towards a refit
+    assert asyncio.run(main()) == [(0, False), (0, False), (4, True), (0, False)]
@@ -0,0 +1,89 @@
+from src.utils.print_queue import PrintQueue
+
+
+def order(order_id: int, recommended_date: str | None, importance: int = 5, creation_date: str = '2025-01-01') -> dict:
+    return {'id': order_id, 'name': f'Заказ {order_id}', 'recommended_date': recommended_date,
+            'importance': importance, 'creation_date': creation_date}
+
+
+def ids(orders: list[dict]) -> list[int]:
+    return [order['id'] for order in orders]
+
+
+def test_orders_are_scored_by_date_then_importance():
+    queue = PrintQueue()
+    queue.load([
+        order(1, '2025-03-01'),
+        order(2, '2025-02-01', importance=3),
+        order(3, None, importance=10),
+        order(4, '2025-02-01', importance=8),
+        order(5, '2025-02-01', importance=8, creation_date='2024-12-01'),
+    ])
+    # Nearest date first, then more important, then older; no date goes last
+    assert ids(queue.peek(5)) == [5, 4, 2, 1, 3]
+    # peek does not take the orders out of the queue
+    assert len(queue) == 5
+    assert ids(queue.peek(2)) == [5, 4]
+
+
+def test_handle_event_pushes_and_removes():
+    queue = PrintQueue()
+    queue.load([order(1, '2025-03-01')])
+    queue.handle_event('order_added', dict(order(2, '2025-02-01'), material='PLA', material_amount=10, done=False))
+    queue.handle_event('order_added', dict(order(3, '2025-01-01'), material='PLA', material_amount=10, done=True))
+    assert ids(queue.peek(5)) == [2, 1]
+
+    queue.handle_event('order_status_updated', {'id': '2', 'done': True})
+    assert ids(queue.peek(5)) == [1]
+    queue.handle_event('order_deleted', {'id': 1})
+    assert queue.peek(5) == []
+    assert not queue.stale
+
+    queue.handle_event('order_status_updated', {'id': 3, 'done': False})
+    assert queue.stale
+
+
+def test_orders_are_assigned_to_free_printers():
+    queue = PrintQueue(('A', 'B'))
+    queue.load([order(1, '2025-03-01'), order(2, '2025-02-01'), order(3, '2025-04-01')])
+    assert queue.assign() == ('A', order(2, '2025-02-01'))
+    assert queue.assign() == ('B', order(1, '2025-03-01'))
+    # Both printers are busy
+    assert queue.assign() is None
+    assert ids(queue.peek(5)) == [3]
+
+    # Finishing a running order frees its printer
+    assert queue.remove(2)['id'] == 2
+    assert queue.assign('B') is None
+    assert queue.assign('A') == ('A', order(3, '2025-04-01'))
+    assert queue.assign() is None
+    assert {printer: job['id'] for printer, job in queue.jobs().items()} == {'A': 3, 'B': 1}
+
+
+def refresh(db, queue: PrintQueue):
+    # Same as refresh_print_queue in src/core.py, with a synchronous database
+    if queue.stale:
+        queue.load(db.get_pending_orders())
+
+
+def test_stale_queue_is_reloaded(db):
+    queue = PrintQueue(('A',))
+    first = db.add_order('Первый', '', 'PLA', 10, '2025-02-01', 5, '', 100, True, False, '2025-01-01')
+    second = db.add_order('Второй', '', 'PLA', 10, '2025-03-01', 5, '', 100, True, True, '2025-01-01')
+    queue.load(db.get_pending_orders())
+    db.subscribe(queue.handle_event)
+    assert queue.assign() == ('A', {'id': first, 'name': 'Первый', 'recommended_date': '2025-02-01',
+                                    'importance': 5, 'creation_date': '2025-01-01'})
+
+    # A reopened order is not part of the event, the queue is reloaded before it is shown
+    db.update_order_status(second, False)
+    assert queue.stale
+    refresh(db, queue)
+    assert not queue.stale
+    assert ids(queue.peek(5)) == [second]
+    # The running order stays with its printer
+    assert queue.jobs()['A']['id'] == first
+
+    db.update_order_status(first, True)
+    queue.load(db.get_pending_orders())
+    assert queue.jobs() == {'A': None}
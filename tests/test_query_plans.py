@@ -0,0 +1,15 @@
+def test_empty_database_has_no_full_scans(db):
+    assert db.check_query_plans() == {}
+
+
+def test_filled_database_has_no_full_scans(filled_db):
+    # After ANALYZE the planner uses real statistics, which is how a working bot sees the data
+    assert filled_db.check_query_plans() == {}
+
+
+def test_unindexed_foreign_key_is_reported(db):
+    db.conn.execute('DROP INDEX idx_revenue_order_id')
+    problems = db.check_query_plans()
+    assert problems['revenue.order_id -> orders'] == ['foreign key column is not indexed']
+    # Cascading deletes of orders now read the whole revenue table
+    assert 'SCAN revenue' in problems['delete_order']
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageText
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from src.root.render_cache import RenderCache, safe_edit
+
+
+KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text='Назад', callback_data='back')]])
+
+
+class FakeMessage:
+    """Сообщение, которое записывает правки вместо запросов к Telegram"""
+
+    def __init__(self, text: str, reply_markup: InlineKeyboardMarkup | None = None, error: str | None = None):
+        self.text = text
+        self.reply_markup = reply_markup
+        self.error = error
+        self.edits = []
+
+    async def edit_text(self, text: str, reply_markup: InlineKeyboardMarkup | None = None):
+        self.edits.append(text)
+        if self.error is not None:
+            raise TelegramBadRequest(EditMessageText(text=text), self.error)
+
+
+def test_unchanged_screen_is_not_edited():
+    message = FakeMessage('Заказы', KEYBOARD)
+    assert not asyncio.run(safe_edit(message, 'Заказы', reply_markup=KEYBOARD))
+    # A new keyboard alone is a change
+    assert asyncio.run(safe_edit(message, 'Заказы'))
+    assert asyncio.run(safe_edit(message, 'Материалы', reply_markup=KEYBOARD))
+    assert message.edits == ['Заказы', 'Материалы']
+
+
+def test_not_modified_error_is_swallowed():
+    message = FakeMessage('Старый текст', error='Bad Request: message is not modified: specified new message '
+                                                 'content and reply markup are exactly the same')
+    assert not asyncio.run(safe_edit(message, 'Заказы', reply_markup=KEYBOARD))
+
+    message = FakeMessage('Старый текст', error='Bad Request: message to edit not found')
+    with pytest.raises(TelegramBadRequest):
+        asyncio.run(safe_edit(message, 'Заказы'))
+
+
+def test_version_bump_invalidates_render(db):
+    cache = RenderCache()
+    renders = []
+
+    async def render():
+        renders.append(1)
+        return f'Материалы: {db.get_all_materials()}', KEYBOARD
+
+    async def screen():
+        return await cache.get(('materials', 0), db.data_version('materials'), render)
+
+    first = asyncio.run(screen())
+    assert asyncio.run(screen()) == first
+    assert (cache.hits, cache.misses, len(renders)) == (1, 1, 1)
+
+    db.update_material('PLA', 10, 'add')
+    text, _ = asyncio.run(screen())
+    assert text == "Материалы: [('PLA', 10)]"
+    assert (cache.hits, cache.misses, len(renders)) == (1, 2, 2)
+
+    # A write to another topic keeps the screen
+    db.add_expense('Аренда', 1000, '2025-01-06', '')
+    asyncio.run(screen())
+    assert len(renders) == 2
+
+
+def test_failed_render_is_not_cached():
+    cache = RenderCache(maxsize=1)
+
+    async def main():
+        failed = await cache.get(('orders', 0), (1,), lambda: asyncio.sleep(0, None))
+        screens = [await cache.get(('orders', page), (1,), lambda: asyncio.sleep(0, ('Заказы', None)))
+                   for page in (0, 1, 0)]
+        return failed, screens
+
+    failed, screens = asyncio.run(main())
+    assert failed is None
+    assert screens == [('Заказы', None)] * 3
+    # Only the last screen is kept with maxsize=1
+    assert (cache.hits, cache.misses) == (0, 4)
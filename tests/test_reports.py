@@ -0,0 +1,64 @@
+import asyncio
+import os
+
+from data.async_db import AsyncDatabaseManager
+from data.reports import ReportCache
+
+
+def test_key_depends_on_every_part(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    key = ReportCache.key('test.db', 'export_orders_to_excel', {'done': True}, (1, 2))
+    assert key == ReportCache.key(str(tmp_path / 'test.db'), 'export_orders_to_excel', {'done': True}, (1, 2))
+    assert len({
+        key,
+        ReportCache.key('other.db', 'export_orders_to_excel', {'done': True}, (1, 2)),
+        ReportCache.key('test.db', 'get_all_materials_excel', {'done': True}, (1, 2)),
+        ReportCache.key('test.db', 'export_orders_to_excel', {'done': False}, (1, 2)),
+        ReportCache.key('test.db', 'export_orders_to_excel', {'done': True}, (1, 3)),
+    }) == 5
+    # The order of keyword arguments does not matter
+    assert (ReportCache.key('test.db', 'm', {'a': 1, 'b': 2}, ())
+            == ReportCache.key('test.db', 'm', {'b': 2, 'a': 1}, ()))
+
+
+def test_built_report_and_file_id_are_reused(tmp_path):
+    async def main():
+        db = AsyncDatabaseManager(str(tmp_path / 'test.db'))
+        reports = ReportCache(str(tmp_path / 'reports'), workers=1)
+        try:
+            await db.update_material('PLA', 100, 'add')
+            # Concurrent requests for the same report wait for one build
+            first, same = await asyncio.gather(*[reports.get(db, 'get_all_materials_excel', ('materials',))
+                                                 for _ in range(2)])
+            reports.remember(first['key'], 'file-id-1')
+            cached = await reports.get(db, 'get_all_materials_excel', ('materials',))
+            counters = reports.builds, reports.hits
+            # New data makes a new report without the old file_id
+            await db.update_material('PLA', 50, 'add')
+            rebuilt = await reports.get(db, 'get_all_materials_excel', ('materials',))
+        finally:
+            reports.close()
+            await db.close_connection()
+        return first, same, cached, counters, rebuilt, (reports.builds, reports.hits)
+
+    first, same, cached, counters, rebuilt, final_counters = asyncio.run(main())
+    assert first == same
+    assert first['file_id'] is None
+    assert os.path.exists(first['path'])
+    assert cached == dict(first, file_id='file-id-1')
+    assert counters == (1, 1)
+    assert rebuilt['key'] != first['key']
+    assert rebuilt['file_id'] is None
+    assert os.path.exists(rebuilt['path'])
+    assert final_counters == (2, 1)
+
+
+def test_old_reports_are_pruned(tmp_path):
+    reports = ReportCache(str(tmp_path), max_files=2)
+    for index, key in enumerate(('a', 'b', 'c')):
+        path = os.path.join(str(tmp_path), key + '.xlsx')
+        open(path, 'w').close()
+        os.utime(path, (index, index))
+        reports.remember(key, f'file-{key}')
+    reports._prune()
+    assert sorted(os.listdir(tmp_path)) == ['b.file_id', 'b.xlsx', 'c.file_id', 'c.xlsx']
@@ -0,0 +1,67 @@
+import pytest
+
+from data import db_manage
+from data.db_manage import DatabaseManager
+
+
+def add_orders(db, *orders: tuple[str, str, str]) -> list[int]:
+    return [db.add_order(name, link, 'PLA', 10, '2025-02-01', 5, settings, 100, True, False, '2025-01-01')
+            for name, link, settings in orders]
+
+
+def names(db, query: str) -> list[str]:
+    return [name for _, name, *_ in db.search_orders(query)]
+
+
+@pytest.mark.skipif(not db_manage.FTS_TRIGRAM, reason='SQLite without the trigram tokenizer')
+def test_trigram_matches_substrings(db):
+    add_orders(db, ('Дракон большой', 'https://example.com/dragon.stl', '0.2 мм'),
+               ('Ваза', 'https://example.com/vase.stl', 'спиральный режим'),
+               ('Драконья голова', '', ''))
+    assert names(db, 'льшо') == ['Дракон большой']
+    assert sorted(names(db, 'ДРАК')) == ['Дракон большой', 'Драконья голова']
+    assert names(db, 'vase') == ['Ваза']
+    assert names(db, 'ральн') == ['Ваза']
+    # Every term has to match
+    assert names(db, 'драк гол') == ['Драконья голова']
+
+
+def test_unicode61_fallback_matches_word_prefixes(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_manage, 'FTS_TRIGRAM', False)
+    monkeypatch.setattr(db_manage, 'FTS_MIN_TERM', 1)
+    schema = list(db_manage.ORDERS_FTS_SCHEMA)
+    schema[0] = schema[0].replace("'trigram'", "'unicode61 remove_diacritics 2'")
+    monkeypatch.setattr(db_manage, 'ORDERS_FTS_SCHEMA', schema)
+    db = DatabaseManager(str(tmp_path / 'test.db'))
+    try:
+        assert 'unicode61' in db.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'orders_fts'").fetchone()[0]
+        add_orders(db, ('Дракон большой', '', ''), ('Ваза', '', 'спиральный режим'))
+        assert names(db, 'драк') == ['Дракон большой']
+        assert names(db, 'с') == ['Ваза']
+        # Only word prefixes match without trigrams
+        assert names(db, 'акон') == []
+    finally:
+        db.close_connection()
+
+
+def test_index_follows_updates_and_deletes(db):
+    first, second = add_orders(db, ('Дракон', '', ''), ('Ваза', '', ''))
+    db.conn.execute("UPDATE orders SET name = 'Кашпо', settings = 'ваза' WHERE id = ?", (second,))
+    db.conn.commit()
+    assert names(db, 'Ваза') == ['Кашпо']
+    assert names(db, 'Кашпо') == ['Кашпо']
+    # Updates of other columns do not touch the index
+    db.update_order_status(first, True)
+    assert names(db, 'Дракон') == ['Дракон']
+    db.delete_order(first)
+    assert names(db, 'Дракон') == []
+    assert db.conn.execute("INSERT INTO orders_fts (orders_fts) VALUES ('integrity-check')").rowcount == 1
+
+
+def test_short_terms_are_ignored(db):
+    add_orders(db, ('Дракон', '', ''), ('Ваза', '', ''))
+    short = 'д' * (db_manage.FTS_MIN_TERM - 1)
+    if short:
+        assert db.search_orders(short) == []
+        assert names(db, f'{short} Ваза') == ['Ваза']
+    assert db.search_orders('   ') == []
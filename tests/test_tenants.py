@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from data.db_manage import DatabaseManager
+from data.tenants import TenantRouter, split_database, tenant_db_file
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / 'source.db')
+    db = DatabaseManager(path)
+    db.update_material('PLA', 500, 'add')
+    for index in range(1, 5):
+        db.add_order(f'Заказ {index}', '', 'PLA', 10 * index, '2025-02-01', 5, '', 100 * index, True, False,
+                     '2025-01-01')
+        if index < 4:
+            db.add_revenue(index, 100 * index, f'2025-01-1{index}')
+    db.add_revenue(None, 50, '2025-01-20')
+    db.add_expense('Пластик', 300, '2025-01-05', 'катушка')
+    db.add_expense('Аренда', 1000, '2025-01-06', '')
+    db.close_connection()
+    return path
+
+
+def read(directory: str, tenant: str, query: str) -> list[tuple]:
+    db = DatabaseManager(tenant_db_file(directory, tenant), create_schema=False)
+    try:
+        return db.conn.execute(query).fetchall()
+    finally:
+        db.close_connection()
+
+
+def test_split_database(source, tmp_path):
+    directory = str(tmp_path / 'tenants')
+    assert split_database(source, directory, {1: 'a', 2: 'b'}, 'shop') == {'a': 1, 'b': 1, 'shop': 2}
+
+    orders = 'SELECT o.id, om.quantity FROM orders o JOIN order_materials om ON om.order_id = o.id ORDER BY o.id'
+    assert read(directory, 'a', orders) == [(1, 10)]
+    assert read(directory, 'b', orders) == [(2, 20)]
+    assert read(directory, 'shop', orders) == [(3, 30), (4, 40)]
+
+    revenue = 'SELECT order_id, amount FROM revenue ORDER BY id'
+    assert read(directory, 'a', revenue) == [(1, 100)]
+    assert read(directory, 'b', revenue) == [(2, 200)]
+    # Revenue without an order goes to the default workspace
+    assert read(directory, 'shop', revenue) == [(3, 300), (None, 50)]
+
+    expenses = 'SELECT amount FROM expenses ORDER BY id'
+    assert read(directory, 'a', expenses) == read(directory, 'b', expenses) == []
+    assert read(directory, 'shop', expenses) == [(300,), (1000,)]
+
+    # Every workspace knows the materials, only the default one keeps the stock
+    materials = 'SELECT id, name, quantity FROM materials'
+    assert read(directory, 'a', materials) == [(1, 'PLA', 0)]
+    assert read(directory, 'shop', materials) == [(1, 'PLA', 500)]
+
+    # The rollup triggers fire on the copied rows
+    shop = DatabaseManager(tenant_db_file(directory, 'shop'))
+    try:
+        assert shop.get_finance_totals('2025-01-01', '2025-01-31') == {
+            'revenue': 350, 'expenses': 1300, 'categories': {'Аренда': 1000, 'Пластик': 300}}
+    finally:
+        shop.close_connection()
+
+    with pytest.raises(FileExistsError):
+        split_database(source, directory, {}, 'shop')
+
+
+def test_idle_tenants_are_closed(tmp_path):
+    async def main():
+        router = TenantRouter(str(tmp_path), max_open=2)
+        databases = {}
+        for tenant in ('a', 'b', 'c'):
+            async with router.acquire(tenant) as workspace:
+                databases[tenant] = workspace['db']
+        result = router.open_tenants(), router.opened, router.evicted, list(databases['a']._managers)
+        await router.close()
+        return result
+
+    open_tenants, opened, evicted, closed_managers = asyncio.run(main())
+    assert open_tenants == ['b', 'c']
+    assert (opened, evicted) == (3, 1)
+    assert closed_managers == []
+
+
+def test_busy_tenant_is_not_closed(tmp_path):
+    async def main():
+        router = TenantRouter(str(tmp_path), max_open=1)
+        async with router.acquire('a') as workspace:
+            async with router.acquire('b'):
+                pass
+            # 'a' is the least recently used but still in use, so the idle 'b' is closed
+            busy = router.open_tenants(), bool(workspace['db']._managers)
+        async with router.acquire('c'):
+            pass
+        result = busy, router.open_tenants(), router.evicted
+        await router.close()
+        return result
+
+    (busy_open, busy_alive), open_tenants, evicted = asyncio.run(main())
+    assert busy_open == ['a']
+    assert busy_alive
+    assert open_tenants == ['c']
+    assert evicted == 2
@@ -0,0 +1,85 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.utils.webhook import LimitedRequestHandler
+
+
+SECRET = 'secret-token'
+
+
+def message_update(update_id: int) -> dict:
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'chat': {'id': 1, 'type': 'private'},
+        'from': {'id': 1, 'is_bot': False, 'first_name': 'Test'}, 'text': 'hello'}}
+
+
+async def webhook_client(dispatcher: Dispatcher, concurrency: int) -> TestClient:
+    app = web.Application()
+    LimitedRequestHandler(dispatcher, Bot('42:TEST'), concurrency=concurrency,
+                          secret_token=SECRET).register(app, path='/webhook')
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    return client
+
+
+def test_wrong_secret_token_is_rejected():
+    async def main():
+        handled = []
+        dispatcher = Dispatcher()
+        dispatcher.message.register(lambda message: handled.append(message.message_id))
+        client = await webhook_client(dispatcher, concurrency=2)
+        try:
+            wrong = await client.post('/webhook', json=message_update(1),
+                                      headers={'X-Telegram-Bot-Api-Secret-Token': 'wrong'})
+            missing = await client.post('/webhook', json=message_update(2))
+            right = await client.post('/webhook', json=message_update(3),
+                                      headers={'X-Telegram-Bot-Api-Secret-Token': SECRET})
+            await asyncio.sleep(0.05)
+        finally:
+            await client.close()
+        return wrong.status, missing.status, right.status, handled
+
+    wrong, missing, right, handled = asyncio.run(main())
+    assert wrong == missing == 401
+    assert right == 200
+    assert handled == [3]
+
+
+def test_concurrency_is_capped():
+    async def main():
+        release = asyncio.Event()
+        running, peak = [0], [0]
+
+        async def handler(message):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await release.wait()
+            running[0] -= 1
+
+        dispatcher = Dispatcher()
+        dispatcher.message.register(handler)
+        client = await webhook_client(dispatcher, concurrency=2)
+        try:
+            requests = [asyncio.create_task(client.post(
+                '/webhook', json=message_update(update_id), headers={'X-Telegram-Bot-Api-Secret-Token': SECRET}))
+                for update_id in range(1, 5)]
+            await asyncio.sleep(0.2)
+            # Two updates are being handled, the other requests wait for a free slot
+            answered_while_busy = sum(request.done() for request in requests)
+            busy_peak = peak[0]
+            release.set()
+            responses = await asyncio.gather(*requests)
+            await asyncio.sleep(0.05)
+        finally:
+            await client.close()
+        return answered_while_busy, busy_peak, [response.status for response in responses], peak[0], running[0]
+
+    answered_while_busy, busy_peak, statuses, peak, running = asyncio.run(main())
+    assert answered_while_busy == 2
+    assert busy_peak == 2
+    assert statuses == [200] * 4
+    assert peak == 2
+    assert running == 0